@@ -1,5 +1,5 @@
 import re
-from typing import Dict
+from typing import Dict, Optional, Set
 
 from ast_nodes import *
 from my_types import *
@@ -304,10 +304,11 @@ class SemanticAnalyzer:
         arr_param = TypeDesc('array', elem=TypeDesc('unknown'))
         self.funcs['len'] = ([('arr', arr_param)], INT, None)
 
-    def analyze(self, program: Program) -> Program:
+    def analyze(self, program: Program, skip_functions: Optional[Set[str]] = None) -> Program:
         """
         主分析入口 - 对外API保持不变
         返回标注了类型的AST
+        skip_functions: 跳过函数体分析的函数名（增量编译中输入未变化的函数）
         """
         self.scope.push('global')
 
@@ -316,10 +317,16 @@ class SemanticAnalyzer:
 
         # 第二遍：完整分析
         for stmt in program.stmts:
+            if skip_functions and isinstance(stmt, FuncDecl) and stmt.name in skip_functions:
+                continue
             self._analyze_stmt(stmt)
 
         return program
 
+    def analyze_function(self, node: FuncDecl):
+        """在全局作用域已建立后单独分析一个函数体（供增量编译补做分析）"""
+        self._analyze_FuncDecl(node)
+
     def _collect_declarations(self, program: Program):
         """收集所有声明"""
         for s in program.stmts:
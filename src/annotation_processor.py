@@ -1,13 +1,13 @@
 """
 注解处理器 (Annotation Processor)
-专门处理 $tag, $tick, $event, $predicate, $loot 的编译期逻辑
+专门处理 $tag, $tick, $event, $predicate, $loot 的编译期逻辑（$inline 由 Inliner 在调用处处理，$unroll 由 LoopUnroller 在生成函数体时处理）
 """
 from dataclasses import dataclass, field
 from typing import Dict, Any, List, Set
 
 from ast_nodes import (
     FuncDecl, StaticTagDecl, TagAnnot, TickAnnot, EventAnnot,
-    PredicateAnnot, LootAnnot, ConditionStmt, EntityCondition,
+    PredicateAnnot, LootAnnot, InlineAnnot, UnrollAnnot, ConditionStmt, EntityCondition,
     ObjectLiteral, StringLiteral, BoolLiteral, IntLiteral, FloatLiteral, ArrayLiteral, LootConfigStmt
 )
 from semant import SemanticError
@@ -103,6 +103,8 @@ class AnnotationProcessor:
             self._handle_predicate(stmt, ann)
         elif isinstance(ann, LootAnnot):
             self._handle_loot(stmt, ann)
+        elif isinstance(ann, (InlineAnnot, UnrollAnnot)):
+            pass
         else:
             raise SemanticError(f"未知的装饰器类型: {type(ann).__name__}")
 
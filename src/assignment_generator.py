@@ -28,7 +28,14 @@ class AssignmentGenerator:
             self._generate_string_assign(stmt.expr, target)
             return
 
-        # 数值类型先求值到临时变量
+        # 数值类型：能直接写入目标分数时不经过临时变量
+        dest = self._direct_destination(target, stmt.expr)
+        if dest:
+            for cmd in self.expr_gen.gen_expr_to(stmt.expr, dest, target_type):
+                self._emit(cmd)
+            return
+
+        # 其余情况先求值到临时变量
         temp = self.builder.get_temp_var()
         cmds = self.expr_gen.gen_expr_to(stmt.expr, temp, target_type)
         for cmd in cmds:
@@ -40,13 +47,52 @@ class AssignmentGenerator:
         elif isinstance(target, IndexExpr):
             self._generate_index(target, temp)
 
+    def _direct_destination(self, target, expr) -> Optional[str]:
+        """
+        数值赋值可以直接写入的目标分数，需要经过临时变量时返回 None。
+        表达式生成器总是先把操作数算到各自的临时变量再写目标，只有 and 会先把目标置 0
+        再求右操作数，此时右值读取目标（或调用可能读取它的函数）就必须经过临时变量。
+        """
+        dest = self._score_destination(target)
+        if dest is None:
+            return None
+        if isinstance(expr, BinOp) and expr.op == 'and':
+            root = self._get_base_var_name(target.base if isinstance(target, IndexExpr) else target)
+            for node in iter_nodes(expr):
+                if isinstance(node, CallExpr) or (isinstance(node, Ident) and node.name == root):
+                    return None
+        return dest
+
+    def _score_destination(self, target) -> Optional[str]:
+        """数值赋值目标对应的计分板分数（变量、结构体字段、常量下标的数组元素）"""
+        target_type = getattr(target, '_type', None) if isinstance(target, FieldAccess) else self._get_target_type(target)
+        if not target_type or target_type.kind != 'prim' or target_type.name == 'string':
+            return None
+
+        if isinstance(target, Ident):
+            storage, _ = self.ctx.get_var(target.name)
+            return self.ctx.resolve_storage(storage)
+        if isinstance(target, FieldAccess):
+            base_path = self._get_storage_path(target.base) if getattr(target, '_is_struct_field', False) else None
+            return self.ctx.resolve_storage(f"{base_path}_{target.field}") if base_path else None
+        if isinstance(target, IndexExpr) and isinstance(target.base, Ident):
+            base_type = getattr(target.base, '_type', None) or UNKNOWN
+            storage, _ = self.ctx.get_var(target.base.name)
+            path = self.ctx.resolve_storage(storage)
+            if base_type.kind == 'array' and isinstance(target.index, IntLiteral):
+                return f"{path}_{target.index.value}"
+            if base_type.kind == 'struct' and isinstance(target.index, (Ident, StringLiteral)):
+                field_name = target.index.name if isinstance(target.index, Ident) else target.index.value
+                return f"{path}_{field_name}"
+        return None
+
     def _get_target_type(self, target) -> TypeDesc:
         """获取赋值目标类型"""
         if isinstance(target, Ident):
             _, target_type = self.ctx.get_var(target.name)
             return target_type
         elif isinstance(target, IndexExpr):
-            return getattr(target, '_type', UNKNOWN)
+            return getattr(target, '_type', None) or UNKNOWN
         return UNKNOWN
 
     def _generate_string_assign(self, expr, target):
@@ -65,7 +111,7 @@ class AssignmentGenerator:
 
     def _generate_string_index(self, target: IndexExpr, source_path: str):
         """字符串数组/结构体字段索引赋值"""
-        base_type = getattr(target.base, '_type', UNKNOWN)
+        base_type = getattr(target.base, '_type', None) or UNKNOWN
 
         if isinstance(target.base, IndexExpr):
             self._generate_nested_string_index(target, source_path)
@@ -153,7 +199,7 @@ class AssignmentGenerator:
 
     def _generate_index(self, target: IndexExpr, temp: str):
         """索引赋值分发"""
-        base_type = getattr(target.base, '_type', UNKNOWN)
+        base_type = getattr(target.base, '_type', None) or UNKNOWN
 
         if isinstance(target.base, IndexExpr):
             self._generate_nested_index(target, temp)
@@ -212,7 +258,7 @@ class AssignmentGenerator:
             base_path = self._get_storage_path(target.base)
             arr_path = self.ctx.resolve_storage(base_path) if base_path else None
             # ========== 关键修复：从 FieldAccess 节点本身获取类型（它是数组类型）==========
-            arr_type = getattr(target.base, '_type', UNKNOWN)
+            arr_type = getattr(target.base, '_type', None) or UNKNOWN
         else:
             return
 
@@ -303,7 +349,13 @@ class AssignmentGenerator:
 
     def generate_field_assign(self, target: FieldAccess, value_expr):
         """点号字段赋值"""
-        target_type = getattr(target, '_type', UNKNOWN)
+        target_type = getattr(target, '_type', None) or UNKNOWN
+
+        dest = self._direct_destination(target, value_expr)
+        if dest:
+            for cmd in self.expr_gen.gen_expr_to(value_expr, dest, target_type):
+                self._emit(cmd)
+            return
 
         # 先计算值到临时变量
         temp = self.builder.get_temp_var()
@@ -327,7 +379,7 @@ class AssignmentGenerator:
         # 实体NBT赋值
         if getattr(target, '_is_entity_attr', False):
             selector = self._get_entity_selector(target.base) or "@s"
-            nbt_path = getattr(target, '_nbt_path', target.field)
+            nbt_path = getattr(target, '_nbt_path', None) or target.field
 
             if target_type.kind == 'prim' and target_type.name == 'int':
                 store_type = "int"
@@ -0,0 +1,95 @@
+"""
+AST Cache - 持久化语法树缓存
+以 (编译器版本, 语法哈希, 源码内容) 的哈希为键，缓存解析后的 Program，
+未修改的模块可以跳过词法和语法分析。
+"""
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from ast_nodes import Program
+from parser import parse, grammar_hash, get_cache_dir
+
+# 缓存格式或 AST 节点结构变化时递增，使旧缓存失效
+COMPILER_VERSION = "3"
+
+
+class ASTCache:
+    """基于内容哈希的 AST 磁盘缓存"""
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None, enabled: bool = True):
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir() / "ast"
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        # 进程内缓存序列化后的字节：每次反序列化得到独立副本，避免后续阶段对 AST 的修改互相影响
+        self._memory: Dict[str, bytes] = {}
+        self._version_key = f"{COMPILER_VERSION}:{grammar_hash()}:".encode('utf-8')
+
+    def _key(self, code: str) -> str:
+        h = hashlib.sha256(self._version_key)
+        h.update(code.encode('utf-8'))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pickle"
+
+    def load(self, code: str) -> Optional[Program]:
+        """读取缓存，未命中或缓存损坏时返回 None"""
+        key = self._key(code)
+        data = self._memory.get(key)
+        if data is None:
+            path = self._path(key)
+            if not path.exists():
+                return None
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                return None
+        try:
+            program = pickle.loads(data)
+        except Exception:
+            return None
+        if not isinstance(program, Program):
+            return None
+        self._memory[key] = data
+        return program
+
+    def store(self, code: str, program: Program):
+        """写入缓存（先写临时文件再原子替换）"""
+        key = self._key(code)
+        data = pickle.dumps(program, protocol=pickle.HIGHEST_PROTOCOL)
+        self._memory[key] = data
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def parse(self, code: str) -> Program:
+        """带缓存的解析入口"""
+        if not self.enabled:
+            return parse(code)
+
+        program = self.load(code)
+        if program is not None:
+            self.hits += 1
+            return program
+
+        self.misses += 1
+        program = parse(code)
+        if program is not None:
+            self.store(code, program)
+        return program
+
+    def stats(self) -> str:
+        if not self.enabled:
+            return "已禁用"
+        return f"命中 {self.hits}, 未命中 {self.misses}"
@@ -1,31 +1,42 @@
-from dataclasses import dataclass, field
-from typing import List, Optional, Any, Tuple
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import List, Optional, Any, Tuple, Iterator
 
-@dataclass
+# 所有节点使用 __slots__（无实例 __dict__）以减少大型程序的 AST 内存占用。
+# 语义分析阶段写入节点的标注（_type、_storage_name 等）以显式字段声明，
+# 不参与构造、比较和 repr，因此不影响解析器和缓存键。
+
+
+def _annotation(default: Any = None):
+    """语义分析标注字段"""
+    return field(default=default, init=False, repr=False, compare=False)
+
+
+@dataclass(slots=True)
 class Program:
     stmts: List[Any]
     def __repr__(self): return f"Program({self.stmts})"
 
-@dataclass
+@dataclass(slots=True)
 class LetStmt:
     name: str
     type_: Optional[Any]
     expr: Any
+    _type: Any = _annotation()
     def __repr__(self): return f"Let({self.name}, type={self.type_}, expr={self.expr})"
 
-@dataclass
+@dataclass(slots=True)
 class AssignStmt:
     target: Any
     expr: Any
     def __repr__(self): return f"Assign({self.target} = {self.expr})"
 
-@dataclass
+@dataclass(slots=True)
 class StructDecl:
     name: str
     fields: List[Any]
     def __repr__(self): return f"Struct({self.name}, fields={self.fields})"
 
-@dataclass
+@dataclass(slots=True)
 class ForStmt:
     var: str
     iterable: Any
@@ -38,30 +49,30 @@ class ForStmt:
         else:
             return f"ForEach({self.var} in {self.iterable}, {self.block})"
 
-@dataclass
+@dataclass(slots=True)
 class WhileStmt:
     cond: Any
     block: List[Any]  # block 是语句列表
     def __repr__(self): return f"While({self.cond}, {self.block})"
 
-@dataclass
+@dataclass(slots=True)
 class IfStmt:
     cond: Any
     then_block: List[Any]
     else_block: List[Any]
     def __repr__(self): return f"If({self.cond}, then={self.then_block}, else={self.else_block})"
 
-@dataclass
+@dataclass(slots=True)
 class ExprStmt:
     expr: Any
     def __repr__(self): return f"ExprStmt({self.expr})"
 
-@dataclass
+@dataclass(slots=True)
 class ReturnStmt:
     expr: Optional[Any]
     def __repr__(self): return f"Return({self.expr})"
 
-@dataclass
+@dataclass(slots=True)
 class FuncDecl:
     name: str
     params: List[Tuple[str, Any]]
@@ -70,49 +81,58 @@ class FuncDecl:
     annotations: List[Any] = field(default_factory=list)
     def __repr__(self): return f"Func({self.name}, params={self.params}, ret={self.ret_type}, body={self.body})"
 
-@dataclass
+@dataclass(slots=True)
 class CmdStmt:
     text: str
     def __repr__(self): return f"Cmd({self.text!r})"
 
 # Expressions
-@dataclass
+@dataclass(slots=True)
 class IntLiteral:
     value:int
+    _type: Any = _annotation()
+    _unscaled: bool = _annotation(False)  # 由 int 运算折叠而来：与 BinOp 一样，存入 float 目标时不 ×100
     def __repr__(self): return f"Int({self.value})"
 
-@dataclass
+@dataclass(slots=True)
 class FloatLiteral:
     value:float
+    _type: Any = _annotation()
     def __repr__(self): return f"Float({self.value})"
 
-@dataclass
+@dataclass(slots=True)
 class BoolLiteral:
     value: bool
+    _type: Any = _annotation()
     def __repr__(self): return f"Bool({self.value})"
 
-@dataclass
+@dataclass(slots=True)
 class StringLiteral:
     value:str
+    _type: Any = _annotation()
     def __repr__(self): return f"Str({self.value!r})"
 
-@dataclass
+@dataclass(slots=True)
 class Ident:
     name:str
+    _type: Any = _annotation()
+    _storage_name: Optional[str] = _annotation()
     def __repr__(self): return f"Ident({self.name})"
 
-@dataclass
+@dataclass(slots=True)
 class ArrayLiteral:
     items:List[Any]
+    _type: Any = _annotation()
     def __repr__(self): return f"Array({self.items})"
 
-@dataclass
+@dataclass(slots=True)
 class IndexExpr:
     base:Any
     index:Any
+    _type: Any = _annotation()
     def __repr__(self): return f"Index({self.base}[{self.index}])"
 
-@dataclass
+@dataclass(slots=True)
 class ImportStmt:
     module: str  # 模块路径，如 "./math.mcc" 或 "std/math"
     names: Optional[List[str]]  # None表示导入全部，或指定名称列表如 ["sqrt", "abs"]
@@ -123,25 +143,34 @@ class ImportStmt:
             return f"Import({', '.join(self.names)} from '{self.module}')"
         return f"Import(* from '{self.module}')"
 
-@dataclass
+@dataclass(slots=True)
 class SelectorExpr:
     raw:str
+    _type: Any = _annotation()
+    _is_single_entity: bool = _annotation(False)
+    _is_selector: bool = _annotation(False)
     def __repr__(self): return f"Selector({self.raw})"
 
-@dataclass
+@dataclass(slots=True)
 class CallExpr:
     callee:Any
     args:List[Any]
+    _type: Any = _annotation()
+    _is_struct_constructor: bool = _annotation(False)
+    _struct_name: Optional[str] = _annotation()
+    _func_name: Optional[str] = _annotation()
+    _ret_type: Any = _annotation()
     def __repr__(self): return f"Call({self.callee}({', '.join(map(str,self.args))}))"
 
-@dataclass
+@dataclass(slots=True)
 class BinOp:
     op: str
     left: Any
     right: Any
+    _type: Any = _annotation()
     def __repr__(self): return f"BinOp({self.left} {self.op} {self.right})"
 
-@dataclass
+@dataclass(slots=True)
 class TypeNode:
     base:str
     dims:List[Optional[int]] = None
@@ -151,62 +180,81 @@ class TypeNode:
         s = ''.join(f'[{("" if d is None else d)}]' for d in self.dims)
         return f"Type({self.base}{s})"
 
-@dataclass
+@dataclass(slots=True)
 class StructLiteral:
     struct_name: str      # 如 "MobInfo"
     fields: List[Tuple[str, Any]]  # [(field_name, value_expr), ...]
+    _type: Any = _annotation()
     def __repr__(self):
         return f"StructLiteral({self.struct_name}, {self.fields})"
 
-@dataclass
+@dataclass(slots=True)
 class ObjectLiteral:
     fields: List[Tuple[str, Any]]  # [(field_name, value_expr), ...]
+    _type: Any = _annotation()
     def __repr__(self):
         return f"ObjectLiteral({self.fields})"
 
-@dataclass
+@dataclass(slots=True)
 class FieldAccess:
     base: Any       # 被访问的对象（可以是 Ident、FieldAccess、IndexExpr 等）
     field: str      # 字段名
+    _type: Any = _annotation()
+    _is_array_length: bool = _annotation(False)
+    _is_struct_field: bool = _annotation(False)
+    _field_name: Optional[str] = _annotation()
+    _is_entity_attr: bool = _annotation(False)
+    _entity_type: Optional[str] = _annotation()
+    _nbt_path: Optional[str] = _annotation()
     def __repr__(self):
         return f"FieldAccess({self.base}.{self.field})"
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp:
     op: str           # '-' 或 '!'（以后可以支持逻辑非）
     operand: Any      # 操作数表达式
+    _type: Any = _annotation()
     def __repr__(self):
         return f"UnaryOp({self.op}{self.operand})"
 
 
-@dataclass
+@dataclass(slots=True)
 class TagAnnot:
     """$tag("namespace:path")"""
     path: str
 
-@dataclass
+@dataclass(slots=True)
 class TickAnnot:
     """$tick(interval)"""
     interval: int
 
-@dataclass
+@dataclass(slots=True)
 class LootAnnot:
     """$loot("namespace:path")"""
     path: str
 
-@dataclass
+@dataclass(slots=True)
 class EventAnnot:
     """$event("trigger", {conditions})"""
     trigger: str
     conditions: Any  # ObjectLiteral 或 None
 
-@dataclass
+@dataclass(slots=True)
 class PredicateAnnot:
     """$predicate("namespace:path")"""
     path: str
 
+@dataclass(slots=True)
+class InlineAnnot:
+    """$inline"""
+
+@dataclass(slots=True)
+class UnrollAnnot:
+    """$unroll(N)"""
+    limit: int
+
 # ========== 新增：静态标签声明 ==========
-@dataclass
+@dataclass(slots=True)
 class StaticTagDecl:
     """$tag function("path") { "entries" }"""
     tag_type: str      # "function", "block", "item", "entity"
@@ -215,18 +263,30 @@ class StaticTagDecl:
     replace: bool = False
 
 # ========== 新增：Predicate 条件语句 ==========
-@dataclass
+@dataclass(slots=True)
 class ConditionStmt:
     """condition { ... }"""
     clauses: List[Any]
 
-@dataclass
+@dataclass(slots=True)
 class EntityCondition:
     """entity @s { nbt... }"""
     selector: Any      # SelectorExpr, Ident 或 StringLiteral
     nbt: Any           # ObjectLiteral
 
-@dataclass
+@dataclass(slots=True)
 class LootConfigStmt:
     """loot "json_string" 语句（用于 $loot 函数体内）"""
     json_content: str
+
+
+def iter_nodes(node: Any) -> Iterator[Any]:
+    """深度优先遍历 AST 中的所有节点"""
+    if isinstance(node, (list, tuple)):
+        for item in node:
+            yield from iter_nodes(item)
+    elif is_dataclass(node):
+        yield node
+        for f in fields(node):
+            if not f.name.startswith('_'):  # 跳过语义分析标注
+                yield from iter_nodes(getattr(node, f.name))
@@ -0,0 +1,147 @@
+"""
+Batch Build - 在单个进程中按清单批量编译多个数据包
+清单为 TOML（或 JSON）文件，每个 [[pack]] 条目给出一个数据包:
+
+    [[pack]]
+    source = "skills/main.mcc"     # 必填，相对清单所在目录
+    target = "dist/skills"         # 必填
+    namespace = "skills"           # 可选，默认源文件名
+    version = "1.21.4"             # 可选，默认 1.21
+    fold_constants = false         # 可选，覆盖命令行的编译选项（键名同 DatapackWriter 的配置）
+
+命令行上的编译选项（--no-fold、--inline-size=N 等）作用于所有数据包，条目中的同名键优先。
+所有数据包共享同一个常驻的解析器和 AST 缓存；多核时在进程池中并行编译，
+每个工作进程各自保持解析器与内存缓存常驻，磁盘上的 AST 缓存在进程间共享。
+"""
+import contextlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ast_cache import ASTCache
+from write_datapack import DatapackWriter
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# 工作进程内共享的 AST 缓存（每个进程一个）
+_worker_cache: Optional[ASTCache] = None
+
+# 清单条目中可以单独设置的编译选项
+_OPTION_KEYS = (
+    "tree_shake", "fold_constants", "peephole", "nbt_cse", "eliminate_cleanup", "drop_cleanup",
+    "inline_if", "inline_functions", "inline_size", "unroll_size", "reset_temps", "early_return",
+)
+
+
+def load_manifest(manifest: Path) -> List[Dict[str, Any]]:
+    """读取清单，返回规范化后的条目列表（路径已相对清单目录解析）"""
+    if manifest.suffix == ".json":
+        with open(manifest, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    else:
+        if tomllib is None:
+            raise RuntimeError("读取 TOML 清单需要 Python 3.11+ 或安装 tomli，也可以改用 JSON 清单")
+        with open(manifest, 'rb') as f:
+            data = tomllib.load(f)
+
+    entries = data.get("pack", []) if isinstance(data, dict) else data
+    if not entries:
+        raise ValueError(f"清单中没有任何 [[pack]] 条目: {manifest}")
+
+    root = manifest.resolve().parent
+    packs = []
+    for i, entry in enumerate(entries):
+        if "source" not in entry or "target" not in entry:
+            raise ValueError(f"清单第 {i + 1} 个条目缺少 source 或 target")
+        source = root / entry["source"]
+        packs.append({
+            "source": str(source),
+            "target": str(root / entry["target"]),
+            "namespace": entry.get("namespace", source.stem),
+            "version": str(entry.get("version", "1.21")),
+            "options": {key: entry[key] for key in _OPTION_KEYS if key in entry},
+        })
+    return packs
+
+
+def build_pack(pack: Dict[str, Any], use_cache: bool = True,
+               ast_cache: Optional[ASTCache] = None,
+               options: Optional[Dict[str, Any]] = None) -> Tuple[bool, float, str, str]:
+    """
+    编译单个数据包，编译日志不直接输出
+    options 为命令行给出的编译选项，清单条目中的同名选项优先
+    返回 (是否成功, 耗时毫秒, 错误信息, 编译日志)
+    """
+    config = {
+        **(options or {}),
+        **pack.get("options", {}),
+        "namespace": pack["namespace"],
+        "mc_version": pack["version"],
+        "description": f"Compiled by MCC from {Path(pack['source']).name}",
+        "overwrite": True,
+        "cache": use_cache,
+    }
+
+    start = time.perf_counter()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            writer = DatapackWriter(pack["target"], config)
+            if ast_cache is not None:
+                writer.ast_cache = ast_cache
+            writer.compile_source(pack["source"])
+            writer.write()
+    except Exception as e:
+        return False, (time.perf_counter() - start) * 1000, str(e), log.getvalue()
+    return True, (time.perf_counter() - start) * 1000, "", log.getvalue()
+
+
+def _build_in_worker(pack: Dict[str, Any], use_cache: bool,
+                     options: Optional[Dict[str, Any]]) -> Tuple[bool, float, str, str]:
+    """进程池工作函数：复用本进程的解析器和 AST 缓存，导入模块在本进程内串行解析（避免嵌套进程池）"""
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = ASTCache(enabled=use_cache)
+    return build_pack(pack, use_cache, _worker_cache, {**(options or {}), "import_workers": 1})
+
+
+def run_batch(manifest: Path, use_cache: bool = True, max_workers: Optional[int] = None,
+              options: Optional[Dict[str, Any]] = None) -> bool:
+    """按清单编译全部数据包并打印耗时汇总，全部成功时返回 True"""
+    packs = load_manifest(manifest)
+    workers = min(max_workers or os.cpu_count() or 1, len(packs))
+
+    print(f"[Build] 清单: {manifest} ({len(packs)} 个数据包, {workers} 个进程)")
+    start = time.perf_counter()
+
+    if workers <= 1:
+        ast_cache = ASTCache(enabled=use_cache)
+        results = [build_pack(pack, use_cache, ast_cache, options) for pack in packs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_build_in_worker, packs, [use_cache] * len(packs), [options] * len(packs)))
+
+    total = (time.perf_counter() - start) * 1000
+
+    failed = 0
+    width = max(len(p["namespace"]) for p in packs)
+    for pack, (ok, ms, error, log) in zip(packs, results):
+        if ok:
+            print(f"  ✓ {pack['namespace']:<{width}}  {ms:8.1f} ms  -> {pack['target']}")
+        else:
+            failed += 1
+            print(log, end="")
+            print(f"  ✗ {pack['namespace']:<{width}}  {ms:8.1f} ms  错误: {error}")
+
+    print(f"[Build] 完成: 成功 {len(packs) - failed}, 失败 {failed}, 总耗时 {total:.1f} ms")
+    return failed == 0
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MCC 编译器性能基准
+用法: python3 benchmark.py <场景> [参数]
+
+场景:
+    parser    解析器冷启动 / 磁盘表缓存 / 进程内单例 的解析耗时对比
+    imports   合成模块图 (默认 100 个模块) 的串行 / 并行导入解析耗时对比
+    memory    合成程序 (默认 50000 条语句) 的 AST 内存：__slots__ 节点 vs 带 __dict__ 的节点
+    startup   mcc.py 启动导入耗时 (python -X importtime)，超出预算或提前加载编译器时返回非零
+    loops     范围循环每次迭代执行的指令数和函数调用数（自递归循环体 vs 按之前 head/body 互相调用估算）
+    foreach   遍历 10 / 100 / 1000 个元素的数组循环执行的指令数（工作副本 / 宏索引 vs 按之前逐个匹配下标估算）
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _timeit(fn, repeat: int = 1) -> float:
+    """执行 fn 并返回平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def _sample_source(funcs: int = 20) -> str:
+    """生成用于基准测试的示例源码"""
+    lines = ["struct Vec2 {", "    x: int,", "    y: int", "}", ""]
+    for i in range(funcs):
+        lines += [
+            f"fn helper_{i}(a: int, b: int) -> int {{",
+            "    let s = a * 2 + b",
+            "    if s > 10 {",
+            "        s = s - 10",
+            "    }",
+            "    return s",
+            "}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def bench_parser():
+    """解析器构建开销：冷启动（重建 LALR 表） vs 磁盘表缓存 vs 进程内单例"""
+    import parser as mcc_parser
+
+    source = _sample_source()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ["MCC_CACHE_DIR"] = cache_dir
+
+        mcc_parser.reset_parser(remove_tables=True)
+        cold = _timeit(lambda: mcc_parser.parse(source))
+
+        mcc_parser.reset_parser()
+        disk = _timeit(lambda: mcc_parser.parse(source))
+
+        warm = _timeit(lambda: mcc_parser.parse(source), repeat=20)
+
+    print("[Bench] 解析器构建")
+    print(f"  冷启动 (生成 LALR 表): {cold:8.2f} ms")
+    print(f"  磁盘表缓存:            {disk:8.2f} ms")
+    print(f"  进程内单例:            {warm:8.2f} ms")
+
+
+def _write_module_graph(root: str, modules: int, funcs: int = 20) -> str:
+    """生成二叉树形状的模块图，返回入口文件路径"""
+    for i in range(modules):
+        imports = [f'import "./mod_{c}.mcc"' for c in (2 * i + 1, 2 * i + 2) if c < modules]
+        body = [
+            f"fn m{i}_f{j}(a: int) -> int {{\n    let s = a * {j} + 1\n    return s\n}}"
+            for j in range(funcs)
+        ]
+        with open(os.path.join(root, f"mod_{i}.mcc"), "w", encoding="utf-8") as f:
+            f.write("\n".join(imports + body) + "\n")
+
+    entry = os.path.join(root, "main.mcc")
+    with open(entry, "w", encoding="utf-8") as f:
+        f.write('import "./mod_0.mcc"\n')
+    return entry
+
+
+def bench_imports(modules: str = "100"):
+    """导入图解析：串行 vs 进程池并行"""
+    from import_resolver import merge_imports
+    from parser import parse
+
+    modules = int(modules)
+    with tempfile.TemporaryDirectory() as root:
+        entry = _write_module_graph(root, modules)
+        with open(entry, encoding="utf-8") as f:
+            program = parse(f.read())
+
+        results = {}
+        for label, workers in (("串行", 1), ("并行", None)):
+            results[label] = _timeit(lambda: merge_imports(program, root, max_workers=workers))
+
+        merged = merge_imports(program, root, max_workers=1)
+
+    print(f"[Bench] 导入图解析 ({modules} 个模块, {len(merged.stmts)} 个声明, {os.cpu_count()} 核)")
+    for label, ms in results.items():
+        print(f"  {label}: {ms:8.2f} ms")
+
+
+def _memory_source(stmts: int) -> str:
+    """生成约 stmts 条语句的程序：每个函数 50 条语句"""
+    lines = []
+    for f in range((stmts + 49) // 50):
+        lines.append(f"fn mem_{f}(a: int) -> int {{")
+        lines.append("    let s = a")
+        for i in range(48):
+            lines.append(f"    s = s * {i % 7 + 1} + a - {i}")
+        lines.append("    return s")
+        lines.append("}")
+    return "\n".join(lines)
+
+
+def _legacy_classes() -> dict:
+    """为每个 AST 节点类生成等价的、不带 __slots__ 的 dataclass（旧的节点表示）"""
+    import ast_nodes
+    from dataclasses import fields, is_dataclass, make_dataclass
+
+    legacy = {}
+    for name in dir(ast_nodes):
+        cls = getattr(ast_nodes, name)
+        if isinstance(cls, type) and is_dataclass(cls) and cls.__module__ == ast_nodes.__name__:
+            real = [(f.name, f.type) for f in fields(cls) if not f.name.startswith('_')]
+            legacy[cls] = make_dataclass(f"Legacy{name}", real)
+    return legacy
+
+
+_FIELD_NAMES: dict = {}
+
+
+def _field_names(cls):
+    """按节点类缓存 (普通字段, 标注字段) 名称"""
+    from dataclasses import fields
+
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        all_names = [f.name for f in fields(cls)]
+        names = _FIELD_NAMES[cls] = ([n for n in all_names if not n.startswith('_')],
+                                     [n for n in all_names if n.startswith('_')])
+    return names
+
+
+def _clone(node, classes):
+    """复制 AST：classes 为 None 时保持节点类，否则映射到对应的旧节点类；
+    语义分析标注只复制已写入的值（旧表示中它们是按需添加的实例属性）"""
+    if isinstance(node, list):
+        return [_clone(n, classes) for n in node]
+    if isinstance(node, tuple):
+        return tuple(_clone(n, classes) for n in node)
+
+    cls = type(node)
+    if not hasattr(cls, '__dataclass_fields__'):
+        return node
+
+    real, notes = _field_names(cls)
+    copy = (classes[cls] if classes else cls)(**{n: _clone(getattr(node, n), classes) for n in real})
+    for n in notes:
+        value = getattr(node, n)
+        if value is not None and value is not False:
+            setattr(copy, n, value)
+    return copy
+
+
+def bench_memory(stmts: str = "50000"):
+    """AST 内存占用：两种节点表示持有相同的字段和语义分析标注"""
+    import gc
+    import tracemalloc
+    from analyzer import SemanticAnalyzer
+    from parser import parse
+
+    stmts = int(stmts)
+    program = parse(_memory_source(stmts))
+    SemanticAnalyzer().analyze(program)
+    legacy = _legacy_classes()
+
+    results = {}
+    for label, classes in (("__slots__", None), ("__dict__", legacy)):
+        gc.collect()
+        tracemalloc.start()
+        tree = _clone(program, classes)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[label] = size / 1024 / 1024
+        del tree
+
+    print(f"[Bench] AST 内存 ({stmts} 条语句，已完成语义分析)")
+    for label, mb in results.items():
+        print(f"  {label:<10} {mb:8.2f} MB")
+    print(f"  节省: {(1 - results['__slots__'] / results['__dict__']) * 100:.1f}%")
+
+
+# mcc.py 在参数校验阶段（--help、路径错误）的导入耗时预算（毫秒）
+STARTUP_BUDGET_MS = 80
+
+# 参数校验阶段不应加载的编译器模块
+LAZY_MODULES = ("write_datapack", "parser", "ply", "analyzer", "code_generator")
+
+
+def _import_times(args) -> dict:
+    """以 -X importtime 运行 mcc.py，返回 {顶层模块名: 累计导入耗时(毫秒)}"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcc.py")
+    proc = subprocess.run([sys.executable, "-X", "importtime", script] + args,
+                          capture_output=True, text=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # 只统计顶层导入，子模块已计入累计耗时
+            times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def bench_startup():
+    """启动耗时：参数校验路径不应导入编译器各阶段"""
+    ok = True
+    print(f"[Bench] 启动导入耗时 (预算 {STARTUP_BUDGET_MS} ms)")
+    for label, args in (("--help", ["--help"]), ("源文件不存在", ["__missing__.mcc", "out"])):
+        times = _import_times(args)
+        total = sum(times.values())
+        eager = [m for m in LAZY_MODULES if m in times]
+        status = "✓" if total <= STARTUP_BUDGET_MS and not eager else "✗"
+        print(f"  {status} {label}: {total:8.2f} ms")
+        for name, ms in sorted(times.items(), key=lambda kv: -kv[1])[:3]:
+            print(f"      {name:<24} {ms:8.2f} ms")
+        if eager:
+            print(f"      提前加载了: {', '.join(eager)}")
+        ok = ok and status == "✓"
+    if not ok:
+        sys.exit(1)
+
+
+_LOOP_SOURCE = """
+struct Vec2 {
+    x: int,
+    y: int
+}
+
+fn total(n: int) -> int {
+    let acc = 0
+    for i in 0..n {
+        acc = acc + i
+    }
+    return acc
+}
+
+fn fixed() -> int {
+    let acc = 0
+    for i in 0..100 {
+        acc = acc + i * 2
+    }
+    return acc
+}
+
+fn shifted(v: Vec2) -> int {
+    let acc = 0
+    for i in 0..10 {
+        acc = acc + v.x
+    }
+    return acc
+}
+"""
+
+
+def _compile_bench(source: str) -> dict:
+    """按默认优化编译源码，返回 {路径: 指令列表}"""
+    from analyzer import SemanticAnalyzer
+    from cleanup_eliminator import CleanupEliminator
+    from code_generator import CodeGenerator
+    from const_folder import ConstantFolder
+    from parser import parse
+    from peephole import PeepholeOptimizer
+    from temp_allocator import TempAllocator
+
+    program = parse(source)
+    SemanticAnalyzer().analyze(program)
+    gen = CodeGenerator(namespace="bench")
+    gen.folder = ConstantFolder()
+    gen.cleanup = CleanupEliminator()
+    gen.temp_allocator = TempAllocator()
+    gen.peephole = PeepholeOptimizer()
+    gen.return_command = True
+    return gen.generate(program)
+
+
+def bench_loops():
+    """范围循环的每次迭代开销：按默认优化编译，统计循环体函数的指令数"""
+    files = _compile_bench(_LOOP_SOURCE)
+
+    # 之前的 lowering 已经不再生成，按它的结构估算：_body 末尾调用 _head，_head 判断边界后再调用 _body，
+    # 每次迭代多一条判断和一次调用
+    print("[Bench] 范围循环每次迭代的开销 (指令数 / function 调用数，宏函数每次调用都要重新展开)")
+    print(f"  {'循环':<18} {'head/body(估算)':>12} {'自递归':>7}")
+    for path, lines in files.items():
+        name = os.path.basename(path)[:-len(".mcfunction")]
+        if "_for_" not in name or not name.endswith("_body"):
+            continue
+        commands = len(lines)
+        macro = " (宏)" if lines[-1].startswith("$") else ""
+        print(f"  {name[:-len('_body')] + macro:<20} {f'{commands + 1} / 2':>16} {f'{commands} / 1':>10}")
+
+
+def _foreach_source(sizes) -> str:
+    """每个长度一个只读遍历和一个在循环体中修改数组的遍历"""
+    lines = []
+    for n in sizes:
+        items = ", ".join(str(i) for i in range(n))
+        for kind, write in (("read", ""), ("write", "        xs[0] = x\n")):
+            lines += [
+                f"fn {kind}_{n}() -> int {{",
+                f"    let xs: int[] = [{items}]",
+                "    let acc = 0",
+                "    for x in xs {",
+                f"{write}        acc = acc + x",
+                "    }",
+                "    return acc",
+                "}",
+                "",
+            ]
+    return "\n".join(lines)
+
+
+def bench_foreach(*sizes):
+    """数组循环的开销：每次迭代载入元素的指令数与遍历整个数组的总指令数"""
+    sizes = [int(n) for n in sizes] or [10, 100, 1000]
+    files = _compile_bench(_foreach_source(sizes))
+    bodies = {}
+    for path, lines in files.items():
+        name = os.path.basename(path)[:-len(".mcfunction")]
+        if "_foreach_" in name and name.endswith("_body"):
+            bodies[name.split("_foreach_")[0]] = lines
+
+    # 之前的 lowering 已经不再生成，按它的结构估算：_head 中每个下标一条 execute if score _idx matches i（最多 50 条，更长的数组只载入前 50 个），
+    # 加一条边界判断；_body 末尾计数加一并调用 _head
+    print("[Bench] 数组循环遍历的开销 (每次迭代指令数 / 遍历总指令数，宏索引每次迭代另有一次宏函数展开)")
+    print(f"  {'元素数':<8} {'下标匹配(估算)':>16} {'工作副本':>16} {'宏索引':>16}")
+    for n in sizes:
+        read, write = bodies[f"read_{n}"], bodies[f"write_{n}"]
+        statements = len(read) - 3  # 载入、删除 [0]、尾调用
+        before = min(n, 50) + 1 + statements + 2
+        copy = len(read)
+        indexed = len(write) + 1  # __array_get 宏函数
+        truncated = "*" if n > 50 else " "
+        print(f"  {n:<8} {f'{before} / {before * n}{truncated}':>16} {f'{copy} / {copy * n}':>16} "
+              f"{f'{indexed} / {indexed * n}':>16}")
+    if any(n > 50 for n in sizes):
+        print("  * 之前只载入前 50 个元素，之后的迭代读到的仍是第 50 个元素")
+
+
+BENCHMARKS = {
+    "parser": bench_parser,
+    "imports": bench_imports,
+    "memory": bench_memory,
+    "startup": bench_startup,
+    "loops": bench_loops,
+    "foreach": bench_foreach,
+}
+
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in BENCHMARKS:
+        print(__doc__)
+        sys.exit(1)
+    BENCHMARKS[args[0]](*args[1:])
+
+
+if __name__ == "__main__":
+    main()
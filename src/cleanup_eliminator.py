@@ -0,0 +1,191 @@
+"""
+Cleanup Eliminator - 删除函数退出后不会被读取的局部变量赋值
+CodeGenerator._gen_cleanup 在每个函数末尾把所有局部变量（数组长度、结构体字段）置 0。
+局部变量总是先初始化再读取，这些赋值大多不会被观察到，对 $tick 调用的小函数来说清理比函数体还长。
+
+这里在 IR 上做跨函数的活跃分析：
+  - UE(F)：执行 F（包括它调用的函数）时，可能在写入前就被读取的分数
+  - LO(F)：F 返回后其值可能被读取的分数
+      入口函数（没有被其他函数调用的、被 schedule 的）返回后，任何入口函数的 UE 都可能读到它的值；
+      在调用点 C[i] 处，被调函数返回后的值由 C 中第 i 条之后的指令（以及 C 返回之后）读取；
+      execute as @a/@e 会连续执行被调函数多次，前一次的值会被下一次的 UE 读到
+然后在每个函数中从 LO(F) 开始倒序扫描，删除写入后不再活跃的局部变量 set 指令。
+
+只处理属于某个函数的局部变量（{函数名}_ 前缀，且不是全局变量），全局变量可能被外部读取。
+计分板指令以外的指令中以文本出现的分数持有者视为被读取，无法确定目标的函数调用视为可能调用任意函数。
+数组、结构体按引用传递时宏参数只是变量名前缀（{arr:"main_arr"}），被调函数通过 $(arr)_len 读取调用者的局部变量：
+作为宏参数传出的前缀下的变量在传参处视为被读取，宏指令视为读取所有传出过的前缀下的变量。
+"""
+import re
+from typing import TYPE_CHECKING, Dict, List, Set
+
+from command_ir import Command, Execute, Score, ScoreAdd, ScoreGet, ScoreOp, ScoreReset, ScoreSet, score_kills
+
+if TYPE_CHECKING:
+    from command_builder import MCFunction
+
+_CALL_RE = re.compile(r'(?<!schedule )\bfunction (\S+)')
+_SCHEDULE_RE = re.compile(r'\bschedule function (\S+)')
+_RETURN_RE = re.compile(r'(?:^|\brun )return\b')
+_MULTI_RE = re.compile(r'@[ae]\b|limit=')
+_TOKEN_RE = re.compile(r'[\w.+-]+')
+_MACRO_ARG_RE = re.compile(r'[:\s]"([\w.+-]+)"')
+
+
+class _Info:
+    """一条指令在活跃分析中用到的信息"""
+    __slots__ = ('reads', 'kills', 'callees', 'returns', 'multi')
+
+    def __init__(self, reads: Set[Score], kills: Set[Score], callees: Set[str], returns: bool, multi: bool):
+        self.reads = reads
+        self.kills = kills
+        self.callees = callees
+        self.returns = returns
+        self.multi = multi
+
+
+class CleanupEliminator:
+    """跨函数活跃分析，删除函数退出后不会被读取的局部变量赋值"""
+
+    def __init__(self):
+        self.removed: Dict[str, int] = {}  # 函数名 -> 删除的指令数
+
+    def run(self, functions: Dict[str, 'MCFunction'], namespace: str,
+            local_prefixes: Set[str], global_names: Set[str]):
+        self.namespace = namespace
+        self.names = set(functions)
+        self.candidates = self._candidates(functions, local_prefixes, global_names)
+        if not self.candidates:
+            return
+        self.passed = set()  # 作为宏参数传出过的前缀下的局部变量
+        for func in functions.values():
+            for cmd in func.commands:
+                self.passed |= self._under(_MACRO_ARG_RE.findall(str(cmd)))
+
+        infos = {name: [self._info(cmd) for cmd in func.commands] for name, func in functions.items()}
+        callers: Dict[str, Set[str]] = {name: set() for name in functions}
+        roots: Set[str] = set()
+        for name, func in functions.items():
+            for cmd, info in zip(func.commands, infos[name]):
+                for callee in info.callees:
+                    callers[callee].add(name)
+                roots |= self._resolve(_SCHEDULE_RE.findall(str(cmd)))
+        roots |= {name for name, c in callers.items() if not c - {name}}
+
+        ue = self._upward_exposed(infos)
+        lo = self._live_out(infos, ue, roots)
+
+        for name, func in functions.items():
+            live = set(lo[name])
+            kept: List[Command] = []
+            for cmd, info in zip(reversed(func.commands), reversed(infos[name])):
+                if isinstance(cmd, ScoreSet) and info.kills <= self.candidates and not info.kills & live:
+                    continue
+                kept.append(cmd)
+                live = self._step(info, live, ue, lo[name])
+            if len(kept) != len(func.commands):
+                self.removed[name] = len(func.commands) - len(kept)
+                func.commands = kept[::-1]
+
+    # ========== 指令信息 ==========
+
+    def _candidates(self, functions, local_prefixes: Set[str], global_names: Set[str]) -> Set[Score]:
+        """被 set 写入的函数局部变量"""
+        def is_local(holder: str) -> bool:
+            if any(holder == g or holder.startswith(f"{g}_") for g in global_names):
+                return False
+            return any(holder.startswith(f"{p}_") for p in local_prefixes)
+
+        scores = set()
+        for func in functions.values():
+            for cmd in func.commands:
+                if isinstance(cmd, ScoreSet) and is_local(cmd.target):
+                    scores.add((cmd.target, cmd.objective))
+        return scores
+
+    def _under(self, bases: List[str]) -> Set[Score]:
+        """以 bases 中某个名字为前缀（{base}_...）的局部变量"""
+        prefixes = tuple(f"{b}_" for b in bases)
+        return {s for s in self.candidates if s[0].startswith(prefixes)} if prefixes else set()
+
+    def _resolve(self, targets: List[str]) -> Set[str]:
+        """函数引用 -> 本数据包中的函数名"""
+        names = set()
+        for target in targets:
+            if target.startswith('#') or '$(' in target:
+                # 函数标签或宏拼接的函数名：无法确定目标
+                return set(self.names)
+            ns, _, name = target.partition(':')
+            if ns == self.namespace and name in self.names:
+                names.add(name)
+        return names
+
+    def _info(self, cmd: Command) -> _Info:
+        text = str(cmd)
+        reads = cmd.score_reads()
+        run = cmd
+        while isinstance(run, Execute) and run.run is not None:
+            run = run.run
+        if not isinstance(run, (ScoreSet, ScoreAdd, ScoreOp, ScoreGet, ScoreReset)):
+            # 原始指令（tellraw 的 score 组件等）、宏指令以及把分数名写入 storage 交给数组宏的指令：
+            # 文本中出现的持有者都视为被读取
+            tokens = set(_TOKEN_RE.findall(text))
+            reads |= {s for s in self.candidates if s[0] in tokens}
+            reads |= self._under(_MACRO_ARG_RE.findall(text))
+        if '$(' in text:
+            reads |= self.passed
+        for holder, objective in list(reads):
+            if holder == '*':
+                reads |= {s for s in self.candidates if s[1] == objective}
+        callees = self._resolve(_CALL_RE.findall(text))
+        return _Info(reads & self.candidates, score_kills(cmd), callees,
+                     bool(_RETURN_RE.search(text)), bool(callees and _MULTI_RE.search(text)))
+
+    # ========== 分析 ==========
+
+    @staticmethod
+    def _step(info: _Info, live: Set[Score], ue: Dict[str, Set[Score]], live_out: Set[Score]) -> Set[Score]:
+        """倒序扫描一步：由指令之后的活跃集合得到指令之前的活跃集合"""
+        live = live - info.kills
+        if info.returns:
+            live |= live_out
+        for callee in info.callees:
+            live |= ue[callee]
+        return live | info.reads
+
+    def _upward_exposed(self, infos: Dict[str, List[_Info]]) -> Dict[str, Set[Score]]:
+        ue: Dict[str, Set[Score]] = {name: set() for name in infos}
+        changed = True
+        while changed:
+            changed = False
+            for name, func_infos in infos.items():
+                live: Set[Score] = set()
+                for info in reversed(func_infos):
+                    live = self._step(info, live, ue, set())
+                if live != ue[name]:
+                    ue[name] = live
+                    changed = True
+        return ue
+
+    def _live_out(self, infos: Dict[str, List[_Info]], ue: Dict[str, Set[Score]],
+                  roots: Set[str]) -> Dict[str, Set[Score]]:
+        entry = set().union(*(ue[r] for r in roots))
+        lo = {name: set(entry) if name in roots else set() for name in infos}
+        changed = True
+        while changed:
+            changed = False
+            for name, func_infos in infos.items():
+                live = set(lo[name])
+                for info in reversed(func_infos):
+                    after = live
+                    if info.multi:
+                        after = after.union(*(ue[c] for c in info.callees))
+                    for callee in info.callees:
+                        if not after <= lo[callee]:
+                            lo[callee] |= after
+                            changed = True
+                    live = self._step(info, live, ue, lo[name])
+        return lo
+
+    def summary(self) -> str:
+        return f"{len(self.removed)} 个函数, 删除 {sum(self.removed.values())} 条不会被读取的赋值"
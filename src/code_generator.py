@@ -1,10 +1,19 @@
-from typing import Dict, List
+import re
+from typing import Dict, List, Optional
 
 from annotation_processor import AnnotationProcessor, AnnotationResult
-from ast_nodes import Program, FuncDecl, StructDecl, IfStmt, ReturnStmt, StaticTagDecl
+from ast_nodes import Program, FuncDecl, StructDecl, StaticTagDecl, LetStmt
+from cleanup_eliminator import CleanupEliminator
 from command_builder import CommandBuilder
+from command_ir import as_command
+from const_folder import ConstantFolder
+from inliner import Inliner, lower_if_return, tail_returns
+from unroller import LoopUnroller
+from nbt_cse import NbtReadEliminator
+from peephole import PeepholeOptimizer
 from context import GeneratorContext
 from stmt_generator import StmtGenerator
+from temp_allocator import TempAllocator
 
 
 class CodeGenerator:
@@ -16,6 +25,19 @@ class CodeGenerator:
         self.stmt_gen = StmtGenerator(self.ctx, self.builder)
         self.block_counter = 0
         self.annotation_result: AnnotationResult = None  # 新增：存储注解处理结果
+        self.incremental = None  # 可选的 IncrementalBuild，用于复用未变化函数的输出
+        self.tree_shake = False  # 为 True 时只输出被引用到的数组宏函数
+        self.removed_macros: List[str] = []
+        self.temp_allocator: Optional[TempAllocator] = None  # 设置后在输出前合并临时变量
+        self.folder: Optional[ConstantFolder] = None  # 设置后在生成前折叠常量表达式
+        self.unroller: Optional[LoopUnroller] = None  # 设置后展开常量次数的小范围循环
+        self.inliner: Optional[Inliner] = None  # 设置后在调用处展开小函数
+        self.nbt_cse: Optional[NbtReadEliminator] = None  # 设置后复用函数内重复的实体 NBT 读取
+        self.peephole: Optional[PeepholeOptimizer] = None  # 设置后在输出前化简每个函数的指令流
+        self.cleanup: Optional[CleanupEliminator] = None  # 设置后删除函数退出后不会被读取的清理赋值
+        self.drop_cleanup = False  # 为 True 时不生成函数退出时的变量清理（实体标签仍然移除）
+        self.return_command = False  # 目标版本支持 return 指令（1.20.3+），循环尾调用使用 return run function
+        self.early_return = False  # 为 True 时用 return 指令实现任意位置的提前返回（需要 return_command）
 
     def get_storage_name(self, var_name: str, is_param: bool = False) -> str:
         return self.ctx.get_storage_name(var_name, is_param)
@@ -48,6 +70,7 @@ class CodeGenerator:
         self.ctx.param_substitutions.clear()
         self.ctx.struct_params.clear()
         self.ctx.array_lengths.clear()
+        self.ctx.const_pool.clear()
 
         processor = AnnotationProcessor(self.namespace)
         self.annotation_result = processor.process_program(program)
@@ -58,11 +81,24 @@ class CodeGenerator:
 
         self._collect_functions(program)
 
+        if self.folder:
+            self.folder.prepare(program)
+            self.folder.fold_globals(program)
+        if self.unroller:
+            self.unroller.folder = self.folder
+        if self.inliner:
+            self.inliner.fold = self.folder is not None
+            self.ctx.inliner = self.inliner
+        self.ctx.drop_cleanup = self.drop_cleanup
+        self.ctx.return_command = self.return_command
+        self.ctx.early_return = self.early_return and self.return_command
+
         load_func = self.builder.new_function("__init__", is_load=True)
 
         load_func.extend(self.builder.generate_init_commands())
 
         load_func.add("scoreboard players set _const100 _tmp 100")
+        const_index = len(load_func.commands)
 
         load_func.extend(self.ctx.global_inits)
 
@@ -73,22 +109,43 @@ class CodeGenerator:
             if isinstance(stmt, (FuncDecl, StructDecl, StaticTagDecl)):
                 continue
             self.stmt_gen.gen_stmt(stmt, main_func)
+        if self.inliner:
+            self.inliner.global_vars = dict(self.ctx.var_map)
 
         for stmt in program.stmts:
             if isinstance(stmt, FuncDecl):
                 # 跳过不生成函数体的（$loot, $predicate）
                 if stmt.name not in self.annotation_result.skip_function_body:
-                    self._gen_func_decl(stmt)
+                    if self.incremental:
+                        self.incremental.gen_func_decl(self, stmt)
+                    else:
+                        self._gen_func_decl(stmt)
+
+        # 常量池在所有代码生成完成后才确定，插入到 _const100 之后
+        load_func.commands[const_index:const_index] = [
+            as_command(self.builder.set_score(holder, "_tmp", value))
+            for value, holder in sorted(self.ctx.const_pool.items())
+        ]
+
+        if self.cleanup:
+            global_names = {stmt.name for stmt in program.stmts if isinstance(stmt, LetStmt)}
+            self.cleanup.run(self.builder.functions, self.namespace, set(self.ctx.funcs), global_names)
+        if self.nbt_cse:
+            self.nbt_cse.run(self.builder.functions)
+        if self.temp_allocator:
+            self.temp_allocator.run(self.builder.functions)
+        if self.peephole:
+            self.peephole.run(self.builder.functions)
 
         result = {}
 
         for name, func in self.builder.functions.items():
             if func.is_load:
-                result[f"data/{self.namespace}/functions/__init__.mcfunction"] = func.commands
+                result[f"data/{self.namespace}/functions/__init__.mcfunction"] = func.render()
             elif func.is_tick:
-                result[f"data/{self.namespace}/functions/__tick__.mcfunction"] = func.commands
+                result[f"data/{self.namespace}/functions/__tick__.mcfunction"] = func.render()
             else:
-                result[f"data/{self.namespace}/functions/{name}.mcfunction"] = func.commands
+                result[f"data/{self.namespace}/functions/{name}.mcfunction"] = func.render()
 
         result[f"data/minecraft/tags/functions/load.json"] = {
             "values": [f"{self.namespace}:__init__"]
@@ -153,6 +210,15 @@ class CodeGenerator:
 
         return result
 
+    def command_stats(self) -> Dict[str, int]:
+        """按 IR 指令类型统计生成的指令数（渲染为文本之前）"""
+        stats: Dict[str, int] = {}
+        for func in self.builder.functions.values():
+            for cmd in func.commands:
+                kind = type(cmd).__name__
+                stats[kind] = stats.get(kind, 0) + 1
+        return dict(sorted(stats.items(), key=lambda kv: -kv[1]))
+
     def _collect_functions(self, program: Program):
         """收集结构体和函数签名"""
         for stmt in program.stmts:
@@ -172,6 +238,10 @@ class CodeGenerator:
         """生成函数定义 - 支持 $event 的 revoke 注入"""
         func_name = stmt.name
         self.ctx.current_function = func_name
+        if self.folder:
+            self.folder.fold_function(stmt)
+        if self.unroller:
+            self.unroller.unroll_function(stmt)
 
         mcfunc = self.builder.new_function(f"fn_{func_name}")
         self.ctx.current_mcfunc = mcfunc
@@ -208,73 +278,34 @@ class CodeGenerator:
         if func_name in self.annotation_result.event_functions:
             self.emit(f"advancement revoke @s only minecraft:{self.namespace}/{func_name}")
 
-        # 关键逻辑：处理 if-return 模式，自动转换为 if-else
-        i = 0
-        while i < len(stmt.body):
-            s = stmt.body[i]
-            # 检测：if 语句，then 块以 return 结尾，且没有 else 块
-            if (isinstance(s, IfStmt) and
-                    s.then_block and
-                    isinstance(s.then_block[-1], ReturnStmt) and
-                    not s.else_block and
-                    i + 1 < len(stmt.body)):
-
-                # 将 if 语句之后的所有语句收集为 else 块
-                else_stmts = stmt.body[i + 1:]
-                # 截断 body，只保留到 if 语句（包含）
-                remaining_body = stmt.body[:i + 1]
-
-                # 修改 if 语句，添加 else 块
-                s.else_block = else_stmts
-
-                # 生成修改后的 if 语句
-                self.stmt_gen.gen_stmt(s, mcfunc)
-
-                # 跳过已处理的语句
-                break
-            else:
-                self.stmt_gen.gen_stmt(s, mcfunc)
-                i += 1
+        if self.ctx.early_return:
+            # return 指令直接结束函数，末尾的 return 不需要
+            self.ctx.tail_returns = tail_returns(stmt.body)
+            self.ctx.can_exit = True
+        else:
+            # 关键逻辑：处理 if-return 模式，自动转换为 if-else
+            stmt.body = lower_if_return(stmt.body)
+        for s in stmt.body:
+            self.stmt_gen.gen_stmt(s, mcfunc)
 
         self._gen_cleanup()
         self.ctx.pop_block()
         self.ctx.current_macro_args.clear()
         self.ctx.current_function = None
+        self.ctx.can_exit = False
+        self.ctx.tail_returns = set()
 
     def _gen_cleanup(self):
         """生成函数退出时的清理代码 - 包含实体标签"""
         func_prefix = f"{self.ctx.current_function}_"
 
-        # 1. 清理普通变量（原有逻辑）
-        vars_to_clean = []
+        # 1. 清理普通变量（结构体字段、数组长度、数值变量）
+        if not self.drop_cleanup:
+            for score in self.ctx.local_scores():
+                self.emit(self.builder.set_score(score, "_tmp", 0))
         for var_name, (storage, var_type) in list(self.ctx.var_map.items()):
-            if var_name in self.ctx.struct_params:
-                continue
-            if not storage.startswith(func_prefix):
-                continue
-
-            if var_type.kind == 'struct':
-                # 结构体清理...
-                if var_type.name in self.ctx.structs:
-                    for fname, ftype in self.ctx.structs[var_type.name].items():
-                        if ftype.is_value_type():
-                            self.emit(self.builder.set_score(f"{storage}_{fname}", "_tmp", 0))
-                        elif ftype.kind == 'array':
-                            self.emit(self.builder.set_score(f"{storage}_{fname}_len", "_tmp", 0))
-                if var_name in self.ctx.var_map:
-                    del self.ctx.var_map[var_name]
-
-            elif var_type.kind == 'array':
-                self.emit(self.builder.set_score(f"{storage}_len", "_tmp", 0))
-                if var_name in self.ctx.var_map:
-                    del self.ctx.var_map[var_name]
-
-            elif var_type.kind == 'prim':
-                vars_to_clean.append((var_name, storage))
-
-        for var_name, storage in vars_to_clean:
-            self.emit(self.builder.set_score(storage, "_tmp", 0))
-            if var_name in self.ctx.var_map:
+            if (var_name not in self.ctx.struct_params and storage.startswith(func_prefix) and
+                    var_type.kind in ('struct', 'array', 'prim')):
                 del self.ctx.var_map[var_name]
 
         # 2. 新增：清理实体标签（关键！）
@@ -352,4 +383,19 @@ class CodeGenerator:
                 f"$data modify storage {ns}:data $(path)[$(index)] set from storage {ns}:data $(source)"
             ],
         }
-        result.update(macros)
\ No newline at end of file
+        if self.tree_shake:
+            macros = self._used_macros(result, macros)
+        result.update(macros)
+
+    def _used_macros(self, result: Dict[str, List[str]], macros: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """过滤掉没有任何函数调用到的宏函数"""
+        commands = "\n".join(cmd for content in result.values() if isinstance(content, list)
+                              for cmd in content if isinstance(cmd, str))
+        used = {}
+        for path, content in macros.items():
+            name = path.rsplit('/', 1)[-1][:-len('.mcfunction')]
+            if re.search(rf"\bfunction {re.escape(self.namespace)}:{name}\b", commands):
+                used[path] = content
+            else:
+                self.removed_macros.append(name)
+        return used
\ No newline at end of file
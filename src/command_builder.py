@@ -1,21 +1,27 @@
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
+
+from command_ir import Command, as_command, render
 
 
 @dataclass
 class MCFunction:
-    """代表一个.mcfunction文件"""
+    """代表一个.mcfunction文件，指令以 IR 形式保存，输出时再渲染为文本"""
     name: str
-    commands: List[str] = field(default_factory=list)
+    commands: List[Command] = field(default_factory=list)
     is_tick: bool = False
     is_load: bool = False
 
-    def add(self, cmd: str):
-        if cmd.strip():
-            self.commands.append(cmd)
+    def add(self, cmd: Union[str, Command]):
+        if isinstance(cmd, Command) or cmd.strip():
+            self.commands.append(as_command(cmd))
+
+    def extend(self, cmds: List[Union[str, Command]]):
+        for cmd in cmds:
+            self.add(cmd)
 
-    def extend(self, cmds: List[str]):
-        self.commands.extend([c for c in cmds if c.strip()])
+    def render(self) -> List[str]:
+        return render(self.commands)
 
 
 class CommandBuilder:
@@ -0,0 +1,348 @@
+"""
+Command IR - 代码生成与 .mcfunction 文本之间的类型化指令表示
+子生成器仍然以字符串构造指令，MCFunction 在收到指令时将其提升 (lift) 为 IR，
+最后由 render 统一输出文本。后续的优化阶段可以在 IR 上分析读写和控制流。
+
+指令类型:
+    ScoreSet / ScoreAdd / ScoreOp / ScoreGet / ScoreReset   计分板
+    StorageSet / StorageCopy / StorageGet / StorageRemove   storage
+    FunctionCall                                            函数调用
+    Execute                                                 条件执行 (execute ... run ...)
+    MacroLine                                               宏指令 ($ 开头)
+    RawCmd                                                  其余无法识别的指令
+
+提升是保守的：只有重新输出后与原文本完全一致时才使用类型化指令，否则保留为 RawCmd。
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Set, Tuple, Union
+
+# (分数持有者, 计分项)
+Score = Tuple[str, str]
+
+
+@dataclass(slots=True)
+class Command:
+    """所有 IR 指令的基类"""
+
+    # 无法确定读写范围的指令（函数调用、宏、原始指令），优化时必须视为读写一切
+    opaque = False
+
+    def score_reads(self) -> Set[Score]:
+        return set()
+
+    def score_writes(self) -> Set[Score]:
+        return set()
+
+
+@dataclass(slots=True)
+class ScoreSet(Command):
+    target: str
+    objective: str
+    value: int
+
+    def score_writes(self) -> Set[Score]:
+        return {(self.target, self.objective)}
+
+    def __str__(self):
+        return f"scoreboard players set {self.target} {self.objective} {self.value}"
+
+
+@dataclass(slots=True)
+class ScoreAdd(Command):
+    """scoreboard players add / remove（value 为负时输出 remove）"""
+    target: str
+    objective: str
+    value: int
+
+    def score_reads(self) -> Set[Score]:
+        return {(self.target, self.objective)}
+
+    def score_writes(self) -> Set[Score]:
+        return {(self.target, self.objective)}
+
+    def __str__(self):
+        if self.value < 0:
+            return f"scoreboard players remove {self.target} {self.objective} {-self.value}"
+        return f"scoreboard players add {self.target} {self.objective} {self.value}"
+
+
+@dataclass(slots=True)
+class ScoreOp(Command):
+    """scoreboard players operation，op 为 '=' 时即分数复制"""
+    op: str
+    target: str
+    target_obj: str
+    source: str
+    source_obj: str
+
+    @property
+    def is_copy(self) -> bool:
+        return self.op == '='
+
+    def score_reads(self) -> Set[Score]:
+        reads = {(self.source, self.source_obj)}
+        if self.op != '=':
+            reads.add((self.target, self.target_obj))
+        return reads
+
+    def score_writes(self) -> Set[Score]:
+        if self.op == '><':
+            return {(self.target, self.target_obj), (self.source, self.source_obj)}
+        return {(self.target, self.target_obj)}
+
+    def __str__(self):
+        return (f"scoreboard players operation {self.target} {self.target_obj} "
+                f"{self.op} {self.source} {self.source_obj}")
+
+
+@dataclass(slots=True)
+class ScoreGet(Command):
+    target: str
+    objective: str
+
+    def score_reads(self) -> Set[Score]:
+        return {(self.target, self.objective)}
+
+    def __str__(self):
+        return f"scoreboard players get {self.target} {self.objective}"
+
+
+@dataclass(slots=True)
+class ScoreReset(Command):
+    target: str
+    objective: Optional[str] = None
+
+    def score_writes(self) -> Set[Score]:
+        return {(self.target, self.objective)} if self.objective else set()
+
+    @property
+    def opaque(self) -> bool:
+        # 不带计分项的 reset 会清除该持有者的所有分数
+        return self.objective is None
+
+    def __str__(self):
+        if self.objective is None:
+            return f"scoreboard players reset {self.target}"
+        return f"scoreboard players reset {self.target} {self.objective}"
+
+
+@dataclass(slots=True)
+class StorageSet(Command):
+    storage: str
+    path: str
+    value: str  # SNBT 文本
+
+    def __str__(self):
+        return f"data modify storage {self.storage} {self.path} set value {self.value}"
+
+
+@dataclass(slots=True)
+class StorageCopy(Command):
+    storage: str
+    path: str
+    source_storage: str
+    source_path: str
+
+    def __str__(self):
+        return (f"data modify storage {self.storage} {self.path} "
+                f"set from storage {self.source_storage} {self.source_path}")
+
+
+@dataclass(slots=True)
+class StorageGet(Command):
+    storage: str
+    path: str
+    scale: Optional[str] = None
+
+    def __str__(self):
+        if self.scale is None:
+            return f"data get storage {self.storage} {self.path}"
+        return f"data get storage {self.storage} {self.path} {self.scale}"
+
+
+@dataclass(slots=True)
+class StorageRemove(Command):
+    storage: str
+    path: str
+
+    def __str__(self):
+        return f"data remove storage {self.storage} {self.path}"
+
+
+@dataclass(slots=True)
+class FunctionCall(Command):
+    """function ns:name [参数]，参数为宏参数（with storage ... 或复合标签）"""
+    function: str
+    args: Optional[str] = None
+
+    opaque = True
+
+    def __str__(self):
+        if self.args is None:
+            return f"function {self.function}"
+        return f"function {self.function} {self.args}"
+
+
+# execute 中读取/写入分数的子命令
+_IF_SCORE_RE = re.compile(r'\b(?:if|unless) score (\S+) (\S+) (?:(?:[<>]=?|=) (\S+) (\S+)|matches \S+)')
+_STORE_SCORE_RE = re.compile(r'\bstore (?:result|success) score (\S+) (\S+)')
+
+
+@dataclass(slots=True)
+class Execute(Command):
+    """execute <子命令> [run <指令>]，子命令保留原文本"""
+    clauses: str
+    run: Optional[Command] = None
+
+    @property
+    def opaque(self) -> bool:
+        return self.run is not None and self.run.opaque
+
+    def condition_reads(self) -> Set[Score]:
+        reads = set()
+        for m in _IF_SCORE_RE.finditer(self.clauses):
+            reads.add((m.group(1), m.group(2)))
+            if m.group(3):
+                reads.add((m.group(3), m.group(4)))
+        return reads
+
+    def store_targets(self) -> Set[Score]:
+        return {(m.group(1), m.group(2)) for m in _STORE_SCORE_RE.finditer(self.clauses)}
+
+    def score_reads(self) -> Set[Score]:
+        reads = self.condition_reads()
+        if self.run is not None:
+            reads |= self.run.score_reads()
+        return reads
+
+    def score_writes(self) -> Set[Score]:
+        writes = self.store_targets()
+        if self.run is not None:
+            writes |= self.run.score_writes()
+        return writes
+
+    def __str__(self):
+        if self.run is None:
+            return f"execute {self.clauses}"
+        return f"execute {self.clauses} run {self.run}"
+
+
+@dataclass(slots=True)
+class MacroLine(Command):
+    """以 $ 开头的宏指令，$(参数) 在调用时才展开"""
+    text: str
+
+    opaque = True
+
+    def __str__(self):
+        return self.text
+
+
+@dataclass(slots=True)
+class RawCmd(Command):
+    text: str
+
+    opaque = True
+
+    def __str__(self):
+        return self.text
+
+
+def score_kills(cmd: Command) -> Set[Score]:
+    """指令无条件覆盖（且覆盖前不读取）的分数"""
+    if isinstance(cmd, ScoreSet):
+        return {(cmd.target, cmd.objective)}
+    if isinstance(cmd, ScoreOp) and cmd.is_copy:
+        return cmd.score_writes() - cmd.score_reads()
+    if isinstance(cmd, ScoreReset) and cmd.objective is not None:
+        return cmd.score_writes()
+    if isinstance(cmd, Execute) and cmd.clauses.startswith('store '):
+        return cmd.store_targets() - cmd.score_reads()
+    return set()
+
+
+# ========== 文本 -> IR ==========
+
+_INT = r'(-?\d+)'
+_TOKEN = r'(\S+)'
+_PATTERNS = [
+    (re.compile(rf'scoreboard players set {_TOKEN} {_TOKEN} {_INT}$'),
+     lambda m: ScoreSet(m[1], m[2], int(m[3]))),
+    (re.compile(rf'scoreboard players add {_TOKEN} {_TOKEN} {_INT}$'),
+     lambda m: ScoreAdd(m[1], m[2], int(m[3]))),
+    (re.compile(rf'scoreboard players remove {_TOKEN} {_TOKEN} {_INT}$'),
+     lambda m: ScoreAdd(m[1], m[2], -int(m[3]))),
+    (re.compile(rf'scoreboard players operation {_TOKEN} {_TOKEN} {_TOKEN} {_TOKEN} {_TOKEN}$'),
+     lambda m: ScoreOp(m[3], m[1], m[2], m[4], m[5])),
+    (re.compile(rf'scoreboard players get {_TOKEN} {_TOKEN}$'),
+     lambda m: ScoreGet(m[1], m[2])),
+    (re.compile(rf'scoreboard players reset {_TOKEN}(?: {_TOKEN})?$'),
+     lambda m: ScoreReset(m[1], m[2])),
+    (re.compile(rf'data modify storage {_TOKEN} {_TOKEN} set from storage {_TOKEN} {_TOKEN}$'),
+     lambda m: StorageCopy(m[1], m[2], m[3], m[4])),
+    (re.compile(rf'data modify storage {_TOKEN} {_TOKEN} set value (.+)$'),
+     lambda m: StorageSet(m[1], m[2], m[3])),
+    (re.compile(rf'data get storage {_TOKEN} {_TOKEN}(?: {_TOKEN})?$'),
+     lambda m: StorageGet(m[1], m[2], m[3])),
+    (re.compile(rf'data remove storage {_TOKEN} {_TOKEN}$'),
+     lambda m: StorageRemove(m[1], m[2])),
+    (re.compile(rf'function {_TOKEN}(?: (.+))?$'),
+     lambda m: FunctionCall(m[1], m[2])),
+]
+
+
+def _split_run(text: str) -> Tuple[str, Optional[str]]:
+    """在第一个不位于括号或引号内的 ' run ' 处拆分 execute 指令"""
+    depth = 0
+    quote = None
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if c == '\\':
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c in '[{(':
+            depth += 1
+        elif c in ']})':
+            depth -= 1
+        elif depth == 0 and text.startswith(' run ', i):
+            return text[:i], text[i + len(' run '):]
+        i += 1
+    return text, None
+
+
+def _lift(text: str) -> Command:
+    if text.startswith('$'):
+        return MacroLine(text)
+    if text.startswith('execute '):
+        clauses, run = _split_run(text[len('execute '):])
+        return Execute(clauses, _lift(run) if run is not None else None)
+    for pattern, build in _PATTERNS:
+        m = pattern.match(text)
+        if m:
+            return build(m)
+    return RawCmd(text)
+
+
+def lift(text: str) -> Command:
+    """把一条指令文本提升为 IR；重新输出与原文不一致时退化为 RawCmd"""
+    cmd = _lift(text)
+    if not isinstance(cmd, RawCmd) and str(cmd) != text:
+        return RawCmd(text)
+    return cmd
+
+
+def as_command(cmd: Union[str, Command]) -> Command:
+    return cmd if isinstance(cmd, Command) else lift(cmd)
+
+
+# ========== IR -> 文本 ==========
+
+def render(commands: List[Command]) -> List[str]:
+    """输出 .mcfunction 文本行"""
+    return [str(cmd) for cmd in commands]
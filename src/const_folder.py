@@ -0,0 +1,247 @@
+"""
+Constant Folder - 语义分析之后的常量折叠与常量传播
+把只由字面量组成的表达式在编译期求值，替换为字面量节点，
+使 ExprGenerator._gen_binop 只为真正需要运行时计算的表达式输出指令。
+
+求值与生成的计分板指令逐位一致：
+  - 计分板为 32 位有符号整数，加减乘溢出回绕，除法/取模向下取整（除数为 0 时不折叠）
+  - float 为 ×100 定点数；混合运算按 _infer_expr_type 推断两边类型，
+    int 一边存入 float 目标（字面量、int 变量 ×100，int 运算结果不变），乘法结果 /100，除法被除数先 ×100，
+    右边为字面量时 ×100 与字面量先约分（与 _gen_arith_literal 相同，只在溢出时与未约分的结果不同）
+  - == / != 直接比较原始分数值，比较运算结果为 0/1
+  - a and b：a ≥ 1 时结果为 b 的值，否则为 0
+只有替换后的字面量在任何上下文中都与原表达式生成相同结果时才替换：
+int 运算结果折叠为带 _unscaled 标注的 IntLiteral，一元运算（推断为 unknown）只折叠为 bool；
+作为 let 初始值时则不受此限制，直接写入最终分数。
+
+常量传播：整个程序中只声明一次、从未被赋值（也不是参数或循环变量）的 let 变量，
+若初始值可以求值，其后的读取直接替换为字面量（变量本身仍然保留，供 cmd 插值等使用）。
+"""
+import math
+from dataclasses import fields, is_dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from ast_nodes import (Program, FuncDecl, StructDecl, LetStmt, AssignStmt, ForStmt, Ident, IntLiteral,
+                       FloatLiteral, BoolLiteral, BinOp, UnaryOp, IndexExpr, FieldAccess, CallExpr, iter_nodes)
+from my_types import INT, FLOAT, BOOL
+
+# 编译期常量：(推断类型, 原始分数值, 存入 float 目标时是否 ×100)
+# 推断类型与 ExprGenerator._infer_expr_type 一致，只区分 INT / FLOAT / 其他（以 BOOL 表示）
+Const = Tuple[Any, int, bool]
+
+_INT_MIN = -2 ** 31
+
+
+def _wrap(value: int) -> int:
+    """32 位有符号整数回绕"""
+    return (value - _INT_MIN) % 2 ** 32 + _INT_MIN
+
+
+def _float_literal(fixed: int) -> FloatLiteral:
+    """构造满足 int(value * 100) == fixed 的浮点字面量（与代码生成的换算方式一致）"""
+    value = fixed / 100
+    toward = math.inf if fixed >= 0 else -math.inf
+    while int(value * 100) != fixed:
+        value = math.nextafter(value, toward)
+    return FloatLiteral(value)
+
+
+def propagation_candidates(program: Program) -> Set[str]:
+    """整个程序中只声明一次、从不赋值、不与参数或循环变量同名的变量名"""
+    declared: Dict[str, int] = {}
+    excluded: Set[str] = set()
+    for node in iter_nodes(program.stmts):
+        if isinstance(node, LetStmt):
+            declared[node.name] = declared.get(node.name, 0) + 1
+        elif isinstance(node, AssignStmt):
+            root = node.target
+            while isinstance(root, (IndexExpr, FieldAccess)):
+                root = root.base
+            if isinstance(root, Ident):
+                excluded.add(root.name)
+        elif isinstance(node, ForStmt):
+            excluded.add(node.var)
+        elif isinstance(node, FuncDecl):
+            excluded.update(name for name, _ in node.params)
+    return {name for name, count in declared.items() if count == 1} - excluded
+
+
+class ConstantFolder:
+    """常量折叠与 let 常量传播"""
+
+    def __init__(self):
+        self.candidates: Set[str] = set()  # 可以传播的变量名（只声明一次且从不赋值）
+        self.constants: Dict[str, Const] = {}
+        self.folded = 0  # 被折叠的表达式数
+        self.propagated = 0  # 被替换为常量的变量读取数
+
+    def prepare(self, program: Program):
+        """收集可传播的变量：只声明一次、从不赋值、不与参数或循环变量同名"""
+        self.candidates = propagation_candidates(program)
+
+    # ========== 语句 ==========
+
+    def fold_globals(self, program: Program):
+        for stmt in program.stmts:
+            if not isinstance(stmt, (FuncDecl, StructDecl)):
+                self._fold_node(stmt)
+
+    def fold_function(self, func: FuncDecl):
+        func.body = self._fold_node(func.body)
+
+    def _fold_node(self, node: Any) -> Any:
+        """后序遍历：先折叠子节点，再折叠自身"""
+        if isinstance(node, list):
+            return [self._fold_node(n) for n in node]
+        if isinstance(node, tuple):
+            return tuple(self._fold_node(n) for n in node)
+        if not is_dataclass(node):
+            return node
+
+        if isinstance(node, AssignStmt):
+            # 赋值目标不能被替换，只折叠其中的下标表达式和右值
+            node.expr = self._fold_node(node.expr)
+            if isinstance(node.target, IndexExpr):
+                node.target.index = self._fold_node(node.target.index)
+            return node
+        if isinstance(node, CallExpr):
+            # 被调函数名不参与传播
+            node.args = self._fold_node(node.args)
+            return node
+
+        for f in fields(node):
+            if not f.name.startswith('_'):
+                setattr(node, f.name, self._fold_node(getattr(node, f.name)))
+
+        if isinstance(node, LetStmt):
+            self._record_let(node)
+        elif isinstance(node, (BinOp, UnaryOp, Ident)):
+            return self._fold_expr(node)
+        return node
+
+    def _record_let(self, stmt: LetStmt):
+        const = self._eval_binop(stmt.expr) if isinstance(stmt.expr, BinOp) else self._value(stmt.expr)
+        var_type = getattr(stmt, '_type', None)
+        if const is None or var_type not in (INT, FLOAT, BOOL):
+            return
+        _, value, scales = const
+        # 与 gen_expr_to 一致：存入 float 变量时按需 ×100
+        if var_type == FLOAT and scales:
+            value = _wrap(value * 100)
+        if isinstance(stmt.expr, (UnaryOp, BinOp)):
+            # 推断类型为 unknown 的运算在表达式中不能替换，但作为初始值时直接写入最终分数
+            stmt.expr = IntLiteral(value)
+            stmt.expr._unscaled = True
+            stmt.expr._type = var_type
+            self.folded += 1
+        if stmt.name in self.candidates and (var_type != BOOL or value in (0, 1)):
+            # 之后按变量读取 (_gen_ident)：int 变量存入 float 目标时 ×100
+            self.constants[stmt.name] = (var_type, value, var_type == INT)
+
+    # ========== 表达式 ==========
+
+    def _value(self, expr: Any) -> Optional[Const]:
+        """字面量（或未被替换但可以求值的一元运算）的编译期值"""
+        if isinstance(expr, BoolLiteral):
+            return BOOL, 1 if expr.value else 0, False
+        if isinstance(expr, IntLiteral):
+            return INT, expr.value, not expr._unscaled
+        if isinstance(expr, FloatLiteral):
+            return FLOAT, int(expr.value * 100), False
+        if isinstance(expr, UnaryOp):
+            return self._eval_unary(expr)
+        return None
+
+    def _fold_expr(self, expr: Any) -> Any:
+        if isinstance(expr, Ident):
+            const = self.constants.get(expr.name)
+            if const is None:
+                return expr
+            self.propagated += 1
+            return self._make_literal(const, expr)
+
+        const = self._eval_unary(expr) if isinstance(expr, UnaryOp) else self._eval_binop(expr)
+        if const is None:
+            return expr
+        literal = self._make_literal(const, expr)
+        if literal is not expr:
+            self.folded += 1
+        return literal
+
+    def _eval_unary(self, expr: UnaryOp) -> Optional[Const]:
+        operand = self._value(expr.operand)
+        if operand is None:
+            return None
+        _, v, scales = operand
+        # _infer_expr_type 把一元运算推断为 unknown；_gen_unary 把目标类型传给操作数
+        if expr.op == '-':
+            return BOOL, _wrap(-v), scales
+        if expr.op == '!':
+            return BOOL, 1 if v == 0 else 0, False
+        return None
+
+    def _eval_binop(self, expr: BinOp) -> Optional[Const]:
+        left = self._value(expr.left)
+        right = self._value(expr.right)
+        if left is None or right is None:
+            return None
+        lt, lv, l_scales = left
+        rt, rv, r_scales = right
+        op = expr.op
+        # 与 _infer_expr_type 一致：任一边为 float 时为 float，否则取左边的类型
+        result_type = FLOAT if FLOAT in (lt, rt) else lt
+
+        if op == 'and':
+            return result_type, rv if lv >= 1 else 0, False
+        if op in ('==', '!='):
+            return result_type, int((lv == rv) == (op == '==')), False
+
+        # 与 _gen_binop 一致：一边为 float 时另一边的 int 存入 float 目标
+        if lt == INT and rt == FLOAT and l_scales:
+            lv = _wrap(lv * 100)
+        if rt == INT and lt == FLOAT and r_scales:
+            rv = _wrap(rv * 100)
+        is_float = result_type == FLOAT
+
+        if op in ('<', '>', '<=', '>='):
+            result = {'<': lv < rv, '>': lv > rv, '<=': lv <= rv, '>=': lv >= rv}[op]
+            return result_type, int(result), False
+        if op == '+':
+            return result_type, _wrap(lv + rv), False
+        if op == '-':
+            return result_type, _wrap(lv - rv), False
+        if op == '*':
+            if not is_float:
+                return result_type, _wrap(lv * rv), False
+            # 与 _gen_arith_literal 一致：×rv /100 先约分
+            g = math.gcd(rv, 100)
+            return result_type, _wrap(_wrap(lv * (rv // g)) // (100 // g)), False
+        if op in ('/', '%') and rv == 0:
+            return None
+        if op == '/':
+            if is_float:
+                g = math.gcd(100, rv)
+                lv, rv = _wrap(lv * (100 // g)), rv // g
+            return result_type, _wrap(lv // rv), False
+        if op == '%':
+            return result_type, _wrap(lv % rv), False
+        return None
+
+    @staticmethod
+    def _make_literal(const: Const, original: Any) -> Any:
+        """构造与原表达式推断类型一致的字面量；无法保持一致时返回原表达式"""
+        t, value, scales = const
+        if t == INT:
+            node = IntLiteral(value)
+            node._unscaled = not scales
+        elif t == FLOAT:
+            node = _float_literal(value)
+        elif value in (0, 1) and not scales:
+            node = BoolLiteral(bool(value))
+        else:
+            return original
+        node._type = getattr(original, '_type', None) or t
+        return node
+
+    def summary(self) -> str:
+        return f"折叠 {self.folded} 个表达式, 传播 {self.propagated} 处常量"
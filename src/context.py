@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Set, Tuple
 
 from my_types import UNKNOWN, TypeDesc
 
@@ -25,12 +25,44 @@ class GeneratorContext:
         self.current_macro_args: Dict[str, str] = {}
 
         self.global_inits: List[str] = []
+        self.const_pool: Dict[int, str] = {}  # 算术运算用到的常量 -> 分数持有者，在 __init__ 中初始化
         self.tick_function: Optional[Any] = None
         self.current_mcfunc: Optional[Any] = None
 
         self.entity_tags: Dict[str, str] = {}
         self.entity_counter = 0
 
+        self.inline_block_limit = 1  # 指令数不超过该值的 if 分支直接内联为 execute，0 表示不内联
+        self.inliner = None  # 设置后在调用处展开满足条件的用户函数（见 inliner.Inliner）
+        self.drop_cleanup = False  # 为 True 时不生成函数退出时的变量清理
+
+        # 提前返回：目标版本支持 return 指令时，return 之后还有语句要执行的位置输出 return 1 直接结束函数，
+        # 分支和循环函数的调用处用 execute if function ... run return 1 把返回传递到用户函数
+        self.return_command = False  # 目标版本支持 return 指令（1.20.3+）
+        self.early_return = False
+        self.can_exit = False  # 当前位置的 return 能否结束用户函数（实体循环、while true、内联展开中不能）
+        self.tail_returns: Set[int] = set()  # 当前函数中执行后函数随即结束的 return（id），不需要 return 指令
+        self.exit_funcs: Set[str] = set()  # 执行 return 1 结束用户函数的 mcfunction
+
+    def local_scores(self) -> List[str]:
+        """当前函数退出时清零的分数：结构体的值类型字段、数组长度，最后是数值变量"""
+        func_prefix = f"{self.current_function}_"
+        scores, prims = [], []
+        for var_name, (storage, var_type) in self.var_map.items():
+            if var_name in self.struct_params or not storage.startswith(func_prefix):
+                continue
+            if var_type.kind == 'struct':
+                for fname, ftype in self.structs.get(var_type.name, {}).items():
+                    if ftype.is_value_type():
+                        scores.append(f"{storage}_{fname}")
+                    elif ftype.kind == 'array':
+                        scores.append(f"{storage}_{fname}_len")
+            elif var_type.kind == 'array':
+                scores.append(f"{storage}_len")
+            elif var_type.kind == 'prim':
+                prims.append(storage)
+        return scores + prims
+
     def push_block(self) -> int:
         self.block_counter += 1
         self.block_stack.append(self.block_counter)
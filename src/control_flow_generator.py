@@ -1,6 +1,12 @@
+import re
+
 from ast_nodes import *
+from command_ir import Execute
+from expr_generator import is_temp_var, negate_clause
 from my_types import UNKNOWN, INT, TypeDesc
 
+_RETURN_RE = re.compile(r'(?:^\$?|\brun )return\b')
+
 
 class ControlFlowGenerator:
     """控制流生成器 - 修复宏参数传递问题"""
@@ -36,28 +42,31 @@ class ControlFlowGenerator:
         self._generate_if_impl(stmt)
 
     def _generate_range(self, stmt: ForStmt):
-        """范围循环 for i in 0..10"""
+        """
+        范围循环 for i in 0..10
+        循环体是一个自递归函数：执行语句、计数加一后检查边界并尾调用自身，每次迭代只有一次函数调用。
+        结束值为字面量时直接用 matches 判断，否则在循环前计算一次存入临时变量
+        """
         iter_var = self.ctx.get_storage_name(stmt.var)
         self.ctx.add_var(stmt.var, iter_var, INT)
 
-        end_temp = self.builder.get_temp_var()
         for cmd in self.expr_gen.gen_expr_to(stmt.iterable, iter_var):
             self._emit(cmd)
-        for cmd in self.expr_gen.gen_expr_to(stmt.range_end, end_temp):
-            self._emit(cmd)
+        if isinstance(stmt.range_end, IntLiteral):
+            bound = f"unless score {iter_var} _tmp matches {stmt.range_end.value}.."
+        else:
+            end_temp = self.builder.get_temp_var()
+            for cmd in self.expr_gen.gen_expr_to(stmt.range_end, end_temp):
+                self._emit(cmd)
+            bound = f"if score {iter_var} _tmp < {end_temp} _tmp"
 
         func_base = f"{self.ctx.current_function or 'global'}_for_{self.ctx.block_counter}"
-        head_func = self.builder.new_function(f"{func_base}_head")
         body_func = self.builder.new_function(f"{func_base}_body")
         old_func = self.ctx.current_mcfunc
 
         macro_args = self._get_macro_args()
         saved_macro_args = self.ctx.current_macro_args.copy() if self.ctx.current_macro_args else {}
 
-        self.ctx.current_mcfunc = head_func
-        branch_cmd = self.builder.function_call(f"{func_base}_body", macro_args)
-        self._emit(f"execute if score {iter_var} _tmp < {end_temp} _tmp run {branch_cmd}")
-
         self.ctx.current_mcfunc = body_func
         self.ctx.current_macro_args = saved_macro_args.copy()
 
@@ -65,16 +74,19 @@ class ControlFlowGenerator:
         for s in stmt.block:
             self.stmt_gen.gen_stmt(s, body_func)
         self._emit(self.builder.add_score(iter_var, 1))
-        self._emit(self.builder.function_call(f"{func_base}_head", macro_args))
+        # 尾调用：支持 return 时用 return run function 结束当前层，循环体中的提前返回也随之传出
+        call = self.builder.function_call(body_func.name, macro_args)
+        self._emit(f"execute {bound} run return run {call}" if self.ctx.return_command
+                   else f"execute {bound} run {call}")
         self.ctx.pop_block()
 
         self.ctx.current_macro_args = saved_macro_args
         self.ctx.current_mcfunc = old_func
-        self._emit(self.builder.function_call(f"{func_base}_head", macro_args))
+        self._emit_call(body_func.name, macro_args, bound)
 
     def _generate_each(self, stmt: ForStmt):
         """For-each循环"""
-        iterable_type = getattr(stmt.iterable, '_type', UNKNOWN)
+        iterable_type = getattr(stmt.iterable, '_type', None) or UNKNOWN
         is_entity_array = (iterable_type and iterable_type.kind == 'array' and
                            iterable_type.elem and iterable_type.elem.kind == 'entity')
 
@@ -122,8 +134,12 @@ class ControlFlowGenerator:
 
         self.ctx.add_var(stmt.var, tagged_selector, entity_type)
 
+        # 循环体对每个实体各执行一次，return 不能结束外层函数
+        saved_can_exit = self.ctx.can_exit
+        self.ctx.can_exit = False
         for s in stmt.block:
             self.stmt_gen.gen_stmt(s, body_func)
+        self.ctx.can_exit = saved_can_exit
 
         self.ctx.pop_block()
 
@@ -134,78 +150,83 @@ class ControlFlowGenerator:
         self.ctx.current_mcfunc = old_func
 
     def _generate_array_foreach(self, stmt: ForStmt):
-        """数组循环 - 修复：正确处理字符串数组"""
-        iterable_type = getattr(stmt.iterable, '_type', UNKNOWN)
+        """
+        数组循环 for x in arr
+        循环体是一个自递归函数，每次迭代用固定条数的指令载入当前元素，数组长度不受限制：
+          - 默认遍历一份工作副本：读取 [0] 后删除，副本中还有元素时尾调用自身
+          - 循环体可能修改被遍历的数组时，按计数器用宏函数读取原数组的 [$(index)]，保证读到修改后的元素
+        """
+        iterable_type = getattr(stmt.iterable, '_type', None) or UNKNOWN
         arr_expr = stmt.iterable
 
         if isinstance(arr_expr, Ident):
             arr_name_full = self.ctx.get_var(arr_expr.name)[0]
             actual_arr = self.ctx.resolve_storage(arr_name_full)
             len_var = f"{actual_arr}_len"
-            elem_type = iterable_type.elem if iterable_type else UNKNOWN
+            elem_type = iterable_type.elem if iterable_type and iterable_type.elem else UNKNOWN
 
             iter_var = self.ctx.get_storage_name(stmt.var)
             self.ctx.add_var(stmt.var, iter_var, elem_type)
-            iter_idx = f"_idx_{self.ctx.block_counter}"
-            self._emit(self.builder.set_score(iter_idx, "_tmp", 0))
+
+            if self._may_modify_array(stmt.block, arr_expr.name, arr_name_full):
+                iter_idx = f"_idx_{self.ctx.block_counter}"
+                self._emit(self.builder.set_score(iter_idx, "_tmp", 0))
+                bound = f"if score {iter_idx} _tmp < {len_var} _tmp"
+                load = self.expr_gen.gen_indexed_load(actual_arr, iter_idx, iter_var, elem_type)
+                advance = [self.builder.add_score(iter_idx, 1)]
+            else:
+                work = f"__each_{self.ctx.block_counter}"
+                self._emit(self.builder.data_copy_storage(work, actual_arr))
+                bound = f"if data storage {self.ctx.namespace}:data {work}[0]"
+                load = self.expr_gen.gen_element_load(f"{work}[0]", iter_var, elem_type)
+                load.append(f"data remove storage {self.ctx.namespace}:data {work}[0]")
+                advance = []
 
             func_base = f"{self.ctx.current_function or 'global'}_foreach_{self.ctx.block_counter}"
-            head_func = self.builder.new_function(f"{func_base}_head")
             body_func = self.builder.new_function(f"{func_base}_body")
             old_func = self.ctx.current_mcfunc
 
             macro_args = self._get_macro_args()
             saved_macro_args = self.ctx.current_macro_args.copy() if self.ctx.current_macro_args else {}
 
-            # ========== 生成 Head 函数（循环条件判断和元素加载）==========
-            self.ctx.current_mcfunc = head_func
-            self.ctx.current_macro_args = saved_macro_args.copy()
-
-            actual_length = self.ctx.array_lengths.get(actual_arr)
-            upper_bound = min(actual_length if actual_length else 50, 50)
-
-            # ========== 关键修复：根据元素类型生成正确的加载逻辑 ==========
-            if elem_type and elem_type.kind == 'prim' and elem_type.name == 'string':
-                # 字符串数组：使用 data modify 从 storage 复制到 iter_var（也是 storage 路径）
-                for i in range(upper_bound):
-                    # 字符串复制：data modify storage $(iter_var) set from storage $(arr_path)[i]
-                    branch_cmd = f'execute if score {iter_idx} _tmp matches {i} run data modify storage {self.ctx.namespace}:data {iter_var} set from storage {self.ctx.namespace}:data {actual_arr}[{i}]'
-                    self._emit(branch_cmd)
-            elif elem_type and elem_type.is_value_type():
-                # 数值类型数组（int/float）：使用 execute store result score
-                for i in range(upper_bound):
-                    scale = 1 if elem_type.name == 'int' else 0.01
-                    load_cmd = f"execute store result score {iter_var} _tmp run data get storage {self.ctx.namespace}:data {actual_arr}[{i}] {scale}"
-                    branch = self.builder.execute_if_score_matches(iter_idx, "_tmp", str(i), load_cmd)
-                    self._emit(branch)
-            else:
-                # 兜底：其他类型
-                for i in range(upper_bound):
-                    load_cmd = self.builder.copy_score(iter_var, f"{actual_arr}_{i}")
-                    branch = self.builder.execute_if_score_matches(iter_idx, "_tmp", str(i), load_cmd)
-                    self._emit(branch)
-
-            # 生成循环继续条件
-            branch_cmd = self.builder.function_call(f"{func_base}_body", macro_args)
-            self._emit(f"execute if score {iter_idx} _tmp < {len_var} _tmp run {branch_cmd}")
-
-            # ========== 生成 Body 函数（循环体执行）==========
             self.ctx.current_mcfunc = body_func
             self.ctx.current_macro_args = saved_macro_args.copy()
 
             self.ctx.push_block()
+            for cmd in load:
+                self._emit(cmd)
             for s in stmt.block:
                 self.stmt_gen.gen_stmt(s, body_func)
-            self._emit(self.builder.add_score(iter_idx, 1))
-            self._emit(self.builder.function_call(f"{func_base}_head", macro_args))
+            for cmd in advance:
+                self._emit(cmd)
+            if not any('$(' in str(cmd) for cmd in body_func.commands):
+                macro_args = None  # 循环体用不到宏参数时按普通函数调用，每次迭代不必展开宏
+            # 与范围循环相同的尾调用
+            call = self.builder.function_call(body_func.name, macro_args)
+            self._emit(f"execute {bound} run return run {call}" if self.ctx.return_command
+                       else f"execute {bound} run {call}")
             self.ctx.pop_block()
 
-            # 清理
             self.ctx.current_macro_args = saved_macro_args
             self.ctx.current_mcfunc = old_func
-
-            # 从主函数启动循环
-            self._emit(self.builder.function_call(f"{func_base}_head", macro_args))
+            self._emit_call(body_func.name, macro_args, bound)
+
+    def _may_modify_array(self, block: List[Any], arr_name: str, storage: str) -> bool:
+        """循环体是否可能修改被遍历的数组：给它的元素赋值、把它作为参数传给函数，或数组不是局部变量时调用函数"""
+        # 数组参数按引用传入（解析后的路径不同），调用其他函数同样可能修改它
+        local = (bool(self.ctx.current_function) and storage.startswith(f"{self.ctx.current_function}_")
+                 and self.ctx.resolve_storage(storage) == storage)
+        for node in iter_nodes(block):
+            if isinstance(node, AssignStmt):
+                root = node.target
+                while isinstance(root, (IndexExpr, FieldAccess)):
+                    root = root.base
+                if isinstance(root, Ident) and root.name == arr_name:
+                    return True
+            elif isinstance(node, CallExpr) and isinstance(node.callee, Ident) and node.callee.name in self.ctx.funcs:
+                if not local or any(isinstance(arg, Ident) and arg.name == arr_name for arg in node.args):
+                    return True
+        return False
 
     def _generate_while_impl(self, stmt: WhileStmt):
         """While循环实现"""
@@ -217,8 +238,10 @@ class ControlFlowGenerator:
             old_func = self.ctx.current_mcfunc
             self.ctx.current_mcfunc = self.ctx.tick_function
             saved_macro_args = self.ctx.current_macro_args.copy() if self.ctx.current_macro_args else {}
+            saved_can_exit = self.ctx.can_exit
 
             self.ctx.current_macro_args = {}
+            self.ctx.can_exit = False  # __tick__ 由所有 while true 共用，return 不能结束它
 
             self.ctx.push_block()
             for s in stmt.block:
@@ -226,13 +249,13 @@ class ControlFlowGenerator:
             self.ctx.pop_block()
 
             self.ctx.current_macro_args = saved_macro_args
+            self.ctx.can_exit = saved_can_exit
             self.ctx.current_mcfunc = old_func
         else:
             func_base = f"{self.ctx.current_function or 'global'}_while_{self.ctx.block_counter}"
             entry_func = self.builder.new_function(f"{func_base}_entry")
             body_func = self.builder.new_function(f"{func_base}_body")
 
-            cond_temp = self.builder.get_temp_var()
             old_func = self.ctx.current_mcfunc
 
             macro_args = self._get_macro_args()
@@ -242,11 +265,9 @@ class ControlFlowGenerator:
             self.ctx.current_mcfunc = entry_func
             self.ctx.current_macro_args = saved_macro_args.copy()
 
-            cmds = self.expr_gen.gen_expr_to(stmt.cond, cond_temp)
+            cmds, clauses = self.expr_gen.gen_condition(stmt.cond)
             for cmd in cmds:
                 self._emit(cmd)
-            self._emit(self.builder.execute_if_score(cond_temp, "_tmp", "matches", "1..",
-                                                     self.builder.function_call(f"{func_base}_body", macro_args)))
 
             # Body函数
             self.ctx.current_mcfunc = body_func
@@ -255,17 +276,21 @@ class ControlFlowGenerator:
             self.ctx.push_block()
             for s in stmt.block:
                 self.stmt_gen.gen_stmt(s, body_func)
-            self._emit(self.builder.function_call(f"{func_base}_entry", macro_args))
+            self._emit_loop_call(f"{func_base}_entry", body_func, macro_args)
             self.ctx.pop_block()
 
+            # Entry函数的条件调用（循环体生成之后才知道是否需要传递提前返回）
+            self.ctx.current_mcfunc = entry_func
+            self.ctx.current_macro_args = saved_macro_args.copy()
+            self._emit_call(f"{func_base}_body", macro_args, ' '.join(clauses))
+
             self.ctx.current_macro_args = saved_macro_args
             self.ctx.current_mcfunc = old_func
-            self._emit(self.builder.function_call(f"{func_base}_entry", macro_args))
+            self._emit_call(f"{func_base}_entry", macro_args)
 
     def _generate_if_impl(self, stmt: IfStmt):
         """If语句实现 """
-        cond_temp = self.builder.get_temp_var()
-        cmds = self.expr_gen.gen_expr_to(stmt.cond, cond_temp)
+        cmds, clauses = self.expr_gen.gen_condition(stmt.cond)
         for cmd in cmds:
             self._emit(cmd)
 
@@ -280,17 +305,6 @@ class ControlFlowGenerator:
         then_func = self.builder.new_function(then_name)
         else_func = self.builder.new_function(else_name) if else_name else None
 
-        # 生成 then 调用（条件为真时执行）
-        then_call = self.builder.function_call(then_name, macro_args)
-        then_wrapped = f"execute as @s run {then_call}"
-        self._emit(self.builder.execute_if_score(cond_temp, "_tmp", "matches", "1..", then_wrapped))
-
-        # 关键修复：确保 else 分支被正确生成和调用（使用 execute unless）
-        if else_func and stmt.else_block:
-            else_call = self.builder.function_call(else_name, macro_args)
-            else_wrapped = f"execute as @s run {else_call}"
-            self._emit(self.builder.execute_unless_score(cond_temp, "_tmp", "matches", "1..", else_wrapped))
-
         old_func = self.ctx.current_mcfunc
 
         # 生成 then 块
@@ -319,6 +333,91 @@ class ControlFlowGenerator:
         self.ctx.current_macro_args = saved_macro_args
         self.ctx.current_mcfunc = old_func
 
+        if else_func and stmt.else_block:
+            # else 用取反的条件判断，要求 then 分支执行后条件不变：
+            # 只读临时变量的单个条件总是如此，否则检查 then 分支是否可能改写条件读取的分数
+            # then 分支总是以 return 1 结束时不会再执行到 else 的判断
+            stable = ((then_func.commands and str(then_func.commands[-1]) == "return 1") or
+                      self._condition_stable(' '.join(clauses), then_func.commands))
+            if len(clauses) > 1 or not stable:
+                clauses = [self._store_condition(' '.join(clauses))]
+
+        # 条件为真时执行 then，为假时执行 else
+        self._emit_branch(' '.join(clauses), then_func, macro_args)
+        if else_func and stmt.else_block:
+            self._emit_branch(negate_clause(clauses[0]), else_func, macro_args)
+
+    def _condition_stable(self, condition: str, commands) -> bool:
+        """执行 commands 后条件的结果不变：只读临时变量，或指令不会改写条件读取的分数"""
+        reads = Execute(condition).condition_reads()
+        return (all(is_temp_var(name) for name, _ in reads) or
+                not any(cmd.opaque or cmd.score_writes() & reads for cmd in commands))
+
+    def _store_condition(self, condition: str) -> str:
+        """把条件的结果先存入临时变量，返回判断该变量的条件子命令"""
+        flag = self.builder.get_temp_var()
+        self._emit(self.builder.set_score(flag, "_tmp", 0))
+        self._emit(f"execute {condition} run {self.builder.set_score(flag, '_tmp', 1)}")
+        return f"if score {flag} _tmp matches 1.."
+
+    def _emit_branch(self, condition: str, func, macro_args):
+        """
+        输出 if 分支：足够短的分支把每条指令直接包在 execute 条件中并删除分支函数，
+        否则调用分支函数。分支中不能有 return（内联后会从外层函数返回）。
+        每条内联指令都会重新判断条件，前面的指令可能改写条件读取的分数时先把条件存入临时变量。
+        """
+        body = [str(cmd) for cmd in func.commands]
+        exits = func.name in self.ctx.exit_funcs
+        if len(body) <= self.ctx.inline_block_limit and (exits or not any(_RETURN_RE.search(cmd) for cmd in body)):
+            if not self._condition_stable(condition, func.commands[:-1]):
+                condition = self._store_condition(condition)
+            guard = f"execute {condition}"
+            del self.builder.functions[func.name]
+            if exits:
+                # 分支中的 return 1 内联后直接结束当前函数
+                self.ctx.exit_funcs.add(self.ctx.current_mcfunc.name)
+            for cmd in body:
+                # 宏指令的 $ 由 _emit 重新加在整行开头
+                cmd = cmd[1:] if cmd.startswith('$') else cmd
+                if cmd.startswith('execute '):
+                    self._emit(f"{guard} {cmd[len('execute '):]}")
+                else:
+                    self._emit(f"{guard} run {cmd}")
+            return
+        self._emit_call(func.name, macro_args, condition)
+
+    def _emit_call(self, func_name: str, macro_args, condition: str = None):
+        """
+        调用分支或循环函数（condition 为 execute 条件子命令）。
+        被调函数可能 return 1 结束用户函数时，当前函数随之 return 1：
+          - 总是以 return 1 结束的分支（守卫子句）：execute [条件] run return run function ...
+          - 否则：execute [条件] if function ... run return 1；
+            带宏参数时 if function 不能传参，改为把返回值存入临时变量再判断
+        """
+        call = self.builder.function_call(func_name, macro_args)
+        if func_name not in self.ctx.exit_funcs:
+            self._emit(f"execute {condition} run {call}" if condition else call)
+            return
+        self.ctx.exit_funcs.add(self.ctx.current_mcfunc.name)
+        commands = self.builder.functions[func_name].commands
+        if commands and str(commands[-1]) == "return 1":
+            self._emit(f"execute {condition} run return run {call}" if condition else f"return run {call}")
+            return
+        prefix = f"execute {condition} " if condition else "execute "
+        if not macro_args:
+            self._emit(f"{prefix}if function {self.ctx.namespace}:{func_name} run return 1")
+            return
+        flag = self.builder.get_temp_var()
+        self._emit(self.builder.set_score(flag, "_tmp", 0))
+        self._emit(f"{prefix}store result score {flag} _tmp run {call}")
+        self._emit(f"execute if score {flag} _tmp matches 1 run return 1")
+
+    def _emit_loop_call(self, func_name: str, body_func, macro_args):
+        """循环体末尾再次进入循环：循环体会提前返回时，循环入口同样会返回"""
+        if body_func.name in self.ctx.exit_funcs:
+            self.ctx.exit_funcs.add(func_name)
+        self._emit_call(func_name, macro_args)
+
     def _cleanup_block_entities(self):
         """清理当前块中声明的实体标签"""
         if not self.ctx.block_stack:
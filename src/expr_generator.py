@@ -1,8 +1,32 @@
+import math
+import re
+
 from ast_nodes import *
 from command_builder import CommandBuilder
+from command_ir import Execute
 from context import GeneratorContext
 from my_types import *
 
+_INT_MIN = -2 ** 31
+_INT_MAX = 2 ** 31 - 1
+
+_TEMP_RE = re.compile(r'_t\d+')
+
+_COMPARE_OPS = ('<', '>', '<=', '>=', '==', '!=')
+_MIRRORED = {'<': '>', '>': '<', '<=': '>=', '>=': '<=', '==': '==', '!=': '!='}
+
+
+def is_temp_var(name: str) -> bool:
+    """CommandBuilder.get_temp_var 分配的临时变量（不会被分支或被调函数改写）"""
+    return _TEMP_RE.fullmatch(name) is not None
+
+
+def negate_clause(clause: str) -> str:
+    """if score ... <-> unless score ..."""
+    if clause.startswith('if '):
+        return 'unless ' + clause[len('if '):]
+    return 'if ' + clause[len('unless '):]
+
 
 class ExprGenerator:
     def __init__(self, ctx: GeneratorContext, builder: CommandBuilder, stmt_gen=None):
@@ -24,7 +48,7 @@ class ExprGenerator:
 
         if isinstance(expr, IntLiteral):
             # 如果目标类型是 float，直接存储 ×100 的值
-            if target_type and target_type.name == 'float':
+            if target_type and target_type.name == 'float' and not expr._unscaled:
                 return [self.builder.set_score(target_var, "_tmp", expr.value * 100)]
             return [self.builder.set_score(target_var, "_tmp", expr.value)]
 
@@ -129,14 +153,9 @@ class ExprGenerator:
         if expr.op == 'and':
             return self._gen_and_op(expr, target_var)
 
-        # 处理相等和不等（支持 bool 和数字类型）
-        if expr.op in ('==', '!='):
-            return self._gen_equality_op(expr, target_var)
-
-        # 处理其他运算（原有逻辑）
-        cmds = []
-        left = self.builder.get_temp_var()
-        right = self.builder.get_temp_var()
+        # 处理比较、相等和不等（支持 bool 和数字类型）
+        if expr.op in _COMPARE_OPS:
+            return self._gen_compare_op(expr, target_var)
 
         # 推断操作数类型
         from semant import INT, FLOAT, BOOL
@@ -147,36 +166,224 @@ class ExprGenerator:
         left_target = FLOAT if (left_type == INT and right_type == FLOAT) else left_type
         right_target = FLOAT if (right_type == INT and left_type == FLOAT) else right_type
 
+        if expr.op in ('+', '-', '*', '/', '%'):
+            cmds = self._gen_arith_literal(expr, target_var, left_type, right_type, left_target, right_target)
+            if cmds is not None:
+                return cmds
+
+        # 处理其他运算（原有逻辑）
+        cmds = []
+        left = self.builder.get_temp_var()
+        right = self.builder.get_temp_var()
+
         cmds.extend(self.gen_expr_to(expr.left, left, left_target))
         cmds.extend(self.gen_expr_to(expr.right, right, right_target))
 
         cmds.append(self.builder.copy_score(target_var, left))
 
-        if expr.op in ('<', '>', '<=', '>='):
-            op_map = {'<': '<', '>': '>', '<=': '<=', '>=': '>='}
-            op = op_map[expr.op]
-            cmds.append(f"execute if score {left} _tmp {op} {right} _tmp run "
-                        f"scoreboard players set {target_var} _tmp 1")
-            cmds.append(f"execute unless score {left} _tmp {op} {right} _tmp run "
-                        f"scoreboard players set {target_var} _tmp 0")
+        op_map = {'+': '+=', '-': '-=', '*': '*=', '/': '/=', '%': '%='}
+        if expr.op == '*':
+            cmds.append(f"scoreboard players operation {target_var} _tmp *= {right} _tmp")
+            if left_type == FLOAT or right_type == FLOAT:
+                cmds.append(f"scoreboard players operation {target_var} _tmp /= _const100 _tmp")
+        elif expr.op == '/':
+            if left_type == FLOAT or right_type == FLOAT:
+                cmds.append(f"scoreboard players operation {target_var} _tmp *= _const100 _tmp")
+            cmds.append(f"scoreboard players operation {target_var} _tmp /= {right} _tmp")
+        elif expr.op == '%':
+            cmds.append(f"scoreboard players operation {target_var} _tmp %= {right} _tmp")
         else:
-            op_map = {'+': '+=', '-': '-=', '*': '*=', '/': '/=', '%': '%='}
-            if expr.op == '*':
-                cmds.append(f"scoreboard players operation {target_var} _tmp *= {right} _tmp")
-                if left_type == FLOAT or right_type == FLOAT:
-                    cmds.append(f"scoreboard players operation {target_var} _tmp /= _const100 _tmp")
-            elif expr.op == '/':
-                if left_type == FLOAT or right_type == FLOAT:
-                    cmds.append(f"scoreboard players operation {target_var} _tmp *= _const100 _tmp")
-                cmds.append(f"scoreboard players operation {target_var} _tmp /= {right} _tmp")
-            elif expr.op == '%':
-                cmds.append(f"scoreboard players operation {target_var} _tmp %= {right} _tmp")
-            else:
-                # + 和 - 不需要特殊处理
-                cmds.append(self.builder.op_score(op_map[expr.op], target_var, "_tmp", right, "_tmp"))
+            # + 和 - 不需要特殊处理
+            cmds.append(self.builder.op_score(op_map[expr.op], target_var, "_tmp", right, "_tmp"))
 
         return cmds
 
+    def _gen_arith_literal(self, expr: BinOp, target_var: str, left_type, right_type,
+                           left_target, right_target) -> Optional[List[str]]:
+        """一边是数字字面量的算术运算：
+        +/- 直接 scoreboard players add/remove，*、/、% 使用常量池中的分数，不再为字面量分配临时变量；
+        float 的 ×100 换算在编译期与字面量约分（如 f * 2.0 只需 *= 2）。
+        返回 None 表示不适用，回到通用路径"""
+        from semant import INT, FLOAT
+        operand, operand_type, operand_target = expr.left, left_type, left_target
+        value = self._literal_value(expr.right, right_target)
+        if value is None and expr.op in ('+', '*'):
+            # + 和 * 满足交换律，字面量在左边时交换
+            operand, operand_type, operand_target = expr.right, right_type, right_target
+            value = self._literal_value(expr.left, left_target)
+        if value is None or not _INT_MIN <= value <= _INT_MAX or (expr.op in ('/', '%') and value == 0):
+            return None
+
+        is_float = left_type == FLOAT or right_type == FLOAT
+        # 运算结果 = operand × mul / div，按通用路径的换算方式计算两个因子
+        mul, div = 1, 1
+        # int 变量存入 float 目标时 ×100，乘除法中这一步可以并入常量因子
+        merge_scale = (expr.op in ('*', '/') and isinstance(operand, Ident) and
+                       operand_type == INT and operand_target == FLOAT)
+        if merge_scale:
+            operand_target = INT
+            mul *= 100
+        if expr.op == '*':
+            mul *= value
+            if is_float:
+                div *= 100
+        elif expr.op == '/':
+            div *= value
+            if is_float:
+                mul *= 100
+        g = math.gcd(mul, div)
+        mul, div = mul // g, div // g
+        if not _INT_MIN <= mul <= _INT_MAX:
+            return None
+
+        cmds = []
+        temp = self.builder.get_temp_var()
+        cmds.extend(self.gen_expr_to(operand, temp, operand_target))
+        cmds.append(self.builder.copy_score(target_var, temp))
+
+        if expr.op in ('+', '-'):
+            delta = value if expr.op == '+' else -value
+            if not _INT_MIN < delta <= _INT_MAX:
+                # add/remove 2147483648 超出指令参数范围
+                cmds.append(self.builder.op_score(expr.op + "=", target_var, "_tmp", self._const(value), "_tmp"))
+            elif delta > 0:
+                cmds.append(self.builder.add_score(target_var, delta))
+            elif delta < 0:
+                cmds.append(self.builder.remove_score(target_var, -delta))
+        elif expr.op == '%':
+            cmds.append(self.builder.op_score("%=", target_var, "_tmp", self._const(value), "_tmp"))
+        else:
+            if mul != 1:
+                cmds.append(self.builder.op_score("*=", target_var, "_tmp", self._const(mul), "_tmp"))
+            if div != 1:
+                cmds.append(self.builder.op_score("/=", target_var, "_tmp", self._const(div), "_tmp"))
+        return cmds
+
+    def _literal_value(self, expr: Any, target_type: TypeDesc = None) -> Optional[int]:
+        """数字字面量（含取负）按 gen_expr_to 的规则存入 target_type 时的分数值，其他表达式返回 None"""
+        if isinstance(expr, UnaryOp) and expr.op == '-':
+            value = self._literal_value(expr.operand, target_type)
+            return None if value is None else -value
+        if isinstance(expr, FloatLiteral):
+            return int(expr.value * 100)
+        if isinstance(expr, IntLiteral):
+            if target_type and target_type.name == 'float' and not expr._unscaled:
+                return expr.value * 100
+            return expr.value
+        return None
+
+    def _const(self, value: int) -> str:
+        """常量池中存放 value 的分数持有者，由 CodeGenerator 在 __init__ 中统一初始化"""
+        if value == 100:
+            return "_const100"
+        holder = self.ctx.const_pool.get(value)
+        if holder is None:
+            holder = f"_const{value}" if value >= 0 else f"_const_n{-value}"
+            self.ctx.const_pool[value] = holder
+        return holder
+
+    def gen_condition(self, expr: Any) -> Tuple[List[str], List[str]]:
+        """
+        把 if / while 条件编译为 (前置指令, execute 条件子命令)，所有子命令都成立时条件为真。
+        比较直接输出 if score a _tmp < b _tmp（与字面量比较用 matches 区间），!= 用 unless，
+        and 串联为多个子命令，不再先把条件存入 0/1 临时变量。
+        真值与 gen_expr_to 的结果 matches 1.. 一致。
+        """
+        if isinstance(expr, BinOp) and expr.op == 'and':
+            return self._and_condition(expr)
+        if isinstance(expr, BinOp) and expr.op in _COMPARE_OPS:
+            return self._compare_condition(expr)
+        if isinstance(expr, UnaryOp) and expr.op == '!':
+            operand = expr.operand
+            if self._is_boolean(operand):
+                # 操作数只可能是 0/1：取反就是条件取反
+                cmds, clauses = self.gen_condition(operand)
+                if len(clauses) > 1:
+                    flag = self._store_condition(cmds, clauses)
+                    clauses = [f"if score {flag} _tmp matches 1.."]
+                return cmds, [negate_clause(clauses[0])]
+            cmds, score = self._condition_operand(operand)
+            return cmds, [f"if score {score} _tmp matches 0"]
+        cmds, score = self._condition_operand(expr)
+        return cmds, [f"if score {score} _tmp matches 1.."]
+
+    def _and_condition(self, expr: BinOp) -> Tuple[List[str], List[str]]:
+        cmds, left = self.gen_condition(expr.left)
+        right_cmds, right = self.gen_condition(expr.right)
+        if right_cmds:
+            # 右边的前置指令只在左边成立时执行（短路求值）；它们可能改写左边直接读取的变量，
+            # 这时先把左边的结果存入临时变量
+            if not all(is_temp_var(name) for name, _ in Execute(' '.join(left)).condition_reads()):
+                flag = self._store_condition(cmds, left)
+                left = [f"if score {flag} _tmp matches 1.."]
+            guard = f"execute {' '.join(left)} run "
+            cmds.extend(guard + cmd for cmd in right_cmds)
+        return cmds, left + right
+
+    def _compare_condition(self, expr: BinOp) -> Tuple[List[str], List[str]]:
+        op = expr.op
+        if op in ('==', '!='):
+            # 直接比较原始分数值（两边都不做 float 换算）
+            left_target = right_target = None
+        else:
+            from semant import INT, FLOAT
+            left_type = self._infer_expr_type(expr.left)
+            right_type = self._infer_expr_type(expr.right)
+            left_target = FLOAT if (left_type == INT and right_type == FLOAT) else left_type
+            right_target = FLOAT if (right_type == INT and left_type == FLOAT) else right_type
+
+        # 与字面量比较：if score x _tmp matches <区间>
+        operand, operand_target = expr.left, left_target
+        value = self._condition_literal(expr.right, right_target)
+        if value is None:
+            value = self._condition_literal(expr.left, left_target)
+            operand, operand_target, op = expr.right, right_target, _MIRRORED[op]
+        if value is not None and _INT_MIN < value < _INT_MAX:
+            ranges = {'<': f"..{value - 1}", '<=': f"..{value}", '>': f"{value + 1}..",
+                      '>=': f"{value}..", '==': f"{value}", '!=': f"{value}"}
+            cmds, score = self._condition_operand(operand, operand_target)
+            check = 'unless' if op == '!=' else 'if'
+            return cmds, [f"{check} score {score} _tmp matches {ranges[op]}"]
+
+        # 右边的计算可能改写左边的变量，这时左边仍需先复制到临时变量
+        right_simple = isinstance(expr.right, (Ident, IntLiteral, FloatLiteral, BoolLiteral))
+        cmds, left = self._condition_operand(expr.left, left_target, direct=right_simple)
+        right_cmds, right = self._condition_operand(expr.right, right_target)
+        cmds.extend(right_cmds)
+        if expr.op in ('==', '!='):
+            check = 'unless' if expr.op == '!=' else 'if'
+            return cmds, [f"{check} score {left} _tmp = {right} _tmp"]
+        return cmds, [f"if score {left} _tmp {expr.op} {right} _tmp"]
+
+    def _condition_operand(self, expr: Any, target_type: TypeDesc = None,
+                           direct: bool = True) -> Tuple[List[str], str]:
+        """条件中读取的分数：数值变量直接读取（无需换算时），其他表达式先计算到临时变量"""
+        if direct and isinstance(expr, Ident):
+            storage, var_type = self.ctx.get_var(expr.name)
+            if (var_type.kind == 'prim' and var_type.name in ('int', 'float', 'bool') and
+                    not (target_type and target_type.name == 'float' and var_type.name == 'int')):
+                return [], self.ctx.resolve_storage(storage)
+        temp = self.builder.get_temp_var()
+        return self.gen_expr_to(expr, temp, target_type), temp
+
+    def _condition_literal(self, expr: Any, target_type: TypeDesc = None) -> Optional[int]:
+        if isinstance(expr, BoolLiteral):
+            return 1 if expr.value else 0
+        return self._literal_value(expr, target_type)
+
+    def _store_condition(self, cmds: List[str], clauses: List[str]) -> str:
+        """把条件结果存入 0/1 临时变量"""
+        flag = self.builder.get_temp_var()
+        cmds.append(self.builder.set_score(flag, "_tmp", 0))
+        cmds.append(f"execute {' '.join(clauses)} run {self.builder.set_score(flag, '_tmp', 1)}")
+        return flag
+
+    @staticmethod
+    def _is_boolean(expr: Any) -> bool:
+        """结果只可能是 0 或 1 的表达式"""
+        return ((isinstance(expr, BinOp) and expr.op in _COMPARE_OPS) or
+                (isinstance(expr, UnaryOp) and expr.op == '!'))
+
     def _gen_and_op(self, expr: BinOp, target_var: str) -> List[str]:
         """生成逻辑与 AND 运算（短路求值）"""
         cmds = []
@@ -204,27 +411,11 @@ class ExprGenerator:
 
         return cmds
 
-    def _gen_equality_op(self, expr: BinOp, target_var: str) -> List[str]:
-        """生成相等 == 和不等 != 运算（支持 bool 和数字）"""
-        cmds = []
-        left = self.builder.get_temp_var()
-        right = self.builder.get_temp_var()
-
-        # 生成两边操作数（bool 也是用 0/1 存储的 scoreboard）
-        cmds.extend(self.gen_expr_to(expr.left, left))
-        cmds.extend(self.gen_expr_to(expr.right, right))
-
-        if expr.op == '==':
-            # 相等：先设为0，如果相等设为1
-            cmds.append(self.builder.set_score(target_var, "_tmp", 0))
-            cmds.append(f"execute if score {left} _tmp = {right} _tmp run "
-                        f"scoreboard players set {target_var} _tmp 1")
-        else:  # '!='
-            # 不等：先设为1，如果相等设为0
-            cmds.append(self.builder.set_score(target_var, "_tmp", 1))
-            cmds.append(f"execute if score {left} _tmp = {right} _tmp run "
-                        f"scoreboard players set {target_var} _tmp 0")
-
+    def _gen_compare_op(self, expr: BinOp, target_var: str) -> List[str]:
+        """比较、相等 == 和不等 != 运算（bool 也是用 0/1 存储的 scoreboard）：
+        条件子命令成立时 store success 写入 1，否则写入 0"""
+        cmds, clauses = self._compare_condition(expr)
+        cmds.append(f"execute store success score {target_var} _tmp {clauses[0]}")
         return cmds
 
     def _infer_expr_type(self, expr) -> 'TypeDesc':
@@ -250,8 +441,8 @@ class ExprGenerator:
         return UNKNOWN
 
     def _gen_call(self, expr: CallExpr, target_var: Optional[str]) -> List[str]:
-        func_name = getattr(expr, '_func_name',
-                            expr.callee.name if isinstance(expr.callee, Ident) else 'unknown')
+        func_name = (getattr(expr, '_func_name', None) or
+                     (expr.callee.name if isinstance(expr.callee, Ident) else 'unknown'))
 
         if getattr(expr, '_is_struct_constructor', False):
             struct_name = getattr(expr, '_struct_name')
@@ -267,6 +458,11 @@ class ExprGenerator:
         if not func_info:
             return []
 
+        if self.ctx.inliner:
+            inlined = self.ctx.inliner.gen_call(self, expr, target_var)
+            if inlined is not None:
+                return inlined
+
         params, ret_type, _ = func_info
         cmds = []
         macro_args = {}
@@ -309,8 +505,9 @@ class ExprGenerator:
                     resolved = self.ctx.resolve_storage(arg_storage)
                     macro_args[pname] = resolved
                 elif isinstance(arg, ArrayLiteral):
-                    # 字面量数组：需要初始化到临时 storage 再传递
+                    # 字面量数组：初始化到临时 storage 再传递
                     temp_arr = f"__arr_arg_{self.builder.get_temp_var()}"
+                    cmds.extend(self._gen_array_arg(arg, temp_arr, ptype.elem or INT))
                     macro_args[pname] = temp_arr
 
             else:
@@ -413,7 +610,7 @@ class ExprGenerator:
         return f"{base_storage}_{field_name}"
 
     def _gen_index(self, expr: IndexExpr, target_var: str) -> List[str]:
-        base_type = getattr(expr.base, '_type', UNKNOWN)
+        base_type = getattr(expr.base, '_type', None) or UNKNOWN
 
         # 处理嵌套索引（如 arr[field][index]）
         if isinstance(expr.base, IndexExpr):
@@ -504,70 +701,90 @@ class ExprGenerator:
 
     def _gen_array_index_impl(self, expr: IndexExpr, target_var: str, arr_path: str, elem_type: TypeDesc) -> List[str]:
         """数组索引生成的具体实现"""
-        cmds = []
-
         if isinstance(expr.index, IntLiteral):
             # 编译期常量索引
-            idx = expr.index.value
-
-            if elem_type.kind == 'struct':
-                # 结构体数组元素复制
-                fields = self.ctx.structs.get(elem_type.name, {})
-                for fname, ftype in fields.items():
-                    src = f"{arr_path}[{idx}].{fname}"
-                    dst = f"{target_var}_{fname}"
-                    if ftype.kind == 'prim' and ftype.name == 'string':
-                        cmds.append(self.builder.data_copy_storage(dst, src))
-                    elif ftype.is_value_type():
-                        type_str = "int" if ftype.name == 'int' else "double"
-                        scale = 1 if ftype.name == 'int' else 0.01
-                        cmds.append(
-                            f'execute store result score {dst} _tmp run data get storage {self.ctx.namespace}:data {src} {scale}')
-            elif elem_type.kind == 'prim' and elem_type.name == 'string':
-                # 字符串数组
-                src = f"{arr_path}[{idx}]"
-                cmds.append(self.builder.data_copy_storage(target_var, src))
+            return self.gen_element_load(f"{arr_path}[{expr.index.value}]", target_var, elem_type)
+
+        # 运行期动态索引（使用宏命令）
+        idx_temp = self.builder.get_temp_var()
+        cmds = self.gen_expr_to(expr.index, idx_temp)
+        cmds.extend(self.gen_indexed_load(arr_path, idx_temp, target_var, elem_type))
+        return cmds
+
+    def _gen_array_arg(self, arr: ArrayLiteral, target: str, elem_type: TypeDesc) -> List[str]:
+        """数值数组字面量写入 storage 路径 target，并设置长度分数 {target}_len"""
+        cmds = [f'data modify storage {self.ctx.namespace}:data {target} set value {[0] * len(arr.items)}']
+        for i, item in enumerate(arr.items):
+            temp = self.builder.get_temp_var()
+            cmds.extend(self.gen_expr_to(item, temp, elem_type))
+            if elem_type.kind == 'prim' and elem_type.name == 'float':
+                cmds.append(f'execute store result storage {self.ctx.namespace}:data {target}[{i}] double 0.01 '
+                            f'run scoreboard players get {temp} _tmp')
             else:
-                # 基础数值类型
-                scale = 1 if elem_type.name == 'int' else 0.01
-                cmds.append(
-                    f'execute store result score {target_var} _tmp run data get storage {self.ctx.namespace}:data {arr_path}[{idx}] {scale}')
+                cmds.append(f'execute store result storage {self.ctx.namespace}:data {target}[{i}] int 1 '
+                            f'run scoreboard players get {temp} _tmp')
+        cmds.append(self.builder.set_score(f"{target}_len", "_tmp", len(arr.items)))
+        return cmds
+
+    def gen_element_load(self, src: str, target_var: str, elem_type: TypeDesc) -> List[str]:
+        """把 storage 路径 src 上的一个数组元素载入 target_var"""
+        cmds = []
+        if elem_type.kind == 'struct':
+            # 结构体数组元素复制
+            fields = self.ctx.structs.get(elem_type.name, {})
+            for fname, ftype in fields.items():
+                field_src = f"{src}.{fname}"
+                dst = f"{target_var}_{fname}"
+                if ftype.kind == 'prim' and ftype.name == 'string':
+                    cmds.append(self.builder.data_copy_storage(dst, field_src))
+                elif ftype.is_value_type():
+                    scale = 1 if ftype.name == 'int' else 0.01
+                    cmds.append(
+                        f'execute store result score {dst} _tmp run data get storage {self.ctx.namespace}:data {field_src} {scale}')
+        elif elem_type.kind == 'prim' and elem_type.name == 'string':
+            # 字符串数组
+            cmds.append(self.builder.data_copy_storage(target_var, src))
         else:
-            # 运行期动态索引（使用宏命令）
-            idx_temp = self.builder.get_temp_var()
-            cmds.extend(self.gen_expr_to(expr.index, idx_temp))
+            # 基础数值类型
+            scale = 1 if elem_type.name == 'int' else 0.01
             cmds.append(
-                f'execute store result storage {self.ctx.namespace}:data __args.index int 1 run scoreboard players get {idx_temp} _tmp')
+                f'execute store result score {target_var} _tmp run data get storage {self.ctx.namespace}:data {src} {scale}')
+        return cmds
 
-            if arr_path.startswith('$'):
-                cmds.append(f'$data modify storage {self.ctx.namespace}:data __args.path set value {arr_path}')
-            else:
-                cmds.append(f'data modify storage {self.ctx.namespace}:data __args.path set value "{arr_path}"')
+    def gen_indexed_load(self, arr_path: str, idx_temp: str, target_var: str, elem_type: TypeDesc) -> List[str]:
+        """按分数 idx_temp 的值通过宏函数读取数组元素（arr_path[$(index)]）"""
+        cmds = [
+            f'execute store result storage {self.ctx.namespace}:data __args.index int 1 run scoreboard players get {idx_temp} _tmp']
 
-            if elem_type.kind == 'struct':
-                fields = self.ctx.structs.get(elem_type.name, {})
-                for fname, ftype in fields.items():
-                    cmds.append(f'data modify storage {self.ctx.namespace}:data __args.field set value "{fname}"')
-                    cmds.append(
-                        f'data modify storage {self.ctx.namespace}:data __args.target set value "{target_var}_{fname}"')
-
-                    if ftype.kind == 'prim' and ftype.name == 'string':
-                        cmds.append(
-                            f'function {self.ctx.namespace}:__array_copy_field with storage {self.ctx.namespace}:data __args')
-                    elif ftype.is_value_type():
-                        type_str = "int" if ftype.name == 'int' else "double"
-                        cmds.append(f'data modify storage {self.ctx.namespace}:data __args.type set value "{type_str}"')
-                        cmds.append(
-                            f'function {self.ctx.namespace}:__array_get_field with storage {self.ctx.namespace}:data __args')
-            elif elem_type.kind == 'prim' and elem_type.name == 'string':
-                cmds.append(f'data modify storage {self.ctx.namespace}:data __args.target set value "{target_var}"')
+        if arr_path.startswith('$'):
+            cmds.append(f'$data modify storage {self.ctx.namespace}:data __args.path set value {arr_path}')
+        else:
+            cmds.append(f'data modify storage {self.ctx.namespace}:data __args.path set value "{arr_path}"')
+
+        if elem_type.kind == 'struct':
+            fields = self.ctx.structs.get(elem_type.name, {})
+            for fname, ftype in fields.items():
+                cmds.append(f'data modify storage {self.ctx.namespace}:data __args.field set value "{fname}"')
                 cmds.append(
-                    f'function {self.ctx.namespace}:__array_get_string with storage {self.ctx.namespace}:data __args')
-            else:
-                type_str = "int" if elem_type.name == 'int' else "double"
-                cmds.append(f'data modify storage {self.ctx.namespace}:data __args.target set value "{target_var}"')
-                cmds.append(f'data modify storage {self.ctx.namespace}:data __args.type set value "{type_str}"')
-                cmds.append(f'function {self.ctx.namespace}:__array_get with storage {self.ctx.namespace}:data __args')
+                    f'data modify storage {self.ctx.namespace}:data __args.target set value "{target_var}_{fname}"')
+
+                if ftype.kind == 'prim' and ftype.name == 'string':
+                    cmds.append(
+                        f'function {self.ctx.namespace}:__array_copy_field with storage {self.ctx.namespace}:data __args')
+                elif ftype.is_value_type():
+                    type_str = "int" if ftype.name == 'int' else "double"
+                    cmds.append(f'data modify storage {self.ctx.namespace}:data __args.type set value "{type_str}"')
+                    cmds.append(
+                        f'function {self.ctx.namespace}:__array_get_field with storage {self.ctx.namespace}:data __args')
+        elif elem_type.kind == 'prim' and elem_type.name == 'string':
+            cmds.append(f'data modify storage {self.ctx.namespace}:data __args.target set value "{target_var}"')
+            cmds.append(
+                f'function {self.ctx.namespace}:__array_get_string with storage {self.ctx.namespace}:data __args')
+        else:
+            type_str = "int" if elem_type.name == 'int' else "double"
+            cmds.append(f'data modify storage {self.ctx.namespace}:data __args.target set value "{target_var}"')
+            cmds.append(f'data modify storage {self.ctx.namespace}:data __args.type set value "{type_str}"')
+            cmds.append(f'function {self.ctx.namespace}:__array_get with storage {self.ctx.namespace}:data __args')
 
         return cmds
 
@@ -608,8 +825,8 @@ class ExprGenerator:
             if not selector:
                 selector = "@s"
 
-            nbt_path = getattr(expr, '_nbt_path', expr.field)
-            field_type = getattr(expr, '_type', FLOAT)
+            nbt_path = getattr(expr, '_nbt_path', None) or expr.field
+            field_type = getattr(expr, '_type', None) or FLOAT  # 未标注类型时 _type 为 None
 
             # === 新增：字符串类型特殊处理 ===
             if field_type.kind == 'prim' and field_type.name == 'string':
@@ -1,23 +1,54 @@
 """
 Import Resolver - 最小可行模块化系统
 支持相对路径导入和名称过滤
+每个模块在模块图中只解析一次，符号按 (模块, 名称) 去重，菱形导入不会产生重复声明
 """
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Set, Dict, Optional, Any
+from typing import List, Set, Dict, Optional, Any, Tuple
 
 from ast_nodes import ImportStmt, Program, FuncDecl, StructDecl
 from parser import parse
 
+# 发现阶段只需找出 import 语句，用正则扫描源码即可，无需完整解析
+_IMPORT_RE = re.compile(r'^\s*import\s+(?:\{[^}]*\}\s*from\s+)?"([^"]*)"', re.MULTILINE)
+
+# 待解析模块少于该数量时串行解析，避免进程池启动开销
+PARALLEL_MIN_MODULES = 4
+
+
+def _parse_source(code: str) -> Program:
+    """进程池工作函数：解析单个模块源码"""
+    return parse(code)
+
+
+class Module:
+    """模块图中的一个节点：模块 AST 与按名称索引的导出表"""
+
+    def __init__(self, path: str, ast: Program):
+        self.path = path
+        self.ast = ast
+        # 导出表：名称 -> 声明，保持源码中的声明顺序
+        self.exports: Dict[str, Any] = {
+            stmt.name: stmt for stmt in ast.stmts if isinstance(stmt, (FuncDecl, StructDecl))
+        }
+        self.imports: List[ImportStmt] = [stmt for stmt in ast.stmts if isinstance(stmt, ImportStmt)]
+
 
 class ImportResolver:
-    """简单导入解析器 - 方案A实现"""
+    """导入解析器：构建模块图，每个符号只合并一次"""
 
-    def __init__(self, base_path: str = "."):
+    def __init__(self, base_path: str = ".", cache: Optional[Any] = None,
+                 max_workers: Optional[int] = None):
         self.base_path = Path(base_path).resolve()
-        self.loaded_modules: Set[str] = set()  # 防止循环导入
-        self.all_functions: Dict[str, FuncDecl] = {}
-        self.all_structs: Dict[str, StructDecl] = {}
+        self.cache = cache  # 可选的 ASTCache，命中时跳过词法/语法分析
+        self.max_workers = max_workers  # 并行解析的进程数，None 为 CPU 核数，1 为串行
+        self.parsed: Dict[str, Program] = {}  # 预解析的模块 AST
+        self.modules: Dict[str, Module] = {}  # 模块图：模块路径 -> Module
+        self.loaded_modules: Set[str] = set()  # 已展开过子导入的模块，防止循环导入
+        self.merged: Set[Tuple[str, str]] = set()  # 已合并的 (模块路径, 符号名)
         self.import_order: List[str] = []  # 记录加载顺序
 
     def resolve_program(self, program: Program) -> Program:
@@ -25,6 +56,8 @@ class ImportResolver:
         解析程序中的所有导入，合并AST
         返回合并后的新Program
         """
+        self.preload(self.discover(program))
+
         new_stmts = []
 
         for stmt in program.stmts:
@@ -38,44 +71,108 @@ class ImportResolver:
 
         return Program(stmts=new_stmts)
 
+    def _get_module(self, module_path: Path) -> Module:
+        """从模块图中取出模块，首次访问时解析"""
+        key = str(module_path)
+        module = self.modules.get(key)
+        if module is None:
+            ast = self.parsed.get(key)
+            if ast is None:
+                with open(module_path, 'r', encoding='utf-8') as f:
+                    code = f.read()
+                ast = self.cache.parse(code) if self.cache else parse(code)
+            module = self.modules[key] = Module(key, ast)
+        return module
+
     def _load_import(self, import_stmt: ImportStmt) -> List[Any]:
-        """加载单个导入语句，返回要合并的语句列表"""
+        """加载单个导入语句，返回要合并的语句列表（已合并过的符号不会重复返回）"""
         module_path = self._resolve_path(import_stmt.module)
 
         if not module_path.exists():
             raise ImportError(f"找不到模块: {import_stmt.module} (查找路径: {module_path})")
 
-        if str(module_path) in self.loaded_modules:
-            # 已加载过，只返回需要的名称（如果有过滤）
-            return self._filter_symbols(import_stmt.names)
+        module = self._get_module(module_path)
+        names = import_stmt.names
+        if names is not None:
+            for name in names:
+                if name not in module.exports:
+                    raise ImportError(f"导入错误: '{name}' 未在模块 {import_stmt.module} 中定义")
 
-        self.loaded_modules.add(str(module_path))
-        self.import_order.append(import_stmt.module)
+        first_load = module.path not in self.loaded_modules
+        if first_load:
+            self.loaded_modules.add(module.path)
+            self.import_order.append(import_stmt.module)
 
-        # 解析文件
-        with open(module_path, 'r', encoding='utf-8') as f:
-            code = f.read()
-
-        ast = parse(code)
-
-        # 提取函数和结构体定义
         stmts_to_import = []
-        for stmt in ast.stmts:
-            if isinstance(stmt, FuncDecl):
-                self.all_functions[stmt.name] = stmt
-                if import_stmt.names is None or stmt.name in import_stmt.names:
-                    stmts_to_import.append(stmt)
-            elif isinstance(stmt, StructDecl):
-                self.all_structs[stmt.name] = stmt
-                if import_stmt.names is None or stmt.name in import_stmt.names:
-                    stmts_to_import.append(stmt)
-            elif isinstance(stmt, ImportStmt):
-                # 递归处理子导入
-                nested = self._load_import(stmt)
-                stmts_to_import.extend(nested)
+        if first_load:
+            # 子导入只在模块第一次加载时展开，依赖的声明排在本模块之前
+            for nested in module.imports:
+                stmts_to_import.extend(self._load_import(nested))
+
+        if names is None:
+            decls = list(module.exports.values())
+        else:
+            decls = [module.exports[name] for name in names]
+        for decl in decls:
+            key = (module.path, decl.name)
+            if key not in self.merged:
+                self.merged.add(key)
+                stmts_to_import.append(decl)
 
         return stmts_to_import
 
+    def discover(self, program: Program) -> Dict[str, str]:
+        """
+        发现阶段：从入口程序出发扫描 import 语句，构建模块图
+        返回 {模块路径: 源码}，找不到的模块留给合并阶段报错
+        """
+        sources: Dict[str, str] = {}
+        pending = [stmt.module for stmt in program.stmts if isinstance(stmt, ImportStmt)]
+
+        while pending:
+            module_path = self._resolve_path(pending.pop())
+            key = str(module_path)
+            if key in sources or key in self.parsed or not module_path.is_file():
+                continue
+            with open(module_path, 'r', encoding='utf-8') as f:
+                code = f.read()
+            sources[key] = code
+            pending.extend(_IMPORT_RE.findall(code))
+
+        return sources
+
+    def preload(self, sources: Dict[str, str]):
+        """解析发现的模块：缓存命中的直接读取，其余在进程池中并行解析"""
+        to_parse: Dict[str, str] = {}
+        for key, code in sources.items():
+            cached = self.cache.load(code) if self.cache and self.cache.enabled else None
+            if cached is not None:
+                self.cache.hits += 1
+                self.parsed[key] = cached
+            else:
+                to_parse[key] = code
+
+        if not to_parse:
+            return
+
+        keys = list(to_parse)
+        codes = [to_parse[k] for k in keys]
+        workers = self.max_workers or os.cpu_count() or 1
+        if workers <= 1 or len(codes) < PARALLEL_MIN_MODULES:
+            results = [parse(code) for code in codes]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_parse_source, codes))
+
+        for key, code, ast in zip(keys, codes, results):
+            if ast is None:
+                # 语法错误：留给合并阶段按原流程重新解析并报告
+                continue
+            self.parsed[key] = ast
+            if self.cache and self.cache.enabled:
+                self.cache.misses += 1
+                self.cache.store(code, ast)
+
     def _resolve_path(self, module: str) -> Path:
         """解析模块路径"""
         if module.startswith("./") or module.startswith("../"):
@@ -93,30 +190,12 @@ class ImportResolver:
                 return stdlib
             return local  # 返回默认路径，让报错显示正确的查找位置
 
-    def _filter_symbols(self, names: Optional[List[str]]) -> List[Any]:
-        """从已加载的符号中过滤需要的"""
-        if names is None:
-            # 返回所有已加载的
-            result = []
-            result.extend(self.all_structs.values())
-            result.extend(self.all_functions.values())
-            return result
-
-        result = []
-        for name in names:
-            if name in self.all_functions:
-                result.append(self.all_functions[name])
-            elif name in self.all_structs:
-                result.append(self.all_structs[name])
-            else:
-                raise ImportError(f"导入错误: '{name}' 未在模块中定义")
-        return result
-
 
-def merge_imports(program: Program, base_path: str = ".") -> Program:
+def merge_imports(program: Program, base_path: str = ".", cache: Optional[Any] = None,
+                  max_workers: Optional[int] = None) -> Program:
     """
     便捷函数：解析并合并程序中的所有导入
     用法: program = merge_imports(program, "./src")
     """
-    resolver = ImportResolver(base_path)
+    resolver = ImportResolver(base_path, cache, max_workers)
     return resolver.resolve_program(program)
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+Incremental Build - 函数粒度的增量编译
+构建状态记录每个 FuncDecl 的源码哈希、签名以及它依赖的函数和结构体，
+再次编译时只对输入发生变化的函数重新做语义分析和代码生成，
+其余函数直接拼接上一次的输出。
+
+复用条件（保证与全量编译逐字节一致）：
+  1. 编译器、命名空间、pack_format、影响函数体生成的编译选项均未变化
+  2. 函数源码、依赖的函数签名（会被内联的函数则是完整源码）、结构体定义、全局语句均未变化，
+     读取的变量是否可以常量传播（取决于整个程序中的声明和赋值）也未变化
+  3. 生成该函数前的计数器状态（临时变量、代码块、实体标签、函数数量）与上次一致
+"""
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ast_nodes import FuncDecl, StructDecl, Program, Ident, TypeNode, WhileStmt, BoolLiteral, iter_nodes
+from ast_cache import COMPILER_VERSION
+from const_folder import propagation_candidates
+from parser import get_cache_dir
+
+
+def compiler_fingerprint() -> str:
+    """编译器源码指纹：任何编译器模块变化都会使构建状态失效"""
+    h = hashlib.sha256(COMPILER_VERSION.encode('utf-8'))
+    base = Path(os.path.abspath(__file__)).parent
+    for path in sorted(base.glob("*.py")):
+        h.update(path.name.encode('utf-8'))
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _referenced_names(node: Any) -> Set[str]:
+    """收集节点中引用到的标识符、类型名和被调函数名"""
+    names = set()
+    for n in iter_nodes(node):
+        if isinstance(n, Ident):
+            names.add(n.name)
+        elif isinstance(n, TypeNode):
+            names.add(n.base)
+    return names
+
+
+def _writes_shared_functions(decl: FuncDecl) -> bool:
+    """while true 会写入全局共享的 __tick__ 函数，这类函数不能单独复用"""
+    for n in iter_nodes(decl.body):
+        if isinstance(n, WhileStmt) and isinstance(n.cond, BoolLiteral) and n.cond.value:
+            return True
+    return False
+
+
+class IncrementalBuild:
+    """增量编译状态：负责判定脏函数、复用或记录函数的生成结果"""
+
+    def __init__(self, state_path: Path, namespace: str, pack_format: int,
+                 previous: Optional['IncrementalBuild'] = None, options: Tuple = ()):
+        self.state_path = state_path
+        self.namespace = namespace
+        self.pack_format = pack_format
+        self.options = options  # 影响函数体生成的编译选项（如常量折叠）
+        self.fingerprint = previous.fingerprint if previous else compiler_fingerprint()
+
+        self.previous: Dict[str, Dict[str, Any]] = {}
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.inputs: Dict[str, Dict[str, Any]] = {}
+        self.dirty: Set[str] = set()
+        self.unanalyzed: Set[str] = set()
+        self.analyzer = None
+
+        self.reused: List[str] = []
+        self.regenerated: List[str] = []
+
+        if previous is not None and previous.state_path == state_path and previous.options == options:
+            # 常驻进程（watch 模式）直接沿用内存中的上一次记录
+            self.previous = previous.records
+        else:
+            self._load()
+
+    @classmethod
+    def for_output(cls, output_path: Path, namespace: str, pack_format: int,
+                   previous: Optional['IncrementalBuild'] = None, options: Tuple = ()) -> 'IncrementalBuild':
+        """按输出目录和命名空间定位构建状态文件"""
+        key = _hash(f"{Path(output_path).resolve()}|{namespace}")[:16]
+        return cls(get_cache_dir() / "builds" / f"{key}.pickle", namespace, pack_format, previous, options)
+
+    def _load(self):
+        if not self.state_path.exists():
+            return
+        try:
+            with open(self.state_path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception:
+            return
+        if (state.get('fingerprint') == self.fingerprint and
+                state.get('namespace') == self.namespace and
+                state.get('pack_format') == self.pack_format and
+                state.get('options') == self.options):
+            self.previous = state.get('functions', {})
+
+    def save(self):
+        state = {
+            'fingerprint': self.fingerprint,
+            'namespace': self.namespace,
+            'pack_format': self.pack_format,
+            'options': self.options,
+            'functions': self.records,
+        }
+        tmp_path = self.state_path.with_name(f"{self.state_path.name}.{os.getpid()}.tmp")
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            pass
+
+    # ========== 输入分析 ==========
+
+    def prepare(self, program: Program, inline_candidates: Set[str] = frozenset()) -> Set[str]:
+        """
+        计算每个函数的输入（源码哈希、签名、依赖），确定脏函数
+        返回可以跳过语义分析的函数名集合；可能被内联的函数总是需要分析，供调用方展开
+        """
+        funcs = {s.name: s for s in program.stmts if isinstance(s, FuncDecl)}
+        structs = {s.name: s for s in program.stmts if isinstance(s, StructDecl)}
+        globals_hash = _hash(repr([s for s in program.stmts
+                                   if not isinstance(s, (FuncDecl, StructDecl))]))
+        constants = propagation_candidates(program)
+
+        for name, decl in funcs.items():
+            self.inputs[name] = self._function_inputs(decl, funcs, structs, globals_hash, inline_candidates,
+                                                      constants)
+
+        skip = set()
+        for name, inputs in self.inputs.items():
+            prev = self.previous.get(name)
+            if prev is None or prev['inputs'] != inputs:
+                self.dirty.add(name)
+            elif name not in inline_candidates:
+                skip.add(name)
+        self.unanalyzed = set(skip)
+        return skip
+
+    def _function_inputs(self, decl: FuncDecl, funcs: Dict[str, FuncDecl],
+                         structs: Dict[str, StructDecl], globals_hash: str,
+                         inline_candidates: Set[str], constants: Set[str]) -> Dict[str, Any]:
+        names = _referenced_names(decl)
+        # 被内联的函数体成为本函数输出的一部分：它引用的名字（包括再被内联的函数）也是依赖
+        inlined = set()
+        pending = [n for n in names if n in inline_candidates and n != decl.name]
+        while pending:
+            f = pending.pop()
+            if f not in inlined:
+                inlined.add(f)
+                refs = _referenced_names(funcs[f])
+                names |= refs
+                pending.extend(n for n in refs if n in inline_candidates)
+        dep_funcs = sorted(n for n in names if n in funcs and n != decl.name)
+
+        # 结构体依赖：函数自身引用的 + 被调函数签名中的 + 嵌套字段的（传递闭包）
+        struct_names = {n for n in names if n in structs}
+        for f in dep_funcs:
+            struct_names |= {n for n in _referenced_names((funcs[f].params, funcs[f].ret_type)) if n in structs}
+        pending = list(struct_names)
+        while pending:
+            for n in _referenced_names(structs[pending.pop()].fields):
+                if n in structs and n not in struct_names:
+                    struct_names.add(n)
+                    pending.append(n)
+
+        return {
+            'source': _hash(repr(decl) + repr(decl.annotations)),
+            'signature': _hash(repr((decl.params, decl.ret_type))),
+            'funcs': {f: _hash(repr(funcs[f]) + repr(funcs[f].annotations)) if f in inlined
+                      else _hash(repr((funcs[f].params, funcs[f].ret_type))) for f in dep_funcs},
+            'structs': {s: _hash(repr(structs[s])) for s in sorted(struct_names)},
+            'globals': globals_hash,
+            # 常量传播的候选按整个程序计算：其他函数新增同名声明或赋值时，本函数的读取不再被替换
+            'constants': sorted(n for n in names if n in constants),
+        }
+
+    # ========== 代码生成钩子 ==========
+
+    def attach(self, analyzer):
+        """绑定语义分析器，用于补做被跳过函数的分析"""
+        self.analyzer = analyzer
+
+    @staticmethod
+    def _counters(gen) -> Tuple[int, ...]:
+        return (gen.builder._temp_counter, gen.builder._func_counter, len(gen.builder.functions),
+                gen.ctx.block_counter, gen.ctx.entity_counter)
+
+    @staticmethod
+    def _snapshot(gen) -> Dict[str, Dict[str, Any]]:
+        return {
+            'var_map': dict(gen.ctx.var_map),
+            'array_lengths': dict(gen.ctx.array_lengths),
+            'entity_tags': dict(gen.ctx.entity_tags),
+            'const_pool': dict(gen.ctx.const_pool),
+        }
+
+    @staticmethod
+    def _diff(before: Dict[str, Dict[str, Any]], after: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        delta = {}
+        for key, old in before.items():
+            new = after[key]
+            delta[key] = {
+                'set': {k: v for k, v in new.items() if k not in old or old[k] != v},
+                'del': [k for k in old if k not in new],
+            }
+        return delta
+
+    def gen_func_decl(self, gen, stmt: FuncDecl):
+        """生成单个函数：满足复用条件时拼接上次输出，否则重新分析并生成"""
+        name = stmt.name
+        start = self._counters(gen)
+        prev = self.previous.get(name)
+
+        if (prev is not None and name not in self.dirty and prev['start'] == start and
+                not any(out[0] in gen.builder.functions for out in prev['outputs'])):
+            self._splice(gen, prev)
+            self.records[name] = prev
+            self.reused.append(name)
+            return
+
+        if name in self.unanalyzed and self.analyzer is not None:
+            self.analyzer.analyze_function(stmt)
+            self.unanalyzed.discard(name)
+
+        tick_func = gen.ctx.tick_function
+        tick_len = len(tick_func.commands) if tick_func else 0
+        before = self._snapshot(gen)
+        known = set(gen.builder.functions)
+
+        gen._gen_func_decl(stmt)
+        self.regenerated.append(name)
+
+        end = self._counters(gen)
+        touched_shared = (gen.ctx.tick_function is not tick_func or
+                          (tick_func is not None and len(tick_func.commands) != tick_len))
+        if touched_shared or end[1] != start[1] or _writes_shared_functions(stmt):
+            return
+
+        outputs = [(fn.name, fn.is_tick, fn.is_load, list(fn.commands))
+                   for fname, fn in gen.builder.functions.items() if fname not in known]
+        self.records[name] = {
+            'inputs': self.inputs.get(name),
+            'start': start,
+            'end': end,
+            'outputs': outputs,
+            'delta': self._diff(before, self._snapshot(gen)),
+        }
+
+    def _splice(self, gen, record: Dict[str, Any]):
+        from command_builder import MCFunction
+
+        for fname, is_tick, is_load, commands in record['outputs']:
+            gen.builder.functions[fname] = MCFunction(fname, list(commands), is_tick=is_tick, is_load=is_load)
+
+        for key, change in record['delta'].items():
+            target = getattr(gen.ctx, key)
+            for k in change['del']:
+                target.pop(k, None)
+            target.update(change['set'])
+
+        temp_counter, func_counter, _, block_counter, entity_counter = record['end']
+        gen.builder._temp_counter = temp_counter
+        gen.builder._func_counter = func_counter
+        gen.ctx.block_counter = block_counter
+        gen.ctx.entity_counter = entity_counter
+
+    def summary(self) -> str:
+        return f"复用 {len(self.reused)} 个函数, 重新生成 {len(self.regenerated)} 个"
@@ -0,0 +1,309 @@
+"""
+Inliner - 在调用处展开用户函数
+调用函数需要把每个参数写入 {函数名}_{参数}、执行 function、再从 _ret_{函数名} 取回返回值，
+对 clamp、dist2 这类几条语句的函数来说调用本身比函数体还贵。
+
+满足条件的调用直接在调用处生成被调函数的函数体（复制 AST，不修改原函数）：
+  - 参数和返回值都是 int/float/bool，函数不在调用环中，函数体内没有 while true 和实体变量
+  - 按 lower_if_return 改写后所有 return 都位于函数末尾（展开后的 return 不能结束函数）
+  - 函数体没有循环且不超过 max_size 条语句（嵌套块中的语句也计数），或者标注了 $inline
+函数体在被调函数的上下文中生成：局部变量属于新推入的代码块 {函数名}_blk{N}_{变量}，
+每个调用点各不相同，不会与被调函数自身或其他调用点的变量冲突；return 照常写入 _ret_{函数名}。
+参数的处理：
+  - 从未被赋值的参数，实参为同类型字面量时直接替换进函数体，折叠后条件为常量的 if 只保留执行的分支
+  - 从未被赋值的参数，实参为函数局部变量时直接读取该变量（被调函数不在调用环中，不会修改它）
+  - 其余情况先把实参求值到代码块内的参数变量
+被调函数本身仍然照常生成，供命令字符串、函数标签等外部调用使用。
+"""
+import copy
+from dataclasses import fields, is_dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ast_nodes import (Program, FuncDecl, LetStmt, AssignStmt, ForStmt, WhileStmt, IfStmt, ReturnStmt, CmdStmt,
+                       Ident, IntLiteral, FloatLiteral, BoolLiteral, BinOp, CallExpr, IndexExpr, FieldAccess,
+                       TypeNode, InlineAnnot, UnrollAnnot, iter_nodes)
+from command_builder import MCFunction
+from const_folder import ConstantFolder
+
+_INLINE_TYPES = ('int', 'float', 'bool')
+_LITERALS = (IntLiteral, FloatLiteral, BoolLiteral)
+
+
+def lower_if_return(body: List[Any]) -> List[Any]:
+    """
+    return 只写入返回值而不结束函数：if 的 then 块以 return 结尾且没有 else 块时，
+    把同一代码块中其后的所有语句移入 else 块，返回截断后的语句列表（递归处理 if 的各个分支）
+    """
+    for i, s in enumerate(body):
+        if isinstance(s, IfStmt):
+            s.then_block = lower_if_return(s.then_block)
+            if s.else_block:
+                s.else_block = lower_if_return(s.else_block)
+            elif _always_returns(s.then_block) and i + 1 < len(body):
+                s.else_block = lower_if_return(body[i + 1:])
+                return body[:i + 1]
+    return body
+
+
+def _always_returns(block: List[Any]) -> bool:
+    if not block:
+        return False
+    last = block[-1]
+    if isinstance(last, IfStmt):
+        return _always_returns(last.then_block) and _always_returns(last.else_block or [])
+    return isinstance(last, ReturnStmt)
+
+
+def tail_returns(body: List[Any]) -> Set[int]:
+    """执行后函数随即结束的 return（id）：函数体末尾的 return 以及末尾 if 各分支末尾的 return"""
+    if not body:
+        return set()
+    last = body[-1]
+    if isinstance(last, ReturnStmt):
+        return {id(last)}
+    if isinstance(last, IfStmt):
+        return tail_returns(last.then_block) | tail_returns(last.else_block or [])
+    return set()
+
+
+def has_early_return(body: List[Any]) -> bool:
+    """是否有执行后函数还会继续执行的 return（只写入返回值时需要 return 指令才能正确结束函数）"""
+    tails = tail_returns(body)
+    return any(isinstance(n, ReturnStmt) and id(n) not in tails for n in iter_nodes(body))
+
+
+def stmt_count(block: List[Any]) -> int:
+    count = 0
+    for s in block:
+        count += 1
+        if isinstance(s, IfStmt):
+            count += stmt_count(s.then_block) + stmt_count(s.else_block or [])
+        elif isinstance(s, (WhileStmt, ForStmt)):
+            count += stmt_count(s.block)
+    return count
+
+
+def _assigned_names(body: List[Any]) -> Set[str]:
+    """函数体中被赋值或重新声明的变量名"""
+    names = set()
+    for node in iter_nodes(body):
+        if isinstance(node, AssignStmt):
+            root = node.target
+            while isinstance(root, (IndexExpr, FieldAccess)):
+                root = root.base
+            if isinstance(root, Ident):
+                names.add(root.name)
+        elif isinstance(node, LetStmt):
+            names.add(node.name)
+        elif isinstance(node, ForStmt):
+            names.add(node.var)
+    return names
+
+
+def substitute(node: Any, values: Dict[str, Any]) -> Any:
+    """把变量读取替换为字面量（不替换被调函数名）"""
+    if isinstance(node, Ident):
+        return copy.deepcopy(values[node.name]) if node.name in values else node
+    if isinstance(node, list):
+        node[:] = [substitute(item, values) for item in node]
+    elif isinstance(node, tuple):
+        return tuple(substitute(item, values) for item in node)
+    elif is_dataclass(node):
+        for f in fields(node):
+            if f.name.startswith('_') or (isinstance(node, CallExpr) and f.name == 'callee'):
+                continue
+            setattr(node, f.name, substitute(getattr(node, f.name), values))
+    return node
+
+
+def prune(block: List[Any]) -> List[Any]:
+    """条件折叠为常量的 if 只保留会执行的分支（分支中有变量声明时保留代码块，避免改变作用域）"""
+    result = []
+    for s in block:
+        if isinstance(s, IfStmt):
+            s.then_block = prune(s.then_block)
+            s.else_block = prune(s.else_block) if s.else_block else s.else_block
+            if isinstance(s.cond, (BoolLiteral, IntLiteral)):
+                taken = s.then_block if int(s.cond.value) >= 1 else (s.else_block or [])
+                if not any(isinstance(t, (LetStmt, ForStmt)) for t in taken):
+                    result.extend(taken)
+                    continue
+        result.append(s)
+    return result
+
+
+def _is_simple_type(type_node: Any) -> bool:
+    return isinstance(type_node, TypeNode) and type_node.base in _INLINE_TYPES and not type_node.dims
+
+
+class Inliner:
+    """在调用处展开小函数和 $inline 函数"""
+
+    def __init__(self, max_size: int = 5):
+        self.max_size = max_size  # 自动内联的函数体语句数上限，0 表示只内联 $inline 函数
+        self.fold = False  # 为 True 时折叠替换参数后的函数体
+        self.reasons: Dict[str, Optional[str]] = {}  # 函数名 -> 不能内联的原因（None 表示可以内联）
+        self.global_vars: Dict[str, Tuple[str, Any]] = {}  # 全局语句生成之后的 var_map，函数体只能看到全局变量
+        self.inlined: Dict[str, int] = {}  # 函数名 -> 展开的调用点数
+        self.rejected: Dict[str, str] = {}  # 被调用但没有展开的函数 -> 原因
+
+    @property
+    def candidates(self) -> Set[str]:
+        return {name for name, reason in self.reasons.items() if reason is None}
+
+    def prepare(self, program: Program):
+        """在语义分析之前确定可以内联的函数（只依赖源码）"""
+        funcs = {s.name: s for s in program.stmts if isinstance(s, FuncDecl)}
+        calls = {name: {n.callee.name for n in iter_nodes(decl.body)
+                        if isinstance(n, CallExpr) and isinstance(n.callee, Ident) and n.callee.name in funcs}
+                 for name, decl in funcs.items()}
+        self.reasons = {name: self._reason(decl, self._in_cycle(name, calls)) for name, decl in funcs.items()}
+
+    @staticmethod
+    def _in_cycle(name: str, calls: Dict[str, Set[str]]) -> bool:
+        seen: Set[str] = set()
+        pending = list(calls[name])
+        while pending:
+            callee = pending.pop()
+            if callee == name:
+                return True
+            if callee not in seen:
+                seen.add(callee)
+                pending.extend(calls[callee])
+        return False
+
+    def _reason(self, decl: FuncDecl, recursive: bool) -> Optional[str]:
+        if recursive:
+            return "递归调用"
+        if any(not isinstance(a, (InlineAnnot, UnrollAnnot)) for a in decl.annotations):
+            return "带有装饰器"
+        if not all(_is_simple_type(t) for _, t in decl.params):
+            return "参数不是 int/float/bool"
+        if decl.ret_type is not None and not _is_simple_type(decl.ret_type):
+            return "返回值不是 int/float/bool"
+        for node in iter_nodes(decl.body):
+            if isinstance(node, WhileStmt) and isinstance(node.cond, BoolLiteral) and node.cond.value:
+                return "包含 while true"
+        if has_early_return(lower_if_return(copy.deepcopy(decl.body))):
+            return "包含提前返回"
+        if any(isinstance(a, InlineAnnot) for a in decl.annotations):
+            return None
+        if any(isinstance(n, (WhileStmt, ForStmt)) for n in iter_nodes(decl.body)):
+            return "包含循环"
+        size = stmt_count(decl.body)
+        if size > self.max_size:
+            return f"函数体 {size} 条语句"
+        return None
+
+    # ========== 展开调用 ==========
+
+    def gen_call(self, expr_gen, expr: CallExpr, target_var: Optional[str]) -> Optional[List[str]]:
+        """在调用处生成函数体，返回指令列表；不能内联时返回 None"""
+        ctx = expr_gen.ctx
+        name = expr.callee.name
+        if name not in self.reasons:
+            return None
+        params, ret_type, decl = ctx.funcs[name]
+        reason = self.reasons[name] or self._typed_reason(decl)
+        if reason is not None:
+            self.rejected.setdefault(name, reason)
+            return None
+        self.inlined[name] = self.inlined.get(name, 0) + 1
+
+        body = lower_if_return(copy.deepcopy(decl.body))
+        # cmd 插值按变量名读取分数，这时参数都需要真实的变量
+        has_cmd = any(isinstance(n, CmdStmt) for n in iter_nodes(body))
+        assigned = _assigned_names(body)
+        block_id = ctx.push_block()
+        cmds: List[str] = []
+
+        # 实参在调用方的上下文中求值
+        literals: Dict[str, Any] = {}
+        bindings: Dict[str, Tuple[str, Any]] = {}
+        for (pname, ptype), arg in zip(params, expr.args):
+            read_only = not has_cmd and pname not in assigned
+            if read_only and isinstance(arg, _LITERALS) and getattr(arg, '_type', None) == ptype:
+                literal = copy.deepcopy(arg)
+                if isinstance(literal, IntLiteral):
+                    literal._unscaled = False  # 与读取 int 参数一样，存入 float 目标时 ×100
+                literals[pname] = literal
+                continue
+            alias = self._caller_local(ctx, arg, ptype) if read_only else None
+            if alias:
+                bindings[pname] = (alias, ptype)
+                continue
+            storage = f"{name}_blk{block_id}_{pname}"
+            cmds.extend(expr_gen.gen_expr_to(arg, storage, ptype))
+            bindings[pname] = (storage, ptype)
+
+        if literals:
+            body = substitute(body, literals)
+        if self.fold:
+            inlined = FuncDecl(name, decl.params, decl.ret_type, body)
+            ConstantFolder().fold_function(inlined)
+            body = prune(inlined.body)
+
+        # 函数体只在结尾 return 时，返回值直接写入调用方的目标（and 会先写目标再读取参数，不能直接写）
+        returns = [n for n in iter_nodes(body) if isinstance(n, ReturnStmt)]
+        final = None
+        if (len(returns) == 1 and body[-1] is returns[0] and returns[0].expr is not None and
+                not (isinstance(returns[0].expr, BinOp) and returns[0].expr.op == 'and')):
+            if target_var:
+                final = body.pop().expr
+            elif not any(isinstance(n, CallExpr) for n in iter_nodes(returns[0].expr)):
+                body.pop()  # 返回值不会被读取
+
+        saved = (ctx.current_function, ctx.var_map, ctx.current_mcfunc, ctx.struct_params,
+                 ctx.param_substitutions, ctx.current_macro_args, ctx.can_exit)
+        scratch = MCFunction(f"fn_{name}")
+        ctx.current_function = name
+        ctx.var_map = dict(saved[1] if saved[0] is None else self.global_vars)
+        ctx.var_map.update(bindings)
+        ctx.struct_params, ctx.param_substitutions, ctx.current_macro_args = {}, {}, {}
+        ctx.can_exit = False  # 展开后的 return 只写入返回值（所有 return 都在末尾）
+        try:
+            for s in body:
+                expr_gen.stmt_gen.gen_stmt(s, scratch)
+            tail = expr_gen.gen_expr_to(final, target_var, ret_type) if final is not None else []
+        finally:
+            (ctx.current_function, ctx.var_map, ctx.current_mcfunc, ctx.struct_params,
+             ctx.param_substitutions, ctx.current_macro_args, ctx.can_exit) = saved
+            ctx.pop_block()
+
+        cmds.extend(str(cmd) for cmd in scratch.commands)
+        cmds.extend(tail)
+        if target_var and ret_type and final is None:
+            cmds.append(expr_gen.builder.copy_score(target_var, f"_ret_{name}"))
+        return cmds
+
+    @staticmethod
+    def _typed_reason(decl: FuncDecl) -> Optional[str]:
+        """语义分析之后才能确定的条件"""
+        for node in iter_nodes(decl.body):
+            if isinstance(node, LetStmt) and getattr(getattr(node, '_type', None), 'kind', None) == 'entity':
+                return "包含实体变量"
+        return None
+
+    def _caller_local(self, ctx, arg: Any, ptype) -> Optional[str]:
+        """
+        实参是同类型的函数局部变量（包括外层内联展开中的）时返回它的分数名。
+        被调函数只能修改全局变量和自己的局部变量，要修改调用方的局部变量就必须在调用环中
+        """
+        if not isinstance(arg, Ident) or arg.name not in ctx.var_map or ctx.current_function is None:
+            return None
+        storage, var_type = ctx.var_map[arg.name]
+        resolved = ctx.resolve_storage(storage)
+        if var_type != ptype or '$' in resolved or resolved in {s for s, _ in self.global_vars.values()}:
+            return None
+        return resolved
+
+    # ========== 报告 ==========
+
+    def summary(self) -> str:
+        return f"{len(self.inlined)} 个函数, 展开 {sum(self.inlined.values())} 处调用"
+
+    def details(self) -> List[str]:
+        rows = [f"{name}: 展开 {count} 处" for name, count in sorted(self.inlined.items())]
+        rows += [f"{name}: 未内联 ({reason})" for name, reason in sorted(self.rejected.items())
+                 if name not in self.inlined]
+        return rows
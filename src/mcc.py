@@ -3,12 +3,16 @@
 
 """
 MCC 命令行编译器
-用法: ./mcc <源文件路径> <目标路径> [游戏版本(默认1.21)]
+用法: ./mcc <源文件路径> <目标路径> [游戏版本(默认1.21)] [--no-cache] [--keep-unused] [--no-fold] [--no-peephole] [--no-nbt-cse] [--keep-cleanup] [--no-cleanup] [--inline-if=N] [--no-inline] [--inline-size=N] [--unroll=N] [--reset-temps] [--no-early-return]
+      ./mcc watch <源文件路径> <目标路径> [游戏版本(默认1.21)]
+      ./mcc build <清单文件> [--jobs=N] [编译选项...]
 
 示例:
     ./mcc demo.mcc ./my_datapack 1.21.4
     ./mcc skills.mcc ./output
     python3 mcc.py src/main.mcc ./dist 1.20.5
+    ./mcc watch demo.mcc ./my_datapack
+    ./mcc build packs.toml --jobs=4
 """
 
 import sys
@@ -18,12 +22,16 @@ from pathlib import Path
 # 确保能导入同级目录的模块
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    from write_datapack import DatapackWriter
-except ImportError as e:
-    print(f"错误: 无法导入 MCC 编译模块: {e}")
-    print("请确保此脚本与 write_datapack.py 等模块位于同一目录")
-    sys.exit(1)
+
+def load_writer():
+    """按需导入编译器：参数校验通过后才加载，避免 --help 或错误路径也付出完整的导入开销"""
+    try:
+        from write_datapack import DatapackWriter
+    except ImportError as e:
+        print(f"错误: 无法导入 MCC 编译模块: {e}")
+        print("请确保此脚本与 write_datapack.py 等模块位于同一目录")
+        sys.exit(1)
+    return DatapackWriter
 
 
 def print_usage():
@@ -33,11 +41,110 @@ def print_usage():
     print("  target   - 数据包输出目录路径")
     print("  version  - 游戏版本号 (可选,默认 1.21) 低于1.20版本不可用, 1.20未经过测试")
     print("             支持: 1.20.5, 1.21, 1.21.4 等")
+    print("\n选项:")
+    print("  --no-cache - 禁用 AST 缓存，强制重新解析所有模块")
+    print("  --keep-unused - 保留未被引用的函数、结构体和数组宏")
+    print("  --no-fold - 关闭常量折叠与常量传播（按原样为常量表达式生成计分板运算）")
+    print("  --no-peephole - 关闭窥孔优化（保留冗余的复制、被覆盖的赋值等指令）")
+    print("  --no-nbt-cse - 每次读取实体属性都重新执行 data get entity（默认复用同一函数内未失效的读取结果）")
+    print("  --keep-cleanup - 保留函数末尾所有的局部变量清理（默认删除之后不会被读取的清理）")
+    print("  --no-cleanup - 不生成函数末尾的局部变量清理（局部变量的最后一个值会保留在计分板中）")
+    print("  --inline-if=N - 指令数不超过 N 的 if 分支直接内联为 execute 条件（默认 1，0 表示总是生成分支函数）")
+    print("  --no-inline - 关闭函数内联（总是通过 function 调用用户函数）")
+    print("  --inline-size=N - 函数体不超过 N 条语句的函数在调用处展开（默认 5，0 表示只展开 $inline 函数）")
+    print("  --unroll=N - 起止值为常量、展开后不超过 N 条语句的范围循环直接展开（默认 32，0 表示只展开 $unroll(N) 函数中的循环）")
+    print("  --reset-temps - 在函数末尾重置复用的临时变量槽位（不在 scoreboard.dat 中保留）")
+    print("  --no-early-return - 不使用 return 指令提前返回（改写为 if/else，1.20.3 以下总是如此）")
+    print("\n子命令:")
+    print("  watch    - 监视源文件及其导入的模块，修改后在常驻进程内增量重建")
+    print("  build    - 按清单 (TOML/JSON，每个 [[pack]] 含 source/target/namespace/version) 在一个进程内批量编译")
+    print("             --jobs=N 指定并行进程数（默认 CPU 核数），其余编译选项作用于清单中的所有数据包")
+
+
+def parse_options(options):
+    """命令行选项 -> 影响代码生成的编译配置（单个编译与 build 子命令共用）"""
+    inline_if = 1
+    inline_size = 5
+    unroll_size = 32
+    for opt in options:
+        if opt.startswith(("--inline-if=", "--inline-size=", "--unroll=")):
+            try:
+                value = int(opt.split("=", 1)[1])
+            except ValueError:
+                print(f"✗ 错误: 无效的阈值: {opt}")
+                sys.exit(1)
+            if opt.startswith("--inline-if="):
+                inline_if = value
+            elif opt.startswith("--inline-size="):
+                inline_size = value
+            else:
+                unroll_size = value
+
+    return {
+        "tree_shake": "--keep-unused" not in options,
+        "fold_constants": "--no-fold" not in options,
+        "peephole": "--no-peephole" not in options,
+        "nbt_cse": "--no-nbt-cse" not in options,
+        "eliminate_cleanup": "--keep-cleanup" not in options,
+        "drop_cleanup": "--no-cleanup" in options,
+        "inline_if": inline_if,
+        "inline_functions": "--no-inline" not in options,
+        "inline_size": inline_size,
+        "unroll_size": unroll_size,
+        "reset_temps": "--reset-temps" in options,
+        "early_return": "--no-early-return" not in options
+    }
+
+
+def run_build(args, options, use_cache):
+    """build 子命令：按清单批量编译"""
+    if len(args) < 1:
+        print_usage()
+        sys.exit(1)
+
+    manifest = Path(args[0])
+    if not manifest.is_file():
+        print(f"✗ 错误: 清单文件不存在: {args[0]}")
+        sys.exit(1)
+
+    jobs = None
+    for opt in options:
+        if opt.startswith("--jobs="):
+            try:
+                jobs = int(opt.split("=", 1)[1])
+            except ValueError:
+                print(f"✗ 错误: 无效的进程数: {opt}")
+                sys.exit(1)
+
+    from batch import run_batch
+    try:
+        ok = run_batch(manifest, use_cache=use_cache, max_workers=jobs, options=parse_options(options))
+    except Exception as e:
+        print(f"✗ 错误: {e}")
+        sys.exit(1)
+    sys.exit(0 if ok else 1)
 
 
 def main():
     args = sys.argv[1:]
 
+    # 分离选项与位置参数
+    options = {a for a in args if a.startswith("--")}
+    args = [a for a in args if not a.startswith("--")]
+    use_cache = "--no-cache" not in options
+
+    if args and args[0] == "build":
+        run_build(args[1:], options, use_cache)
+        return
+
+    watch = bool(args) and args[0] == "watch"
+    if watch:
+        args = args[1:]
+
+    if "--help" in options:
+        print_usage()
+        return
+
     # 参数检查
     if len(args) < 2:
         print_usage()
@@ -65,9 +172,16 @@ def main():
         "namespace": namespace,
         "mc_version": mc_version,
         "description": f"Compiled by MCC from {source_path.name}",
-        "overwrite": True  # 覆盖已有输出目录
+        "overwrite": True,  # 覆盖已有输出目录
+        "cache": use_cache,
+        **parse_options(options)
     }
 
+    if watch:
+        from watcher import Watcher
+        Watcher(source_path, target_path, config).run()
+        return
+
     print(f"[MCC] 开始编译...")
     print(f"  源文件: {source_path.absolute()}")
     print(f"  输出到: {Path(target_path).absolute()}")
@@ -77,7 +191,7 @@ def main():
 
     try:
         # 创建编译器并执行
-        writer = DatapackWriter(target_path, config)
+        writer = load_writer()(target_path, config)
         writer.compile_source(source_file)
         writer.write()
 
@@ -17,6 +17,12 @@ class MiscGenerator:
 
     def generate_return(self, stmt: ReturnStmt):
         """生成return语句 - 确保先清理实体标签避免泄漏"""
+        if (self.ctx.early_return and self.ctx.can_exit and self.ctx.current_function and
+                id(stmt) not in self.ctx.tail_returns):
+            # 提前返回：先写入返回值（可能读取局部实体），再清理并结束函数
+            self._generate_return_value(stmt)
+            self._generate_exit()
+            return
 
         # 关键新增：在return前清理当前函数创建的实体标签（只清理局部变量，不清理参数）
         if self.ctx.current_function:
@@ -43,6 +49,23 @@ class MiscGenerator:
                     if var_name in self.ctx.entity_tags:
                         del self.ctx.entity_tags[var_name]
 
+        self._generate_return_value(stmt)
+
+    def _generate_exit(self):
+        """
+        清理局部变量和实体标签后 return 1 结束函数（与函数末尾的清理相同）。
+        执行到函数末尾的路径仍然需要这些清理，实体标签不从跟踪中移除
+        """
+        if not self.ctx.drop_cleanup:
+            for score in self.ctx.local_scores():
+                self._emit(self.builder.set_score(score, "_tmp", 0))
+        for tag_name in self.ctx.entity_tags.values():
+            if tag_name.startswith("__mcc_ent_"):
+                self._emit(f"tag @e[tag={tag_name}] remove {tag_name}")
+        self._emit("return 1")
+        self.ctx.exit_funcs.add(self.ctx.current_mcfunc.name)
+
+    def _generate_return_value(self, stmt: ReturnStmt):
         # ========== 原有return逻辑（完全不变）==========
         if not stmt.expr:
             return
@@ -0,0 +1,93 @@
+"""
+NBT Read CSE - 复用同一函数内重复的实体 NBT 读取
+data get entity 需要把整个实体序列化为 NBT，是开销最大的指令之一；
+表达式生成器每次遇到 p.Health 都会输出一条
+
+    execute store result score T _tmp run data get entity <选择器> Health 100
+
+这里按函数顺序扫描 IR（分支和循环体是单独的函数，一个函数的指令流就是一段直线代码），
+记录每条读取最近一次无条件存入的分数，再次读取时改为复制该分数：
+
+    scoreboard players operation T2 _tmp = T _tmp
+
+记录在以下情况下失效：
+  - 任何可能修改实体或改变世界状态的指令：函数调用、原始指令和宏指令（data modify entity、tag、tp 等）、
+    execute store ... entity
+  - 存放结果的分数被改写
+  - 选择器带 scores= 时任何分数写入（匹配的实体可能改变）
+@r 和 sort=random 每次匹配的实体不同，不参与复用。
+只带 if/unless score 条件的读取可以改为带同样条件的复制，但不会成为新的记录（它可能没有执行）。
+"""
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from command_ir import Command, Execute, RawCmd, ScoreOp
+
+if TYPE_CHECKING:
+    from command_builder import MCFunction
+
+Score = Tuple[str, str]
+
+_CONDITION = r'(?:if|unless) score \S+ \S+ (?:matches \S+|(?:[<>]=?|=) \S+ \S+)'
+_READ_CLAUSES_RE = re.compile(rf'^((?:{_CONDITION} )*)store result score (\S+) (\S+)$')
+_STORE_ENTITY_RE = re.compile(r'\bstore (?:result|success) entity\b')
+_RANDOM_RE = re.compile(r'^@r\b|sort=random')
+
+
+class NbtReadEliminator:
+    """把重复的 data get entity 读取改为复制上一次读取的结果"""
+
+    def __init__(self):
+        self.report: Dict[str, int] = {}  # 函数名 -> 被替换的读取数
+
+    def run(self, functions: Dict[str, 'MCFunction']):
+        for name, func in functions.items():
+            reused = self.optimize(func.commands)
+            if reused:
+                self.report[name] = reused
+
+    def optimize(self, commands: List[Command]) -> int:
+        """原地替换重复读取，返回替换的条数"""
+        available: Dict[str, Score] = {}  # data get 指令文本 -> 存放结果的分数
+        reused = 0
+        for i, cmd in enumerate(commands):
+            read = self._match_read(cmd)
+            if read is not None:
+                condition, score, key = read
+                source = available.get(key)
+                if source is not None:
+                    copy = ScoreOp('=', score[0], score[1], source[0], source[1])
+                    commands[i] = Execute(condition.rstrip(), copy) if condition else copy
+                    reused += 1
+                self._invalidate(available, {score})
+                if not condition:
+                    available[key] = score
+            elif cmd.opaque or (isinstance(cmd, Execute) and _STORE_ENTITY_RE.search(cmd.clauses)):
+                available.clear()
+            else:
+                self._invalidate(available, cmd.score_writes())
+        return reused
+
+    @staticmethod
+    def _match_read(cmd: Command) -> Optional[Tuple[str, Score, str]]:
+        """[if/unless score ...] store result score S run data get entity ... -> (条件, S, 读取指令)"""
+        if not (isinstance(cmd, Execute) and isinstance(cmd.run, RawCmd) and
+                cmd.run.text.startswith('data get entity ')):
+            return None
+        m = _READ_CLAUSES_RE.match(cmd.clauses)
+        if not m or m.group(2).startswith(('@', '*')):
+            return None
+        if _RANDOM_RE.search(cmd.run.text[len('data get entity '):]):
+            return None
+        return m.group(1), (m.group(2), m.group(3)), cmd.run.text
+
+    @staticmethod
+    def _invalidate(available: Dict[str, Score], writes):
+        if not writes:
+            return
+        for key, score in list(available.items()):
+            if score in writes or 'scores=' in key:
+                del available[key]
+
+    def summary(self) -> str:
+        return f"{len(self.report)} 个函数, 复用 {sum(self.report.values())} 次实体 NBT 读取"
@@ -1,4 +1,7 @@
-from ply import yacc
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
 
 from ply import yacc
 from ast_nodes import *
@@ -91,9 +94,19 @@ def p_decorator_tick(p):
     """decorator : DOLLAR IDENT '(' INT ')'"""
     if p[2] == 'tick':
         p[0] = TickAnnot(interval=p[4])
+    elif p[2] == 'unroll':
+        p[0] = UnrollAnnot(limit=p[4])
     else:
         raise SyntaxError(f"Line {p.lineno(2)}: Decorator ${p[2]} does not accept integer argument")
 
+# $inline - 无参数
+def p_decorator_bare(p):
+    """decorator : DOLLAR IDENT"""
+    if p[2] == 'inline':
+        p[0] = InlineAnnot()
+    else:
+        raise SyntaxError(f"Line {p.lineno(2)}: Decorator ${p[2]} requires arguments")
+
 def p_decorator_event(p):
     """decorator : DOLLAR IDENT '(' STRING ',' primary ')'"""
     if p[2] == 'event':
@@ -453,9 +466,85 @@ def p_error(p):
     else:
         print("Syntax error at EOF")
 
+# ==================== 解析器构建与表缓存 ====================
+# LALR 表只需构建一次：进程内复用单例，跨进程通过缓存目录中的 pickle 表复用。
+# 表文件名包含 parser.py / lexer.py 的内容哈希，语法变化后自动重建。
+
+_parser = None
+_GRAMMAR_FILES = ('parser.py', 'lexer.py')
+
+
+def grammar_hash() -> str:
+    """计算语法定义文件的内容哈希"""
+    h = hashlib.sha256()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in _GRAMMAR_FILES:
+        with open(os.path.join(base, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def get_cache_dir() -> Path:
+    """缓存根目录：优先使用环境变量 MCC_CACHE_DIR，默认 ~/.cache/mcc"""
+    env = os.environ.get("MCC_CACHE_DIR")
+    if env:
+        return Path(env)
+    return Path.home() / ".cache" / "mcc"
+
+
+def _table_file() -> Optional[Path]:
+    """返回当前语法对应的表文件路径，缓存目录不可用时返回 None"""
+    cache_dir = get_cache_dir()
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return None
+    return cache_dir / f"parsetab_{grammar_hash()}.pickle"
+
+
+def _build_parser(debug=False):
+    table_file = _table_file()
+    if table_file is None:
+        return yacc.yacc(debug=debug, write_tables=False)
+
+    if table_file.exists():
+        try:
+            return yacc.yacc(debug=debug, write_tables=False, picklefile=str(table_file))
+        except Exception:
+            # 表文件损坏（如被并发写入截断），丢弃后重建
+            pass
+
+    # 先写入进程私有的临时文件再原子替换，避免并发构建时读到半截文件
+    tmp_file = table_file.with_name(f"{table_file.name}.{os.getpid()}.tmp")
+    parser = yacc.yacc(debug=debug, write_tables=False, picklefile=str(tmp_file))
+    try:
+        os.replace(tmp_file, table_file)
+    except OSError:
+        pass
+    return parser
+
+
+def get_parser(debug=False):
+    """获取进程内共享的解析器（首次调用时惰性构建）"""
+    global _parser
+    if _parser is None:
+        _parser = _build_parser(debug)
+    return _parser
+
+
+def reset_parser(remove_tables: bool = False):
+    """丢弃进程内的解析器单例；remove_tables=True 时同时删除磁盘上的表缓存"""
+    global _parser
+    _parser = None
+    if remove_tables:
+        table_file = _table_file()
+        if table_file is not None and table_file.exists():
+            table_file.unlink()
+
+
 def parse(data, debug=False):
-    parser = yacc.yacc(debug=debug, write_tables=False)
-    return parser.parse(data, lexer=lexer)
+    lexer.lineno = 1
+    return get_parser(debug).parse(data, lexer=lexer)
 
 # ==================== Import 系统 ====================
 
@@ -0,0 +1,191 @@
+"""
+Peephole Optimizer - 在 IR 指令流上做局部化简
+代码生成按语句逐条输出指令，常见冗余有：
+  - operation t = x 之后紧接着 operation y = t，而 t 之后再也不读取
+  - set x 0 之后还没读取就被覆盖
+  - 连续两次 data modify 同一个 storage 路径
+这里在每个 MCFunction 上反复应用一组规则直到不再变化，并统计每个函数减少的指令数。
+
+规则是普通函数 rule(commands, i, local) -> Optional[Dict[int, Optional[Command]]]：
+检查从第 i 条开始的指令，可以化简时返回 {下标: 新指令}，新指令为 None 表示删除。
+local 是值不会跨函数传递的临时变量（见 temp_allocator.local_temps）。
+"""
+import re
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
+
+from command_ir import Command, Execute, ScoreOp, ScoreSet, StorageCopy, StorageSet, lift, score_kills
+from temp_allocator import TEMP_OBJECTIVE, local_temps
+
+if TYPE_CHECKING:
+    from command_builder import MCFunction
+
+Score = Tuple[str, str]
+Edit = Dict[int, Optional[Command]]
+Rule = Callable[[List[Command], int, Set[str]], Optional[Edit]]
+
+
+def _is_local(score: Score, local: Set[str]) -> bool:
+    return score[1] == TEMP_OBJECTIVE and score[0] in local
+
+
+def _is_fixed_holder(name: str) -> bool:
+    """选择器 (@s、@a[...]) 和 * 的含义取决于执行上下文，不参与改写"""
+    return not name.startswith(('@', '*'))
+
+
+def _dead_after(commands: List[Command], i: int, score: Score, local: Set[str]) -> bool:
+    """第 i 条指令之后 score 的当前值是否不会再被读取"""
+    if not _is_fixed_holder(score[0]):
+        return False
+    is_local = _is_local(score, local)
+    for cmd in commands[i + 1:]:
+        if score in cmd.score_reads():
+            return False
+        if score in score_kills(cmd):
+            return True
+        if cmd.opaque and not is_local:
+            return False
+    # 局部临时变量在函数结束后不再有意义；其他分数可能在别处读取
+    return is_local
+
+
+# ========== 规则 ==========
+
+def remove_self_copy(commands: List[Command], i: int, local: Set[str]) -> Optional[Edit]:
+    """operation x = x（临时变量合并槽位后常见）"""
+    cmd = commands[i]
+    if isinstance(cmd, Execute) and 'store ' not in cmd.clauses:
+        cmd = cmd.run
+    if isinstance(cmd, ScoreOp) and cmd.is_copy and (cmd.target, cmd.target_obj) == (cmd.source, cmd.source_obj):
+        return {i: None}
+    return None
+
+
+def remove_dead_store(commands: List[Command], i: int, local: Set[str]) -> Optional[Edit]:
+    """set/operation = 写入的值在被读取之前就被覆盖（或临时变量之后不再读取）"""
+    cmd = commands[i]
+    if isinstance(cmd, (ScoreSet, ScoreOp)) and score_kills(cmd):
+        (score,) = score_kills(cmd)
+        if _dead_after(commands, i, score, local):
+            return {i: None}
+    return None
+
+
+def _replace_temp(cmd: Command, temp: str, source: Score) -> Optional[Command]:
+    """把只读取临时变量 temp 的指令改为读取 source"""
+    pattern = re.compile(rf'(?<!\S){re.escape(temp)} {TEMP_OBJECTIVE}(?!\S)')
+    text = pattern.sub(lambda _: f"{source[0]} {source[1]}", str(cmd))
+    return lift(text)
+
+
+def _store_constant(cmd: Command, temp: Score, value: int) -> Optional[Command]:
+    """operation y = t（t 为常量）改为 set y 常量"""
+    run = cmd.run if isinstance(cmd, Execute) and temp not in cmd.condition_reads() else cmd
+    if not (isinstance(run, ScoreOp) and run.is_copy and (run.source, run.source_obj) == temp):
+        return None
+    store = ScoreSet(run.target, run.target_obj, value)
+    return Execute(cmd.clauses, store) if isinstance(cmd, Execute) else store
+
+
+def forward_copy(commands: List[Command], i: int, local: Set[str]) -> Optional[Edit]:
+    """
+    t = x（或 set t N）之后 t 的读取直接改为读取 x（或常量），然后删除 t 的赋值。
+    只处理局部临时变量 t，并且在最后一次改写之前 x 不能被修改。
+    """
+    cmd = commands[i]
+    if isinstance(cmd, ScoreOp) and cmd.is_copy:
+        temp, source = (cmd.target, cmd.target_obj), (cmd.source, cmd.source_obj)
+        if temp == source or not _is_fixed_holder(source[0]):
+            return None
+        value = None
+    elif isinstance(cmd, ScoreSet):
+        temp, source, value = (cmd.target, cmd.objective), None, cmd.value
+    else:
+        return None
+    if not _is_local(temp, local):
+        return None
+
+    edit: Edit = {}
+    for k in range(i + 1, len(commands)):
+        c = commands[k]
+        if temp in c.score_reads():
+            if temp in c.score_writes():
+                return None
+            new = _store_constant(c, temp, value) if source is None else _replace_temp(c, temp[0], source)
+            if new is None:
+                return None
+            edit[k] = new
+        elif temp in score_kills(c):
+            break
+        elif temp in c.score_writes():
+            # 条件写入：之后读到的可能是任意一个值
+            return None
+        if source is not None and (source in c.score_writes() or c.opaque):
+            # x 可能改变：之后不能再读取 t
+            if not _dead_after(commands, k, temp, local):
+                return None
+            break
+    if not edit:
+        return None
+    edit[i] = None
+    return edit
+
+
+def remove_overwritten_storage(commands: List[Command], i: int, local: Set[str]) -> Optional[Edit]:
+    """连续两次 data modify 同一个路径，前一次的值没有被读取"""
+    if i + 1 >= len(commands):
+        return None
+    first, second = commands[i], commands[i + 1]
+    if not (isinstance(first, (StorageSet, StorageCopy)) and isinstance(second, (StorageSet, StorageCopy))):
+        return None
+    if (first.storage, first.path) != (second.storage, second.path):
+        return None
+    if isinstance(second, StorageCopy) and second.source_storage == first.storage and (
+            second.source_path.startswith(first.path) or first.path.startswith(second.source_path)):
+        return None
+    return {i: None}
+
+
+DEFAULT_RULES: List[Rule] = [remove_self_copy, forward_copy, remove_dead_store, remove_overwritten_storage]
+
+
+class PeepholeOptimizer:
+    """按函数应用窥孔规则直到不动点"""
+
+    def __init__(self, rules: Optional[List[Rule]] = None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.report: Dict[str, Tuple[int, int]] = {}  # 函数名 -> (优化前指令数, 优化后指令数)
+
+    def run(self, functions: Dict[str, 'MCFunction']):
+        local = local_temps(functions)
+        for name, func in functions.items():
+            before = len(func.commands)
+            func.commands = self.optimize(func.commands, local)
+            if len(func.commands) != before:
+                self.report[name] = (before, len(func.commands))
+
+    def optimize(self, commands: List[Command], local: Set[str]) -> List[Command]:
+        commands = list(commands)
+        i = 0
+        while i < len(commands):
+            for rule in self.rules:
+                edit = rule(commands, i, local)
+                if edit:
+                    commands = [edit.get(k, cmd) for k, cmd in enumerate(commands)]
+                    commands = [cmd for cmd in commands if cmd is not None]
+                    # 删除可能让前面的指令形成新的模式
+                    i = max(0, min(edit) - 1)
+                    break
+            else:
+                i += 1
+        return commands
+
+    def summary(self) -> str:
+        before = sum(b for b, _ in self.report.values())
+        after = sum(a for _, a in self.report.values())
+        return f"{len(self.report)} 个函数, 减少 {before - after} 条指令"
+
+    def details(self) -> List[str]:
+        """每个函数的指令数变化，按减少数量排序"""
+        rows = sorted(self.report.items(), key=lambda kv: (kv[1][1] - kv[1][0], kv[0]))
+        return [f"{name}: {b} -> {a} (-{b - a})" for name, (b, a) in rows]
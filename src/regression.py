@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MCC 回归检查：用 mcc.py 编译小程序，检查生成的指令（按引用传参的初始化、增量编译的输出）
+用法: python3 regression.py [检查项 ...]   (不带参数时运行全部，有失败时返回非零)
+
+检查项:
+    array_param    数组按引用传参：调用者的数组长度在传参前设置（被调函数通过 $(arr)_len 读取）
+    array_literal  数组字面量作为参数：元素和长度写入临时 storage 后再传递
+    struct_param   结构体按引用传参：被调函数通过 $(p)_lvl 读写的字段在调用前初始化
+    foreach_write  修改数组参数的 for-each：按下标读取原数组，调用者的数组长度在传参前设置
+    inline_if      内联的多条 if 分支指令改写条件读取的变量时，先把条件存入临时变量（--inline-if=8）
+    incremental_constants  在其他函数中给全局变量赋值、声明同名变量后，增量编译与全量编译的输出一致
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _compile(source: str, *flags: str) -> dict:
+    """编译源码（不使用增量缓存），返回 {函数名: 指令文本}"""
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "reg.mcc")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source)
+        return _build(path, os.path.join(root, "out"), "--no-cache", *flags)
+
+
+def _build(path: str, out: str, *flags: str, cache_dir: str = None) -> dict:
+    """编译 path 到 out，cache_dir 指定增量编译状态目录（MCC_CACHE_DIR）"""
+    env = dict(os.environ, MCC_CACHE_DIR=cache_dir) if cache_dir else None
+    proc = subprocess.run([sys.executable, "-W", "ignore", os.path.join(SRC_DIR, "mcc.py"), path, out, *flags],
+                          capture_output=True, text=True, cwd=SRC_DIR, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stdout + proc.stderr)
+    ns = os.path.splitext(os.path.basename(path))[0]
+    files = {}
+    for folder in ("function", "functions"):
+        d = os.path.join(out, "data", ns, folder)
+        if os.path.isdir(d):
+            for name in sorted(os.listdir(d)):
+                with open(os.path.join(d, name), encoding="utf-8") as f:
+                    files[name[:-len(".mcfunction")]] = f.read()
+    return files
+
+
+def _expect(files: dict, func: str, pattern: str, what: str) -> list:
+    """files[func] 中应有匹配 pattern 的行"""
+    if re.search(pattern, files.get(func, ""), re.M):
+        return []
+    return [f"{func}: {what}"]
+
+
+_ARRAY_PARAM_SOURCE = """
+let out = 0
+
+fn sum(arr: int[]) -> int {
+    let total = 0
+    for num in arr {
+        total = total + num
+    }
+    return total
+}
+
+fn main() {
+    let xs = [1, 2, 3, 4]
+    out = sum(xs)
+}
+"""
+
+
+def check_array_param() -> list:
+    files = _compile(_ARRAY_PARAM_SOURCE)
+    return _expect(files, "fn_main", r"^scoreboard players set main_\w*xs_len _tmp 4$", "缺少数组长度 xs_len 的初始化")
+
+
+_ARRAY_LITERAL_SOURCE = """
+let out = 0
+
+fn sum(arr: int[]) -> int {
+    let total = 0
+    for num in arr {
+        total = total + num
+    }
+    return total
+}
+
+fn main() {
+    out = sum([1, 2, 3, 4])
+}
+"""
+
+
+def check_array_literal() -> list:
+    files = _compile(_ARRAY_LITERAL_SOURCE)
+    return (_expect(files, "fn_main", r"^data modify storage reg:data __arr_arg_\w+ set value \[0, 0, 0, 0\]$",
+                    "数组字面量参数没有写入 storage") +
+            _expect(files, "fn_main", r"^scoreboard players set __arr_arg_\w+_len _tmp 4$",
+                    "数组字面量参数缺少长度"))
+
+
+_STRUCT_PARAM_SOURCE = """
+struct P {
+    hp: int,
+    lvl: int
+}
+
+let out = 0
+
+fn lvlup(p: P, n: int) {
+    p.lvl = p.lvl + n
+}
+
+fn level(p: P) -> int {
+    return p.lvl
+}
+
+fn main() {
+    let pl: P = {hp: 5, lvl: 1}
+    lvlup(pl, 3)
+    out = level(pl)
+}
+"""
+
+
+def check_struct_param() -> list:
+    files = _compile(_STRUCT_PARAM_SOURCE)
+    return _expect(files, "fn_main", r"^scoreboard players set main_\w*pl_lvl _tmp 1$", "缺少字段 pl.lvl 的初始化")
+
+
+_FOREACH_WRITE_SOURCE = """
+let out = 0
+
+fn scale(arr: int[]) {
+    let i = 0
+    for x in arr {
+        arr[i] = x * 10
+        i = i + 1
+    }
+}
+
+fn main() {
+    let xs = [1, 2, 3, 4]
+    scale(xs)
+    let acc = 0
+    for y in xs {
+        acc = acc + y
+    }
+    out = acc
+}
+"""
+
+
+def check_foreach_write() -> list:
+    files = _compile(_FOREACH_WRITE_SOURCE)
+    body = next((name for name in files if name.startswith("scale_foreach_")), "scale_foreach")
+    return (_expect(files, "fn_main", r"^scoreboard players set main_\w*xs_len _tmp 4$", "缺少数组长度 xs_len 的初始化") +
+            _expect(files, body, r"^function reg:__array_get with storage reg:data __args$",
+                    "修改数组的循环没有按下标读取原数组") +
+            _expect(files, body, r"^\$execute if score _idx_\d+ _tmp < \$\(arr\)_len _tmp run ",
+                    "循环边界没有读取调用者的数组长度"))
+
+
+_INLINE_IF_SOURCE = """
+let out = 0
+
+fn main() {
+    let x = 3
+    let y = 0
+    if x > 0 {
+        x = 0
+        y = 5
+    }
+    out = y
+}
+"""
+
+
+def check_inline_if() -> list:
+    files = _compile(_INLINE_IF_SOURCE, "--inline-if=8", "--no-fold")
+    return (_expect(files, "fn_main", r"^execute if score main_\w*x _tmp matches 1\.\. run scoreboard players set _t\d+ _tmp 1$",
+                    "分支改写了条件读取的 x，条件没有先存入临时变量") +
+            _expect(files, "fn_main", r"^execute if score _t\d+ _tmp matches 1\.\. run scoreboard players set main_\w*y _tmp 5$",
+                    "y 的赋值没有按存下的条件判断"))
+
+
+_CONSTANTS_SOURCE = """
+let g = 5
+let out = 0
+
+$tick(20)
+fn a() {
+    let k = 1
+}
+
+$tick(20)
+fn b() {
+    let y = g * 2
+    let x = 4
+    out = y + x
+}
+"""
+
+# 只修改 a()：g 不再是常量，x 声明了两次，b() 中的读取都不能再替换为字面量
+_CONSTANTS_EDITS = (
+    ("    let k = 1\n", "    let k = 1\n    g = 3\n"),
+    ("    let k = 1\n", "    let k = 1\n    let x = 7\n"),
+)
+
+
+def check_incremental_constants() -> list:
+    errors = []
+    for old, new in _CONSTANTS_EDITS:
+        with tempfile.TemporaryDirectory() as root:
+            cache_dir = os.path.join(root, "cache")
+            path = os.path.join(root, "reg.mcc")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(_CONSTANTS_SOURCE)
+            _build(path, os.path.join(root, "inc"), cache_dir=cache_dir)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(_CONSTANTS_SOURCE.replace(old, new))
+            incremental = _build(path, os.path.join(root, "inc"), cache_dir=cache_dir)
+            full = _build(path, os.path.join(root, "full"), "--no-cache")
+        for name in sorted(set(incremental) | set(full)):
+            if incremental.get(name) != full.get(name):
+                errors.append(f"{name}: 增量编译复用了过期的输出（修改: {new.strip()!r}）")
+    return errors
+
+
+REGRESSIONS = {
+    "array_param": check_array_param,
+    "array_literal": check_array_literal,
+    "struct_param": check_struct_param,
+    "foreach_write": check_foreach_write,
+    "inline_if": check_inline_if,
+    "incremental_constants": check_incremental_constants,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(REGRESSIONS)
+    unknown = [n for n in names if n not in REGRESSIONS]
+    if unknown:
+        print(__doc__)
+        sys.exit(1)
+    failed = 0
+    for name in names:
+        errors = REGRESSIONS[name]()
+        print(f"  {'✗' if errors else '✓'} {name}")
+        for error in errors:
+            print(f"      {error}")
+        failed += bool(errors)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -35,7 +35,7 @@ class StmtGenerator:
         self.ctx.current_mcfunc = mcfunc
 
         if isinstance(stmt, LetStmt):
-            var_type = getattr(stmt, '_type', TypeDesc('unknown'))
+            var_type = getattr(stmt, '_type', None) or TypeDesc('unknown')
             self.var_gen.generate_let(stmt, var_type)
 
         elif isinstance(stmt, AssignStmt):
@@ -0,0 +1,191 @@
+"""
+Temp Allocator - 计分板临时变量的寄存器分配
+CommandBuilder.get_temp_var 每次都分配新的 _t{n}，它们作为假玩家永久留在 _tmp 计分项中。
+代码生成结束后，这里在 IR 上按函数做活跃区间分析，把互不重叠的临时变量合并到一个小的槽位池中。
+
+只有满足以下条件的临时变量才会进入槽位池，其余保持原名（固定）：
+  - 只出现在一个 mcfunction 中，且只以类型化的计分板读写出现（不在宏、原始指令、storage 值中）
+  - 在函数内第一次出现是无条件写入（值不依赖调用者或上一次执行）
+  - 活跃区间内没有函数调用等不透明指令（被调函数可能使用同一个槽位）
+"""
+import re
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
+
+from command_ir import Command, Execute, ScoreOp, ScoreSet, lift
+
+if TYPE_CHECKING:
+    from command_builder import MCFunction
+
+TEMP_OBJECTIVE = "_tmp"
+_TEMP_RE = re.compile(r'\b_t\d+\b')
+
+
+def _text_temps(cmd: Command) -> Set[str]:
+    return set(_TEMP_RE.findall(str(cmd)))
+
+
+def _typed_temps(scores: Set[Tuple[str, str]]) -> Set[str]:
+    return {name for name, obj in scores if obj == TEMP_OBJECTIVE and _TEMP_RE.fullmatch(name)}
+
+
+def _unconditional_defs(cmd: Command) -> Set[str]:
+    """指令无条件写入（且写入前不读取）的临时变量"""
+    if isinstance(cmd, ScoreSet) or (isinstance(cmd, ScoreOp) and cmd.is_copy):
+        return _typed_temps(cmd.score_writes()) - _typed_temps(cmd.score_reads())
+    if isinstance(cmd, Execute) and cmd.clauses.startswith('store '):
+        # store 子命令在最前面时一定会写入（失败时写入 0）
+        return _typed_temps(cmd.store_targets())
+    return set()
+
+
+def _live_after(commands: List[Command], i: int, temp: str) -> bool:
+    """第 i 条指令之后，temp 的当前值是否还会被读取"""
+    for cmd in commands[i + 1:]:
+        if temp in _typed_temps(cmd.score_reads()):
+            return True
+        if temp in _unconditional_defs(cmd):
+            return False
+    return False
+
+
+def local_temps(functions: Dict[str, 'MCFunction']) -> Set[str]:
+    """
+    值不会跨函数传递的临时变量：只以类型化的计分板读写出现，在每个用到它的函数中
+    首次出现都是无条件写入，并且在任何不透明指令（函数调用等）前后都不是活跃的。
+    这样的临时变量在某条指令之后是否还会被读取，只需看当前函数内后续的指令。
+    """
+    temps: Set[str] = set()
+    untyped: Set[str] = set()
+    for func in functions.values():
+        for cmd in func.commands:
+            text = _text_temps(cmd)
+            temps |= text
+            untyped |= text - _typed_temps(cmd.score_reads() | cmd.score_writes())
+
+    local = temps - untyped
+    for func in functions.values():
+        seen: Set[str] = set()
+        for i, cmd in enumerate(func.commands):
+            typed = _typed_temps(cmd.score_reads() | cmd.score_writes())
+            local -= typed - seen - _unconditional_defs(cmd)
+            seen |= typed
+            if cmd.opaque:
+                # store 写入发生在 run 执行完之后，被它覆盖的值不受被调函数影响
+                crossing = seen & local - _unconditional_defs(cmd)
+                local -= {t for t in crossing if _live_after(func.commands, i, t)}
+    return local
+
+
+class TempAllocator:
+    """基于活跃区间的临时变量槽位分配"""
+
+    def __init__(self, reset_at_exit: bool = False):
+        self.reset_at_exit = reset_at_exit
+        self.before = 0
+        self.after = 0
+
+    def run(self, functions: Dict[str, 'MCFunction']):
+        occurrences: Dict[str, Set[str]] = {}  # 临时变量 -> 出现的函数
+        pinned: Set[str] = set()
+        for fname, func in functions.items():
+            for cmd in func.commands:
+                text = _text_temps(cmd)
+                for t in text:
+                    occurrences.setdefault(t, set()).add(fname)
+                typed = _typed_temps(cmd.score_reads() | cmd.score_writes())
+                pinned |= text - typed
+
+        pinned |= {t for t, fnames in occurrences.items() if len(fnames) > 1}
+
+        # 每个函数独立着色，槽位在所有函数间共享
+        assignments: Dict[str, Dict[str, int]] = {}
+        for fname, func in functions.items():
+            intervals = self._intervals(func.commands, pinned)
+            assignments[fname] = self._color(intervals)
+
+        # 没有进入槽位池的临时变量（包括区间内有不透明指令的）保持原名，槽位不能与之重名
+        allocated = {t for a in assignments.values() for t in a}
+        fixed = set(occurrences) - allocated
+        slots = max((max(a.values()) + 1 for a in assignments.values() if a), default=0)
+        slot_names = self._slot_names(slots, fixed)
+
+        for fname, func in functions.items():
+            mapping = {t: slot_names[slot] for t, slot in assignments[fname].items()}
+            if mapping:
+                func.commands = [self._rename(cmd, mapping) for cmd in func.commands]
+                if self.reset_at_exit:
+                    for name in sorted(set(mapping.values()), key=lambda n: int(n[2:])):
+                        func.commands.append(lift(f"scoreboard players reset {name} {TEMP_OBJECTIVE}"))
+
+        self.before = len(occurrences)
+        self.after = len(fixed) + slots
+
+    def _intervals(self, commands: List[Command], pinned: Set[str]) -> Dict[str, Tuple[int, int]]:
+        """计算函数内可分配临时变量的活跃区间 [首次出现, 最后出现]"""
+        first: Dict[str, int] = {}
+        last: Dict[str, int] = {}
+        exposed: Set[str] = set()
+        opaque_at: List[int] = []
+
+        for i, cmd in enumerate(commands):
+            if cmd.opaque:
+                opaque_at.append(i)
+            temps = _typed_temps(cmd.score_reads() | cmd.score_writes()) - pinned
+            defs = _unconditional_defs(cmd)
+            for t in temps:
+                if t not in first:
+                    first[t] = i
+                    if t not in defs:
+                        exposed.add(t)
+                last[t] = i
+
+        intervals = {}
+        for t, start in first.items():
+            end = last[t]
+            if t in exposed or any(start < i < end for i in opaque_at):
+                continue
+            intervals[t] = (start, end)
+        return intervals
+
+    @staticmethod
+    def _color(intervals: Dict[str, Tuple[int, int]]) -> Dict[str, int]:
+        """线性扫描：区间按起点排序，复用已结束区间的最小槽位"""
+        assignment: Dict[str, int] = {}
+        active: List[Tuple[int, int, int]] = []  # (起点, 结束位置, 槽位)
+        free: List[int] = []
+        next_slot = 0
+        for t, (start, end) in sorted(intervals.items(), key=lambda kv: (kv[1][0], int(kv[0][2:]))):
+            # 区间在同一条指令处首尾相接时可以复用（该指令先读取旧值再写入新值），
+            # 但在同一条指令处写入的两个临时变量不能共用槽位
+            for item in [a for a in active if a[1] < start or (a[1] == start and a[0] < start)]:
+                active.remove(item)
+                free.append(item[2])
+            if free:
+                free.sort()
+                slot = free.pop(0)
+            else:
+                slot = next_slot
+                next_slot += 1
+            assignment[t] = slot
+            active.append((start, end, slot))
+        return assignment
+
+    @staticmethod
+    def _slot_names(slots: int, fixed: Set[str]) -> List[str]:
+        names = []
+        n = 0
+        while len(names) < slots:
+            name = f"_t{n}"
+            if name not in fixed:
+                names.append(name)
+            n += 1
+        return names
+
+    @staticmethod
+    def _rename(cmd: Command, mapping: Dict[str, str]) -> Command:
+        text = str(cmd)
+        renamed = _TEMP_RE.sub(lambda m: mapping.get(m.group(0), m.group(0)), text)
+        return cmd if renamed == text else lift(renamed)
+
+    def summary(self) -> str:
+        return f"{self.before} -> {self.after} 个"
@@ -0,0 +1,97 @@
+"""
+Tree Shaker - 移除合并后程序中不可达的函数和结构体
+导入模块会把全部声明合并进 Program，这里从根出发做可达性分析，
+只保留真正会被调用到的函数和用到的结构体。
+
+根：
+  - 全局语句（生成到 main 函数中）以及名为 main 的函数
+  - 带注解的函数（$tick / $tag / $event / $loot / $predicate；$inline、$unroll 不算）
+  - 静态标签 $tag function("...") { ... } 中列出的函数
+  - cmd 字符串中以 function ns:fn_xxx 形式引用的函数
+"""
+import re
+from typing import Dict, List, Set
+
+from ast_nodes import (Program, FuncDecl, StructDecl, StaticTagDecl, CmdStmt, StringLiteral,
+                       Ident, TypeNode, StructLiteral, InlineAnnot, UnrollAnnot, iter_nodes)
+
+# cmd 中的函数调用：function [命名空间:]路径
+_FUNCTION_REF_RE = re.compile(r'\bfunction\s+(?:[\w.-]+:)?([\w./-]+)')
+
+
+def _function_name(path: str) -> str:
+    """把 mcfunction 路径还原为源码中的函数名（去掉 fn_ 前缀）"""
+    return path[3:] if path.startswith('fn_') else path
+
+
+class TreeShaker:
+    """基于可达性分析的死代码删除"""
+
+    def __init__(self):
+        self.removed_functions: List[str] = []
+        self.removed_structs: List[str] = []
+
+    def shake(self, program: Program) -> Program:
+        funcs: Dict[str, FuncDecl] = {s.name: s for s in program.stmts if isinstance(s, FuncDecl)}
+        structs: Dict[str, StructDecl] = {s.name: s for s in program.stmts if isinstance(s, StructDecl)}
+
+        roots = [s for s in program.stmts if not isinstance(s, (FuncDecl, StructDecl))]
+        roots += [f for f in funcs.values()
+                  if any(not isinstance(a, (InlineAnnot, UnrollAnnot)) for a in f.annotations) or f.name == 'main']
+
+        live_funcs: Set[str] = {f.name for f in roots if isinstance(f, FuncDecl)}
+        live_structs: Set[str] = set()
+        pending = list(roots)
+
+        while pending:
+            node = pending.pop()
+            for name in self._references(node):
+                if name in funcs and name not in live_funcs:
+                    live_funcs.add(name)
+                    pending.append(funcs[name])
+                elif name in structs and name not in live_structs:
+                    live_structs.add(name)
+                    pending.append(structs[name])
+
+        kept = []
+        for stmt in program.stmts:
+            if isinstance(stmt, FuncDecl) and stmt.name not in live_funcs:
+                self.removed_functions.append(stmt.name)
+            elif isinstance(stmt, StructDecl) and stmt.name not in live_structs:
+                self.removed_structs.append(stmt.name)
+            else:
+                kept.append(stmt)
+        return Program(kept)
+
+    @staticmethod
+    def _references(node) -> Set[str]:
+        """收集节点引用到的函数名和结构体名"""
+        names = set()
+        for n in iter_nodes(node):
+            if isinstance(n, Ident):
+                names.add(n.name)
+            elif isinstance(n, TypeNode):
+                names.add(n.base)
+            elif isinstance(n, StructLiteral):
+                names.add(n.struct_name)
+            elif isinstance(n, StaticTagDecl):
+                if n.tag_type == 'function':
+                    names.update(_function_name(e.split(':', 1)[-1]) for e in n.entries if isinstance(e, str))
+            elif isinstance(n, (CmdStmt, StringLiteral)):
+                text = n.text if isinstance(n, CmdStmt) else n.value
+                if isinstance(text, str):
+                    names.update(_function_name(m) for m in _FUNCTION_REF_RE.findall(text))
+        return names
+
+    def summary(self) -> str:
+        parts = []
+        if self.removed_functions:
+            parts.append(f"函数 {', '.join(self.removed_functions)}")
+        if self.removed_structs:
+            parts.append(f"结构体 {', '.join(self.removed_structs)}")
+        return "; ".join(parts) if parts else "无"
+
+
+def shake_program(program: Program) -> Program:
+    """便捷函数：移除不可达的声明"""
+    return TreeShaker().shake(program)
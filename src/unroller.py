@@ -0,0 +1,129 @@
+"""
+Loop Unroller - 展开迭代次数为常量的小范围循环
+for i in 0..8 需要一个循环体函数、一个计数分数和每次迭代的边界检查与函数调用，
+粒子、射线这类循环体只有一两条指令的循环中，循环本身的开销比循环体还大。
+
+起止值都是整数字面量（常量折叠之后）、展开后的语句数不超过预算的范围循环，
+直接在所在代码块中按顺序生成每次迭代的循环体副本（复制 AST）：
+  - 循环体中对循环变量的读取替换为当次迭代的字面量，cmd 文本中的 {i} 直接替换为数值
+  - 设置了常量折叠时，每个副本替换后立即折叠，条件为常量的 if 只保留执行的分支
+  - 由内向外展开，外层循环按内层展开后的语句数计算预算
+以下循环不展开：
+  - 循环体给循环变量赋值或重新声明循环变量、包含 return（展开后改变返回的位置），
+    或 say 指令插值循环变量（插值会改为 tellraw）
+  - 循环体声明的变量在循环外也出现（展开后与循环外的同名变量共用同一个代码块）
+预算为展开后的语句数（嵌套块中的语句也计数），函数上的 $unroll(N) 覆盖全局设置，0 表示不展开。
+"""
+import copy
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from ast_nodes import (FuncDecl, LetStmt, AssignStmt, ForStmt, WhileStmt, IfStmt, ReturnStmt, CmdStmt,
+                       Ident, IntLiteral, IndexExpr, FieldAccess, UnrollAnnot, iter_nodes)
+from inliner import prune, stmt_count, substitute
+from my_types import INT
+
+_SAY_RE = re.compile(r'^"?/?say ')
+_INTERPOLATION_RE = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+
+class LoopUnroller:
+    """在生成函数体之前展开常量次数的小范围循环"""
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size  # 展开后的语句数上限，0 表示只展开标注了 $unroll(N) 的函数
+        self.folder = None  # 设置后折叠每个展开的副本（CodeGenerator 传入自身的 ConstantFolder）
+        self.report: Dict[str, int] = {}  # 函数名 -> 展开的循环数
+        self._func: Optional[FuncDecl] = None  # 正在处理的函数
+        self._limit = 0
+
+    def unroll_function(self, func: FuncDecl):
+        limit = self.max_size
+        for ann in func.annotations:
+            if isinstance(ann, UnrollAnnot):
+                limit = ann.limit
+        if limit <= 0:
+            return
+        self._func = func
+        self._limit = limit
+        func.body = self._unroll_block(func.body)
+
+    def _unroll_block(self, block: List[Any]) -> List[Any]:
+        result = []
+        for s in block:
+            if isinstance(s, IfStmt):
+                s.then_block = self._unroll_block(s.then_block)
+                if s.else_block:
+                    s.else_block = self._unroll_block(s.else_block)
+            elif isinstance(s, (WhileStmt, ForStmt)):
+                s.block = self._unroll_block(s.block)
+                if isinstance(s, ForStmt) and self._can_unroll(s):
+                    result.extend(self._expand(s))
+                    continue
+            result.append(s)
+        return result
+
+    def _can_unroll(self, loop: ForStmt) -> bool:
+        if not (loop.is_range and isinstance(loop.iterable, IntLiteral) and isinstance(loop.range_end, IntLiteral)):
+            return False
+        trips = max(loop.range_end.value - loop.iterable.value, 0)
+        if trips * stmt_count(loop.block) > self._limit:
+            return False
+
+        declared = Counter()
+        for node in iter_nodes(loop.block):
+            if isinstance(node, ReturnStmt):
+                return False
+            if isinstance(node, ForStmt) and node.var == loop.var:
+                return False
+            if isinstance(node, AssignStmt):
+                root = node.target
+                while isinstance(root, (IndexExpr, FieldAccess)):
+                    root = root.base
+                if isinstance(root, Ident) and root.name == loop.var:
+                    return False
+            elif isinstance(node, CmdStmt) and _SAY_RE.match(node.text) and f"{{{loop.var}}}" in node.text:
+                return False
+            elif isinstance(node, LetStmt):
+                if node.name == loop.var:
+                    return False
+                declared[node.name] += 1
+        if not declared:
+            return True
+        # 循环体中的变量在函数其他位置也出现时，展开后会与之共用代码块
+        inside = _names(loop.block)
+        outside = _names(self._func.body) - inside
+        return not any(outside[name] for name in declared) and not any(
+            name in declared for name, _ in self._func.params)
+
+    def _expand(self, loop: ForStmt) -> List[Any]:
+        body = []
+        for value in range(loop.iterable.value, loop.range_end.value):
+            literal = IntLiteral(value)
+            literal._type = INT  # 与读取 int 循环变量一样，存入 float 目标时 ×100
+            block = substitute(copy.deepcopy(loop.block), {loop.var: literal})
+            for node in iter_nodes(block):
+                if isinstance(node, CmdStmt):
+                    node.text = node.text.replace(f"{{{loop.var}}}", str(value))
+            if self.folder:
+                copied = FuncDecl(self._func.name, self._func.params, self._func.ret_type, block)
+                self.folder.fold_function(copied)
+                block = prune(copied.body)
+            body.extend(block)
+        self.report[self._func.name] = self.report.get(self._func.name, 0) + 1
+        return body
+
+    def summary(self) -> str:
+        return f"{len(self.report)} 个函数, 展开 {sum(self.report.values())} 个循环"
+
+
+def _names(node: Any) -> Counter:
+    """变量名（读取、声明和 cmd 插值）出现的次数"""
+    names = Counter()
+    for n in iter_nodes(node):
+        if isinstance(n, (Ident, LetStmt)):
+            names[n.name] += 1
+        elif isinstance(n, CmdStmt):
+            names.update(_INTERPOLATION_RE.findall(n.text))
+    return names
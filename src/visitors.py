@@ -1,4 +1,5 @@
 import io
+from dataclasses import fields
 
 # 从 ast_nodes 导入所有节点类型
 from ast_nodes import *
@@ -116,9 +117,11 @@ class ASTPrinter:
         self._write("\n")
 
         # 写字段
-        for field_name, value in node.__dict__.items():
+        for f in fields(node):
+            field_name = f.name
             if field_name.startswith('_'):
                 continue
+            value = getattr(node, field_name)
 
             self._indent(depth + 1)
             self._write(self._color(field_name, 'field'))
@@ -184,14 +187,14 @@ class ASTPrinter:
         """尝试推断函数返回类型"""
         # 简化处理：查找return语句
         for stmt in node.body:
-            if hasattr(stmt, 'expr') and hasattr(stmt, '_type'):
+            if hasattr(stmt, 'expr') and getattr(stmt, '_type', None) is not None:
                 return str(stmt._type)
         return ""
 
     def _visit_LetStmt(self, node: LetStmt, depth: int):
         self._indent(depth)
         type_ann = ""
-        if self.show_types and hasattr(node, '_type'):
+        if self.show_types and getattr(node, '_type', None) is not None:
             type_ann = self._color(f"/* {node._type} */ ", 'type')
 
         self._write(f"{type_ann}let {node.name}")
@@ -259,6 +262,12 @@ class ASTPrinter:
         def _visit_LootAnnot(self, node: LootAnnot, depth: int):
             self._write(f"$loot(\"{node.path}\")")
 
+        def _visit_InlineAnnot(self, node: InlineAnnot, depth: int):
+            self._write("$inline")
+
+        def _visit_UnrollAnnot(self, node: UnrollAnnot, depth: int):
+            self._write(f"$unroll({node.limit})")
+
         def _visit_StaticTagDecl(self, node: StaticTagDecl, depth: int):
             self._indent(depth)
             self._write(f"$tag {node.tag_type}(\"{node.path}\") ")
@@ -0,0 +1,101 @@
+"""
+Watch Mode - 常驻进程的增量编译
+轮询源文件及其传递导入的模块，发生变化时在同一进程内重新编译：
+  - 解析器表、AST 缓存、上一次的增量编译状态都保留在内存中
+  - 只重写内容变化的输出文件，删除不再生成的文件
+"""
+import contextlib
+import io
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from ast_cache import ASTCache
+from write_datapack import DatapackWriter
+
+# 轮询间隔（秒）
+POLL_INTERVAL = 0.2
+
+
+class Watcher:
+    """监视源文件并在变化时增量重建数据包"""
+
+    def __init__(self, source: Union[str, Path], output_path: Union[str, Path],
+                 config: Dict, interval: float = POLL_INTERVAL):
+        self.source = Path(source).resolve()
+        self.output_path = output_path
+        self.config = config
+        self.interval = interval
+
+        self.ast_cache = ASTCache(enabled=config.get("cache", True))
+        self.last_writer: Optional[DatapackWriter] = None
+        self.mtimes: Dict[str, float] = {}
+
+    def _watched_files(self):
+        files = [str(self.source)]
+        if self.last_writer:
+            files += self.last_writer.modules
+        return files
+
+    def _snapshot_mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in self._watched_files():
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = -1
+        return mtimes
+
+    def rebuild(self) -> bool:
+        """在当前进程内重新编译一次，返回是否成功"""
+        start = time.perf_counter()
+        writer = DatapackWriter(self.output_path, self.config)
+        writer.ast_cache = self.ast_cache
+        if self.last_writer:
+            writer.previous_build = self.last_writer.incremental
+
+        # 编译日志在出错时才显示，避免每次保存都刷屏
+        log = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(log):
+                writer.compile_source(self.source)
+                if self.last_writer is None:
+                    writer.write()
+                    written, removed = len(writer.rendered), 0
+                else:
+                    written, removed = writer.sync(self.last_writer.rendered)
+        except Exception as e:
+            print(log.getvalue(), end="")
+            print(f"[Watch] ✗ 编译失败: {e}")
+            if os.environ.get("MCC_DEBUG"):
+                import traceback
+                traceback.print_exc()
+            return False
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.last_writer = writer
+        detail = f"写入 {written} 个文件, 删除 {removed} 个"
+        if writer.incremental:
+            detail += f", {writer.incremental.summary()}"
+        print(f"[Watch] ✓ 重建完成 {elapsed:.1f} ms ({detail})")
+        return True
+
+    def run(self):
+        """首次全量编译后进入轮询循环，Ctrl+C 退出"""
+        print(f"[Watch] 正在监视: {self.source}")
+        self.rebuild()
+        self.mtimes = self._snapshot_mtimes()
+        try:
+            while True:
+                time.sleep(self.interval)
+                mtimes = self._snapshot_mtimes()
+                if mtimes == self.mtimes:
+                    continue
+                changed = [Path(p).name for p in mtimes if self.mtimes.get(p) != mtimes[p]]
+                print(f"[Watch] 检测到修改: {', '.join(changed)}")
+                self.rebuild()
+                # 重建后导入集合可能变化，重新记录时间戳
+                self.mtimes = self._snapshot_mtimes()
+        except KeyboardInterrupt:
+            print("\n[Watch] 已停止")
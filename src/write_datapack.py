@@ -6,16 +6,13 @@ import os
 import re
 import shutil
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple, Union
 
-from parser import parse
-from semant import SemanticAnalyzer
-
-try:
-    from code_generator import CodeGenerator
-except ImportError:
-    CodeGenerator = None
-    print("警告: 未找到 code_generator 模块，编译功能将无法生成指令。")
+# 编译器各阶段（解析器、语义分析、代码生成）在 compile_source 中按需导入，
+# 只写入文件或参数校验失败时无需加载
+if TYPE_CHECKING:
+    from ast_cache import ASTCache
+    from incremental import IncrementalBuild
 
 
 class DatapackWriter:
@@ -52,13 +49,33 @@ class DatapackWriter:
         self.mc_version = str(self.config.get("mc_version", "1.21")).strip()
         self.description = self.config.get("description", f"{self.namespace} datapack")
         self.overwrite = self.config.get("overwrite", True)
+        self.use_cache = self.config.get("cache", True)
+        self.tree_shake = self.config.get("tree_shake", True)
+        self.fold_constants = self.config.get("fold_constants", True)
+        self.reuse_temps = self.config.get("reuse_temps", True)
+        self.peephole = self.config.get("peephole", True)
+        self.nbt_cse = self.config.get("nbt_cse", True)
+        self.eliminate_cleanup = self.config.get("eliminate_cleanup", True)
+        self.drop_cleanup = self.config.get("drop_cleanup", False)
+        self.inline_if = self.config.get("inline_if", 1)
+        self.inline_functions = self.config.get("inline_functions", True)
+        self.inline_size = self.config.get("inline_size", 5)
+        self.unroll_size = self.config.get("unroll_size", 32)
+        self.early_return = self.config.get("early_return", True)
+        self.reset_temps = self.config.get("reset_temps", False)
+        self.import_workers = self.config.get("import_workers")  # 并行解析导入模块的进程数，None 为 CPU 核数
 
         # 环境适配
         self.pack_format = self._infer_pack_format()
 
         # 编译器组件
-        self.analyzer = SemanticAnalyzer()
+        self.analyzer = None  # SemanticAnalyzer，编译时创建
+        self.ast_cache: Optional['ASTCache'] = None  # 可由调用方传入共享的缓存
+        self.previous_build: Optional['IncrementalBuild'] = None  # 上一次的增量编译状态（常驻内存时传入）
+        self.incremental: Optional['IncrementalBuild'] = None
+        self.modules: List[str] = []  # 本次编译加载的导入模块路径
         self.files: Dict[str, Any] = {}
+        self.rendered: Dict[str, str] = {}  # 最近一次写入磁盘的 {路径: 内容}
 
     def _infer_pack_format(self) -> int:
         v = self.mc_version
@@ -120,8 +137,26 @@ class DatapackWriter:
 
     def compile_source(self, source: Union[str, Path]) -> 'DatapackWriter':
         """编译源代码并添加到文件列表"""
-        if not CodeGenerator:
+        try:
+            from code_generator import CodeGenerator
+        except ImportError:
             raise RuntimeError("无法编译：缺少 CodeGenerator 模块。")
+        from analyzer import SemanticAnalyzer
+        from ast_cache import ASTCache
+        from incremental import IncrementalBuild
+        from tree_shaker import TreeShaker
+        from const_folder import ConstantFolder
+        from temp_allocator import TempAllocator
+        from peephole import PeepholeOptimizer
+        from cleanup_eliminator import CleanupEliminator
+        from inliner import Inliner
+        from unroller import LoopUnroller
+        from nbt_cse import NbtReadEliminator
+
+        if self.analyzer is None:
+            self.analyzer = SemanticAnalyzer()
+        if self.ast_cache is None:
+            self.ast_cache = ASTCache(enabled=self.use_cache)
 
         # 读取代码并确定基础路径（用于相对导入）
         if isinstance(source, (str, Path)) and os.path.exists(source):
@@ -139,22 +174,94 @@ class DatapackWriter:
 
         try:
             # 1. 语法分析
-            ast = parse(code)
+            ast = self.ast_cache.parse(code)
             print(f"[Compiler] 语法分析完成，顶层语句数: {len(ast.stmts)}")
 
             # 2. 解析并合并导入（关键新增）
-            from import_resolver import merge_imports
+            from import_resolver import ImportResolver
             print(f"[Compiler] 正在解析模块依赖...")
-            ast = merge_imports(ast, base_path)
+            resolver = ImportResolver(base_path, self.ast_cache, max_workers=self.import_workers)
+            ast = resolver.resolve_program(ast)
+            self.modules = sorted(resolver.loaded_modules)
             print(f"[Compiler] 模块合并完成，总声明数: {len(ast.stmts)}")
+            print(f"[Compiler] AST 缓存: {self.ast_cache.stats()}")
+
+            shaker = None
+            if self.tree_shake:
+                shaker = TreeShaker()
+                ast = shaker.shake(ast)
 
             # 3. 语义分析（现在能看到导入的函数和结构体签名）
-            self.analyzer.analyze(ast)
+            inliner = None
+            if self.inline_functions:
+                inliner = Inliner(max_size=self.inline_size)
+                inliner.prepare(ast)
+
+            incremental = None
+            skip_functions = set()
+            if self.use_cache:
+                incremental = IncrementalBuild.for_output(self.output_path, self.namespace, self.pack_format,
+                                                          previous=self.previous_build,
+                                                          options=(self.fold_constants, self.drop_cleanup, self.inline_if,
+                                                                   self.inline_functions, self.inline_size, self.early_return,
+                                                                   self.unroll_size))
+                skip_functions = incremental.prepare(ast, inliner.candidates if inliner else set())
+                incremental.attach(self.analyzer)
+            self.analyzer.analyze(ast, skip_functions=skip_functions)
             print(f"[Compiler] 语义分析通过")
 
             # 4. 代码生成
             gen = CodeGenerator(namespace=self.namespace)
+            gen.incremental = incremental
+            gen.tree_shake = self.tree_shake
+            if self.fold_constants:
+                gen.folder = ConstantFolder()
+            gen.drop_cleanup = self.drop_cleanup
+            gen.ctx.inline_block_limit = self.inline_if
+            gen.inliner = inliner
+            gen.unroller = LoopUnroller(max_size=self.unroll_size)
+            # return 与 execute if function 需要 1.20.3+ (pack_format 26)
+            gen.return_command = self.pack_format >= 26
+            gen.early_return = self.early_return
+            if self.eliminate_cleanup:
+                gen.cleanup = CleanupEliminator()
+            if self.nbt_cse:
+                gen.nbt_cse = NbtReadEliminator()
+            if self.reuse_temps:
+                gen.temp_allocator = TempAllocator(reset_at_exit=self.reset_temps)
+            if self.peephole:
+                gen.peephole = PeepholeOptimizer()
             generated_files = gen.generate(ast)
+            if gen.folder:
+                print(f"[Compiler] 常量折叠: {gen.folder.summary()}")
+            if gen.unroller.report:
+                print(f"[Compiler] 循环展开: {gen.unroller.summary()}")
+            if gen.inliner:
+                print(f"[Compiler] 函数内联: {gen.inliner.summary()}")
+                for line in gen.inliner.details():
+                    print(f"    {line}")
+            if gen.cleanup:
+                print(f"[Compiler] 退出清理: {gen.cleanup.summary()}")
+            if gen.nbt_cse:
+                print(f"[Compiler] NBT 读取: {gen.nbt_cse.summary()}")
+            if gen.temp_allocator:
+                print(f"[Compiler] 临时变量: {gen.temp_allocator.summary()}")
+            if gen.peephole:
+                print(f"[Compiler] 窥孔优化: {gen.peephole.summary()}")
+                for line in gen.peephole.details():
+                    print(f"    {line}")
+            stats = gen.command_stats()
+            print(f"[Compiler] 指令数: {sum(stats.values())} "
+                  f"({', '.join(f'{kind} {n}' for kind, n in stats.items())})")
+            if shaker:
+                removed = shaker.summary()
+                if gen.removed_macros:
+                    removed += f"; 数组宏 {len(gen.removed_macros)} 个"
+                print(f"[Compiler] 移除未引用的声明: {removed}")
+            if incremental:
+                incremental.save()
+                self.incremental = incremental
+                print(f"[Compiler] 增量编译: {incremental.summary()}")
 
             # 修复 JSON 内容格式
             for path, content in generated_files.items():
@@ -183,15 +290,8 @@ class DatapackWriter:
         self.files[path] = content
         return self
 
-    def write(self):
-        """物理写入磁盘 - 智能合并与版本适配"""
-        if self.output_path.exists():
-            if self.overwrite:
-                shutil.rmtree(self.output_path)
-            else:
-                print(f"[Datapack] 路径已存在且不允许覆盖: {self.output_path}")
-                return
-
+    def _render(self) -> Dict[str, str]:
+        """将文件列表规范化（版本适配、标签合并）并渲染为最终文本 {路径: 内容}"""
         # 确保 pack.mcmeta 存在
         if "pack.mcmeta" not in self.files:
             self.files["pack.mcmeta"] = {
@@ -227,23 +327,40 @@ class DatapackWriter:
                 normalized_files[tag_path] = {"values": sorted(list(values))}  # 排序保证输出稳定
                 print(f"  ✓ {tag_path}: {len(values)} 个条目")
 
-        # ========== 写入磁盘 ==========
-        written_count = 0
+        rendered: Dict[str, str] = {}
         for path, content in normalized_files.items():
-            full_path = self.output_path / path
-            full_path.parent.mkdir(parents=True, exist_ok=True)
-
-            with open(full_path, 'w', encoding='utf-8') as f:
-                if path.endswith('.json') or path == "pack.mcmeta":
-                    if isinstance(content, (dict, list)):
-                        json.dump(content, f, indent=4, ensure_ascii=False)
-                    else:
-                        f.write(str(content))
-                elif isinstance(content, list):
-                    f.write("\n".join(str(line) for line in content))
+            if path.endswith('.json') or path == "pack.mcmeta":
+                if isinstance(content, (dict, list)):
+                    rendered[path] = json.dumps(content, indent=4, ensure_ascii=False)
                 else:
-                    f.write(str(content))
+                    rendered[path] = str(content)
+            elif isinstance(content, list):
+                rendered[path] = "\n".join(str(line) for line in content)
+            else:
+                rendered[path] = str(content)
+        return rendered
+
+    def _write_file(self, path: str, text: str):
+        full_path = self.output_path / path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(full_path, 'w', encoding='utf-8') as f:
+            f.write(text)
 
+    def write(self):
+        """物理写入磁盘 - 智能合并与版本适配"""
+        if self.output_path.exists():
+            if self.overwrite:
+                shutil.rmtree(self.output_path)
+            else:
+                print(f"[Datapack] 路径已存在且不允许覆盖: {self.output_path}")
+                return
+
+        self.rendered = self._render()
+
+        # ========== 写入磁盘 ==========
+        written_count = 0
+        for path, text in self.rendered.items():
+            self._write_file(path, text)
             written_count += 1
 
         print(f"[Datapack] 成功生成至: {self.output_path}")
@@ -254,6 +371,30 @@ class DatapackWriter:
         if self.pack_format >= 48:
             self._validate_singular_paths()
 
+    def sync(self, previous: Dict[str, str]) -> Tuple[int, int]:
+        """
+        与上一次写入的结果对比，只重写内容变化的文件并删除不再生成的文件
+        previous: 上一次的 {路径: 内容}（即上一个 writer 的 rendered）
+        返回 (写入文件数, 删除文件数)
+        """
+        self.rendered = self._render()
+
+        written_count = 0
+        for path, text in self.rendered.items():
+            if previous.get(path) != text:
+                self._write_file(path, text)
+                written_count += 1
+
+        removed_count = 0
+        for path in previous:
+            if path not in self.rendered:
+                full_path = self.output_path / path
+                if full_path.exists():
+                    full_path.unlink()
+                removed_count += 1
+
+        return written_count, removed_count
+
     def _validate_singular_paths(self):
         """验证：1.21+ 环境下不应存在复数路径"""
         plural_patterns = ['functions/', 'loot_tables/', 'recipes/', 'advancements/',